@@ -0,0 +1,82 @@
+"""
+Write throughput of the ways rows reach the document table.
+
+"orm" is the library path upload_documents used to take, PGVectorStore.add
+with one ORM object per row. "insert" is write_nodes with a multi-row
+INSERT, and "copy" is write_nodes streaming binary COPY into a staging table
+and merging from there. The rows are synthetic nodes with random
+embeddings under "bench:" doc keys, which are deleted again afterwards, so
+only write time is measured and Ollama is not needed.
+
+Needs the Postgres database from docker-compose.
+
+Run from src/backend:
+    python -m benchmarks.bulk_writer
+"""
+import time
+import uuid
+
+import numpy as np
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
+from sqlalchemy import text
+
+from services.document_store import write_nodes, DOC_KEY, CONTENT_HASH, _table
+from services.initalise_vector_store import get_vector_store
+
+ROWS = 5000
+BATCH_SIZE = 500
+EMBED_DIM = 1024
+TEXT = "Streptomyces species produce a wide range of antibiotics and other secondary metabolites. " * 8
+
+
+def make_batches(rng):
+    batches = []
+    for start in range(0, ROWS, BATCH_SIZE):
+        nodes = []
+        for number in range(start, min(start + BATCH_SIZE, ROWS)):
+            key = f"bench:{number}"
+            node = TextNode(
+                id_=str(uuid.uuid4()),
+                text=TEXT,
+                metadata={DOC_KEY: key, CONTENT_HASH: "bench", "pmid": str(number)},
+                embedding=rng.random(EMBED_DIM, dtype=np.float32).tolist(),
+            )
+            node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=key)
+            nodes.append(node)
+        batches.append(nodes)
+    return batches
+
+
+def clean_up(vector_store):
+    with vector_store._engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {_table(vector_store)} WHERE doc_key LIKE 'bench:%'"))
+
+
+def write(vector_store, method, nodes):
+    if method == "orm":
+        vector_store.add(nodes)
+    else:
+        write_nodes(vector_store, nodes, [node.metadata[DOC_KEY] for node in nodes], method=method)
+
+
+def main():
+    vector_store = get_vector_store()
+    batches = make_batches(np.random.default_rng(0))
+    clean_up(vector_store)
+
+    print(f"{ROWS} rows in batches of {BATCH_SIZE}, {EMBED_DIM} dimensions")
+    for method in ("orm", "insert", "copy"):
+        # One untimed batch to open connections and create the staging table
+        write(vector_store, method, batches[0])
+        clean_up(vector_store)
+
+        start = time.perf_counter()
+        for nodes in batches:
+            write(vector_store, method, nodes)
+        elapsed = time.perf_counter() - start
+        clean_up(vector_store)
+        print(f"  {method:<7} {elapsed:7.2f} s  {ROWS / elapsed:9.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
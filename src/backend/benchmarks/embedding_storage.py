@@ -0,0 +1,120 @@
+"""
+Footprint, recall and latency of the embedding storage options.
+
+The same clustered synthetic 1024-dimension vectors are loaded into one
+scratch table per storage: float32 vector, float16 halfvec, and halfvec with
+a binary quantised HNSW index whose candidates are re-ranked on the floats.
+For each the table size (heap and TOAST), the ANN index size, recall@k
+against exact float32 search, and p50/p99 query latency are reported. The
+binary index is also measured without the re-rank to show what it buys.
+The scratch tables are dropped at the end, the document table is not touched.
+
+Needs the Postgres database from docker-compose, Ollama is not used.
+
+Run from src/backend:
+    python -m benchmarks.embedding_storage
+"""
+import time
+
+import numpy as np
+
+from benchmarks.vector_index import EMBED_DIM, CLUSTERS, QUERIES, TOP_K, vectors, literal, load_rows, percentile
+from services.embedding_storage import BINARY_RERANK_MULTIPLIER, operator_class, quantized_expression
+from services.initalise_vector_store import get_vector_store
+from services.vector_index import HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, VECTOR_INDEX_MAINTENANCE_WORK_MEM
+
+ROWS = 100_000
+HNSW_OPTIONS = f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+CANDIDATES = TOP_K * BINARY_RERANK_MULTIPLIER
+QUANTIZED = quantized_expression(EMBED_DIM)
+QUERY_QUANTIZED = quantized_expression(EMBED_DIM, "CAST(%(query)s AS halfvec)")
+
+# table column type, index column, ANN query and ef_search per variant
+VARIANTS = {
+    "vector": ("vector", f"embedding {operator_class('vector')}",
+               "SELECT id FROM {table} ORDER BY embedding <=> CAST(%(query)s AS vector) LIMIT %(top_k)s",
+               HNSW_EF_SEARCH),
+    "halfvec": ("halfvec", f"embedding {operator_class('halfvec')}",
+                "SELECT id FROM {table} ORDER BY embedding <=> CAST(%(query)s AS halfvec) LIMIT %(top_k)s",
+                HNSW_EF_SEARCH),
+    "binary, no re-rank": ("halfvec", f"({QUANTIZED}) bit_hamming_ops",
+                           f"SELECT id FROM {{table}} ORDER BY {QUANTIZED} <~> {QUERY_QUANTIZED} LIMIT %(top_k)s",
+                           HNSW_EF_SEARCH),
+    "binary": ("halfvec", f"({QUANTIZED}) bit_hamming_ops",
+               f"SELECT id FROM (SELECT id, embedding FROM {{table}} ORDER BY {QUANTIZED} <~> {QUERY_QUANTIZED} "
+               f"LIMIT %(candidates)s) AS quantized "
+               f"ORDER BY embedding <=> CAST(%(query)s AS halfvec) LIMIT %(top_k)s",
+               max(HNSW_EF_SEARCH, CANDIDATES)),
+}
+EXACT_QUERY = "SELECT id FROM {table} ORDER BY embedding <=> CAST(%(query)s AS vector) LIMIT %(top_k)s"
+
+
+def table_name(variant: str) -> str:
+    return "storage_benchmark_" + variant.split(",")[0]
+
+
+def search(cursor, sql, queries, setting):
+    results, samples = [], []
+    for query in queries:
+        cursor.execute("BEGIN")
+        cursor.execute(setting)
+        start = time.perf_counter()
+        cursor.execute(sql, {"query": literal(query), "top_k": TOP_K, "candidates": CANDIDATES})
+        ids = [row[0] for row in cursor.fetchall()]
+        samples.append((time.perf_counter() - start) * 1000)
+        cursor.execute("COMMIT")
+        results.append(ids)
+    return results, samples
+
+
+def size_mb(cursor, expression: str, relation: str) -> float:
+    cursor.execute(f"SELECT {expression}(%s)", (relation,))
+    return cursor.fetchone()[0] / 2 ** 20
+
+
+def main():
+    vector_store = get_vector_store()
+    connection = vector_store._engine.raw_connection()
+    connection.autocommit = True
+    cursor = connection.cursor()
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, EMBED_DIM))
+    rows = vectors(rng, centers, ROWS)
+    queries = vectors(rng, centers, QUERIES)
+    cursor.execute(f"SET maintenance_work_mem = '{VECTOR_INDEX_MAINTENANCE_WORK_MEM}'")
+
+    tables = {table_name(variant): column for variant, (column, _, _, _) in VARIANTS.items()}
+    try:
+        for table, column in tables.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} (id bigserial PRIMARY KEY, embedding {column}({EMBED_DIM}))")
+            load_rows(cursor, table, rows)
+            cursor.execute(f"ANALYZE {table}")
+
+        exact, _ = search(cursor, EXACT_QUERY.format(table=table_name("vector")), queries,
+                          "SET LOCAL enable_indexscan = off")
+
+        print(f"{ROWS} rows, {EMBED_DIM} dimensions, {QUERIES} queries, top_k={TOP_K}, "
+              f"binary re-ranks {CANDIDATES} candidates")
+        print(f"  {'storage':<20} {'table MB':>9} {'index MB':>9} {'build s':>8} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for variant, (_, index_column, sql, ef_search) in VARIANTS.items():
+            table = table_name(variant)
+            index = f"{table}_ann"
+            start = time.perf_counter()
+            cursor.execute(f"CREATE INDEX {index} ON {table} USING hnsw ({index_column}) {HNSW_OPTIONS}")
+            build_seconds = time.perf_counter() - start
+
+            results, samples = search(cursor, sql.format(table=table), queries, f"SET LOCAL hnsw.ef_search = {ef_search}")
+            recall = np.mean([len(set(found) & set(truth)) / TOP_K for found, truth in zip(results, exact)])
+            print(f"  {variant:<20} {size_mb(cursor, 'pg_table_size', table):9.1f} "
+                  f"{size_mb(cursor, 'pg_relation_size', index):9.1f} {build_seconds:8.1f} {recall:7.1%} "
+                  f"{percentile(samples, 0.50):8.2f} {percentile(samples, 0.99):8.2f}")
+            cursor.execute(f"DROP INDEX {index}")
+    finally:
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
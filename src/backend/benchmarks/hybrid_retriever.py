@@ -0,0 +1,93 @@
+"""
+Latency of the two hybrid search paths against the live document table.
+
+"fusion" is the existing path: a dense and a sparse retriever, two round
+trips, fused in Python by QueryFusionRetriever. "sql" is the single
+statement PostgresHybridRetriever. Query embeddings are computed up front
+so only retrieval is timed, and the overlap of the two top-k lists shows
+that both rank the same documents.
+
+Needs the Postgres database from docker-compose with documents loaded.
+Ollama is only used to embed the benchmark questions once.
+
+Run from src/backend:
+    python -m benchmarks.hybrid_retriever
+"""
+import asyncio
+import statistics
+import time
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.schema import QueryBundle
+
+from services.llm import setup_models
+from services.initalise_vector_store import get_vector_store
+from services.query_documents import build_fusion_retriever
+from services.query_engine_pool import QueryEngineConfig
+
+QUESTIONS = [
+    "Which organisms produce penicillin?",
+    "What compounds were isolated from Streptomyces?",
+    "Which metabolites are precursors of artemisinin?",
+    "What chemicals inhibit bacterial growth?",
+    "Which fungi produce mycotoxins?",
+    "What is the biosynthetic precursor of taxol?",
+    "Which marine sponges produce alkaloids?",
+    "What antibiotics are produced by actinomycetes?",
+]
+ROUNDS = 20
+TOP_K = 5
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def bench(retriever, bundles) -> list:
+    # One untimed pass to open connections and warm the caches
+    for bundle in bundles:
+        await retriever.aretrieve(bundle)
+    samples = []
+    for _ in range(ROUNDS):
+        for bundle in bundles:
+            start = time.perf_counter()
+            await retriever.aretrieve(bundle)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main():
+    setup_models()
+    vector_store = get_vector_store()
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+    bundles = [
+        QueryBundle(question, embedding=Settings.embed_model.get_query_embedding(question))
+        for question in QUESTIONS
+    ]
+
+    for fusion_mode in ("relative_score", "reciprocal_rerank"):
+        retrievers = {
+            name: build_fusion_retriever(
+                index, QueryEngineConfig(top_k=TOP_K, fusion_mode=fusion_mode, retriever=name)
+            )
+            for name in ("fusion", "sql")
+        }
+        print(f"\nFusion mode: {fusion_mode} ({len(QUESTIONS) * ROUNDS} queries, top_k={TOP_K})")
+        for name, retriever in retrievers.items():
+            samples = await bench(retriever, bundles)
+            print(
+                f"  {name:<7} mean {statistics.mean(samples):7.2f} ms"
+                f"  p50 {percentile(samples, 0.50):7.2f} ms"
+                f"  p95 {percentile(samples, 0.95):7.2f} ms"
+            )
+
+        overlap = []
+        for bundle in bundles:
+            fused = {node.node.node_id for node in await retrievers["fusion"].aretrieve(bundle)}
+            single = {node.node.node_id for node in await retrievers["sql"].aretrieve(bundle)}
+            overlap.append(len(fused & single) / max(len(fused), 1))
+        print(f"  top-{TOP_K} overlap: {statistics.mean(overlap):.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
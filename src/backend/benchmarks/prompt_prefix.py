@@ -0,0 +1,63 @@
+"""
+Prompt evaluation time with and without Ollama prefix (KV cache) reuse.
+
+Sends the v2 question prompt to the LLM once per request, each time with a
+different context, and reads Ollama's prompt_eval_count and
+prompt_eval_duration from the response. With prefix reuse the static system
+message is the same every time, so only the new context is evaluated. The
+"without" run puts a per-request marker at the start of the system message,
+which forces Ollama to evaluate the whole prompt every time. Only one token is
+generated, so the timings are almost all prompt evaluation.
+
+Needs the Ollama server configured in services.llm with deepseek-r1 pulled.
+
+Run from src/backend:
+    python -m benchmarks.prompt_prefix
+"""
+import statistics
+import uuid
+from llama_index.llms.ollama import Ollama
+
+from services.llm import base_url, model_keep_alive
+from services.query_documents import build_system_prompt
+
+MODEL = "deepseek-r1:14b"
+NUM_REQUESTS = 10
+CONTEXTS = [
+    f"Paper {i}: Streptomyces strain {i} produces compound {i}, which inhibits Staphylococcus aureus."
+    for i in range(NUM_REQUESTS)
+]
+
+
+def run(llm: Ollama, break_prefix: bool) -> list:
+    prompt = build_system_prompt("v2")
+    samples = []
+    for context in CONTEXTS:
+        messages = prompt.format_messages(context_str=context, query_str="Which organisms produce which compounds?")
+        if break_prefix:
+            messages[0].content = f"Request {uuid.uuid4()}\n{messages[0].content}"
+        response = llm.client.chat(
+            model=llm.model,
+            messages=[{"role": m.role.value, "content": m.content} for m in messages],
+            options={"num_predict": 1, "temperature": 0},
+            keep_alive=model_keep_alive(),
+        )
+        samples.append((response["prompt_eval_count"], response["prompt_eval_duration"] / 1e6))
+    # The first request fills the cache in both runs, leave it out
+    return samples[1:]
+
+
+def main():
+    llm = Ollama(model=MODEL, base_url=base_url, request_timeout=300)
+    # Load the model so neither run pays for it
+    llm.client.generate(model=MODEL, prompt="", keep_alive=model_keep_alive())
+
+    for name, break_prefix in (("with prefix reuse", False), ("without prefix reuse", True)):
+        samples = run(llm, break_prefix)
+        tokens = statistics.mean(count for count, _ in samples)
+        duration = statistics.mean(ms for _, ms in samples)
+        print(f"{name:<22} prompt tokens evaluated {tokens:7.1f}  prompt_eval {duration:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of the per request cost of building the query pipeline.
+
+Compares building a fresh engine for every question (the old behaviour)
+with borrowing one from the query engine pool. Only construction is timed,
+so it runs against an in-memory index with mock models and needs neither
+Postgres nor Ollama.
+
+Run from src/backend:
+    python -m benchmarks.query_engine_pool
+"""
+import time
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+from services.query_documents import build_query_engine
+from services.query_engine_pool import QueryEnginePool, DEFAULT_QUERY_CONFIG
+
+NUM_REQUESTS = 500
+
+
+def bench_rebuild(index, num_requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        build_query_engine(index, DEFAULT_QUERY_CONFIG)
+    return (time.perf_counter() - start) / num_requests
+
+
+def bench_pool(index, num_requests: int) -> float:
+    pool = QueryEnginePool(build_query_engine)
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        with pool.borrow(index, DEFAULT_QUERY_CONFIG):
+            pass
+    return (time.perf_counter() - start) / num_requests
+
+
+def main():
+    Settings.embed_model = MockEmbedding(embed_dim=1024)
+    Settings.llm = MockLLM()
+    index = VectorStoreIndex(nodes=[])
+
+    rebuild = bench_rebuild(index, NUM_REQUESTS)
+    pooled = bench_pool(index, NUM_REQUESTS)
+
+    print(f"Requests: {NUM_REQUESTS}")
+    print(f"Rebuild per request: {rebuild * 1e6:.1f} us")
+    print(f"Pooled per request:  {pooled * 1e6:.1f} us")
+    print(f"Speed-up: {rebuild / pooled:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Recall and latency of HNSW and IVFFlat indexes as the corpus grows.
+
+A scratch table is filled with clustered synthetic 1024-dimension vectors
+in steps of CORPUS_SIZES. At each size the exact top-k of every query is
+found with index scans disabled, then each index type is built with the
+configured parameters and queried at several ef_search / probes settings.
+Recall@k is the share of the exact top-k the index returns. The scratch
+table is dropped at the end, the document table is not touched.
+
+Needs the Postgres database from docker-compose, Ollama is not used.
+
+Run from src/backend:
+    python -m benchmarks.vector_index
+"""
+import io
+import statistics
+import time
+
+import numpy as np
+
+from services.initalise_vector_store import get_vector_store
+from services.embedding_storage import operator_class
+from services.vector_index import HNSW_M, HNSW_EF_CONSTRUCTION, VECTOR_INDEX_MAINTENANCE_WORK_MEM, default_lists
+
+TABLE = "ann_benchmark"
+EMBED_DIM = 1024
+CORPUS_SIZES = [10_000, 50_000, 100_000]
+CLUSTERS = 200
+QUERIES = 100
+TOP_K = 10
+EF_SEARCH = [20, 40, 100, 200]
+PROBES = [1, 5, 10, 20]
+
+QUERY = f"SELECT id FROM {TABLE} ORDER BY embedding <=> %s::vector LIMIT {TOP_K}"
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def vectors(rng, centers, count):
+    """Unit vectors scattered around random cluster centres, like topical abstracts"""
+    picked = centers[rng.integers(0, len(centers), count)]
+    points = picked + rng.normal(scale=0.05, size=(count, EMBED_DIM))
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def literal(vector) -> str:
+    return "[" + ",".join(f"{value:.6f}" for value in vector) + "]"
+
+
+def load_rows(cursor, table, rows):
+    buffer = io.StringIO("".join(literal(row) + "\n" for row in rows))
+    cursor.copy_expert(f"COPY {table} (embedding) FROM STDIN", buffer)
+
+
+def search(cursor, queries, setting=None):
+    """Top-k ids and latency in ms per query, with an optional SET LOCAL"""
+    results, samples = [], []
+    for query in queries:
+        cursor.execute("BEGIN")
+        if setting:
+            cursor.execute(setting)
+        start = time.perf_counter()
+        cursor.execute(QUERY, (literal(query),))
+        ids = [row[0] for row in cursor.fetchall()]
+        samples.append((time.perf_counter() - start) * 1000)
+        cursor.execute("COMMIT")
+        results.append(ids)
+    return results, samples
+
+
+def report(label, exact, results, samples):
+    recall = statistics.mean(len(set(found) & set(truth)) / TOP_K for found, truth in zip(results, exact))
+    print(f"    {label:<18} recall@{TOP_K} {recall:6.1%}"
+          f"  p50 {percentile(samples, 0.50):7.2f} ms  p99 {percentile(samples, 0.99):7.2f} ms")
+
+
+def main():
+    vector_store = get_vector_store()
+    connection = vector_store._engine.raw_connection()
+    connection.autocommit = True
+    cursor = connection.cursor()
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, EMBED_DIM))
+    queries = vectors(rng, centers, QUERIES)
+
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"CREATE TABLE {TABLE} (id bigserial PRIMARY KEY, embedding vector({EMBED_DIM}))")
+    cursor.execute(f"SET maintenance_work_mem = '{VECTOR_INDEX_MAINTENANCE_WORK_MEM}'")
+    try:
+        loaded = 0
+        for size in CORPUS_SIZES:
+            load_rows(cursor, TABLE, vectors(rng, centers, size - loaded))
+            loaded = size
+            cursor.execute(f"ANALYZE {TABLE}")
+            print(f"\n{size} rows, {QUERIES} queries, top_k={TOP_K}")
+
+            exact, samples = search(cursor, queries, "SET LOCAL enable_indexscan = off")
+            report("exact", exact, exact, samples)
+
+            indexes = {
+                "hnsw": (f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})",
+                         [(f"ef_search={ef}", f"SET LOCAL hnsw.ef_search = {ef}") for ef in EF_SEARCH]),
+                "ivfflat": (f"WITH (lists = {default_lists(size)})",
+                            [(f"probes={probes}", f"SET LOCAL ivfflat.probes = {probes}") for probes in PROBES]),
+            }
+            for kind, (options, settings) in indexes.items():
+                start = time.perf_counter()
+                cursor.execute(f"CREATE INDEX {TABLE}_{kind} ON {TABLE} USING {kind} (embedding {operator_class('vector')}) {options}")
+                print(f"  {kind} {options}, built in {time.perf_counter() - start:.1f} s")
+                for label, setting in settings:
+                    results, samples = search(cursor, queries, setting)
+                    report(label, exact, results, samples)
+                cursor.execute(f"DROP INDEX {TABLE}_{kind}")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
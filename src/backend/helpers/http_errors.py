@@ -0,0 +1,20 @@
+from fastapi import HTTPException
+
+from services.scheduler import SchedulerBusy
+
+
+def too_many_requests(error: SchedulerBusy) -> HTTPException:
+    """
+    Turn a full scheduler queue into a 429 the client can back off from.
+
+    Args:
+        error (SchedulerBusy): The rejection raised by the scheduler.
+
+    Returns:
+        HTTPException: 429 with a Retry-After header.
+    """
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
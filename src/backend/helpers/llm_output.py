@@ -0,0 +1,105 @@
+import json
+import re
+
+THINK_BLOCK = re.compile(r"<think>.*?(?:</think>|$)", re.DOTALL)
+RELATIONSHIPS_ARRAY = re.compile(r'"relationships"\s*:\s*\[')
+
+
+def strip_think_blocks(text: str) -> str:
+    """
+    Remove reasoning blocks emitted by deepseek-r1 style models.
+
+    Args:
+        text (str): Raw model output, possibly with <think>...</think> preambles.
+
+    Returns:
+        str: The output with every think block (closed or still open) removed.
+    """
+    return THINK_BLOCK.sub("", text).strip()
+
+
+class RelationshipStreamParser:
+    """
+    Incrementally pull complete relationship objects out of partial JSON.
+
+    Text is fed in as the model streams it. Once the "relationships" array
+    has started, every object in it is returned as soon as its closing brace
+    arrives, without waiting for the rest of the document.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self._finished = False
+
+    def _find_array(self):
+        # Ignore anything inside a reasoning block, which may quote JSON
+        text = self._buffer
+        if "<think>" in text:
+            end = text.rfind("</think>")
+            if end == -1:
+                return None
+            offset = end + len("</think>")
+        else:
+            offset = 0
+        match = RELATIONSHIPS_ARRAY.search(text, offset)
+        return match.end() if match else None
+
+    def feed(self, text: str) -> list:
+        """
+        Add streamed text and return the relationships completed by it.
+
+        Args:
+            text (str): The next chunk of model output.
+
+        Returns:
+            list[dict]: Newly completed relationship objects, in order.
+        """
+        self._buffer += text
+        completed = []
+        if self._finished:
+            return completed
+        if self._pos is None:
+            self._pos = self._find_array()
+            if self._pos is None:
+                return completed
+
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    try:
+                        completed.append(json.loads(buffer[self._object_start:self._pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._object_start = None
+            elif char == "]" and self._depth == 0:
+                self._finished = True
+                self._pos += 1
+                break
+            self._pos += 1
+        return completed
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._buffer
@@ -0,0 +1,21 @@
+import json
+
+# Headers that stop proxies from buffering an event stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data) -> str:
+    """
+    Format a single server-sent event.
+
+    Args:
+        event (str): The event name.
+        data: JSON serialisable payload for the event.
+
+    Returns:
+        str: The event in text/event-stream wire format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,19 +6,20 @@ import uvicorn
 from contextlib import asynccontextmanager
 from services.initalise_vector_store import init_vector_store, upload_documents
 from services.llm import initialise_resources
+from services.schema import ensure_schema
+from services.warm_up import warm_up
 from state import app_state
-from routes import health_check, send_question, add_documents, pubmed_search
+from routes import health_check, send_question, add_documents, pubmed_search, metrics, retrieve, jobs, vector_index
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialise resources before the app starts
+    # Initialise resources and load the models in the background, /ready
+    # reports when this is done so no traffic arrives before then
     print("Initialising application resources...")
-    if not app_state.initialized:
-        success = initialise_resources()
-        if not success:
-            print("WARNING: Failed to initialize resources during startup")
+    warm_up_task = asyncio.create_task(warm_up())
     yield
+    warm_up_task.cancel()
     # Cleanup code would go here if needed
     print("Shutting down application...")
 
@@ -43,6 +45,10 @@ app.include_router(health_check.router)
 app.include_router(send_question.router)
 app.include_router(add_documents.router)
 app.include_router(pubmed_search.router, tags=["PubMed"])
+app.include_router(metrics.router)
+app.include_router(retrieve.router, tags=["Retrieval"])
+app.include_router(jobs.router, tags=["Jobs"])
+app.include_router(vector_index.router, tags=["Vector index"])
 
 @app.get("/")
 async def root():
@@ -52,6 +58,8 @@ def main():
     # Initialise resources early to avoid timing issues
     if not app_state.initialized:
         initialise_resources()
+    if app_state.vector_store:
+        ensure_schema(app_state.vector_store)
     upload_documents()
 
 if __name__ == "__main__":
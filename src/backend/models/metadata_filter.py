@@ -0,0 +1,10 @@
+from typing import List, Union
+from pydantic import BaseModel, Field
+
+
+class MetadataFilterModel(BaseModel):
+    """One condition on a promoted metadata column, see services/metadata_columns.py"""
+    key: str = Field(..., description="pmid, journal, doi, title or authors")
+    operator: str = Field("==", description="==, !=, in, nin, text_match, text_match_insensitive; "
+                                            "contains, any, all for authors")
+    value: Union[str, int, List[str]]
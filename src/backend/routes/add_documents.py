@@ -1,10 +1,14 @@
 import datetime
+import time
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from llama_index.core import Document as LlamaDocument
 
 from models.structured_response import Relationship
-from services.add_document_service import add_text_document
+from services.document_store import UNKNOWN_FILE_PATH
+from services.document_batcher import document_batcher, ingest_documents, DOCUMENT_BATCH_SIZE, DOCUMENT_BATCH_MAX_DOCUMENTS
+from services.scheduler import scheduler_lane, BATCH
 
 
 
@@ -12,24 +16,80 @@ from services.add_document_service import add_text_document
 class Document(BaseModel):
     text: str
     metadata: Optional[dict] = None
-    
+    id: Optional[str] = None
+
+
+class DocumentBatch(BaseModel):
+    documents: List[Document]
+
+
+def default_metadata() -> dict:
+    return {
+        "file_name": "API added document",
+        "file_path": UNKNOWN_FILE_PATH,
+        "source": "user_added_document",
+        "document_type": "biomedical_text",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "process_status": "pending",
+    }
+
+
+def to_llama_document(document: Document) -> LlamaDocument:
+    metadata = document.metadata or default_metadata()
+    if document.id:
+        # Resending the same id replaces the stored document if its text changed
+        metadata["doc_key"] = document.id
+    return LlamaDocument(text=document.text, metadata=metadata)
+
+
 router = APIRouter()
 @router.post("/add_document/")
 async def add_document(document: Document = Body(...)):
     if not document.text:
         raise HTTPException(status_code=400, detail="Document text is required")
-    if not document.metadata:
-        document.metadata = {
-            "file_name": "API added document",
-            "file_path": "unknown",
-            "source": "user_added_document",
-            "document_type": "biomedical_text",
-            "timestamp": datetime.datetime.now().isoformat(),  
-            "process_status": "pending",
-        }
     try:
-        add_text_document(document.text, document.metadata)
-        return {"message": "Document added successfully"}, 201
+        # Concurrent calls are coalesced into one embedding batch and INSERT
+        result = await document_batcher.submit(to_llama_document(document))
+        return {"message": "Document added successfully", **result}, 201
     except Exception as e:
         print(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.post("/documents/batch")
+async def add_documents_batch(batch: DocumentBatch = Body(...)):
+    """
+    Store many documents in one call, embedded and inserted DOCUMENT_BATCH_SIZE at a time.
+    A failed chunk is reported on its documents and does not stop the rest.
+    """
+    if not batch.documents:
+        raise HTTPException(status_code=400, detail="At least one document is required")
+    if len(batch.documents) > DOCUMENT_BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {DOCUMENT_BATCH_MAX_DOCUMENTS} documents can be sent in one batch",
+        )
+    if any(not document.text for document in batch.documents):
+        raise HTTPException(status_code=400, detail="Document text is required")
+
+    start = time.perf_counter()
+    documents = [to_llama_document(document) for document in batch.documents]
+    results = []
+    with scheduler_lane(BATCH):
+        for offset in range(0, len(documents), DOCUMENT_BATCH_SIZE):
+            chunk = documents[offset:offset + DOCUMENT_BATCH_SIZE]
+            try:
+                results.extend(await ingest_documents(chunk))
+            except Exception as e:
+                print(f"Error ingesting documents {offset}-{offset + len(chunk) - 1}: {e}")
+                results.extend({"id": document.doc_id, "error": str(e)} for document in chunk)
+
+    for position, result in enumerate(results):
+        result["index"] = position
+    failed = sum(1 for result in results if "error" in result)
+    return {
+        "results": results,
+        "count": len(results),
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
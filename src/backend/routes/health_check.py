@@ -2,6 +2,8 @@ from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
 from typing import Dict
 
+from state import app_state
+
 router = APIRouter()
 
 @router.get("/health", response_model=Dict[str, str], tags=["Health"])
@@ -15,4 +17,23 @@ async def health_check() -> JSONResponse:
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={"status": "healthy", "message": "API is operational"}
-    )
\ No newline at end of file
+    )
+
+@router.get("/ready", tags=["Health"])
+async def readiness_check() -> JSONResponse:
+    """
+    Readiness endpoint for the load balancer, unlike /health it stays
+    unavailable until warm-up has loaded the models and opened the pool.
+
+    Returns:
+        JSONResponse: 200 when ready, otherwise 503 with each warm-up stage's status
+    """
+    if app_state.ready:
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"status": "ready", "warm_up": app_state.warm_up}
+        )
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "warming_up", "warm_up": app_state.warm_up}
+    )
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException
+
+from services.jobs import job_manager
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """All jobs still held in memory, newest first"""
+    jobs = job_manager.list()
+    return {"jobs": jobs, "count": len(jobs)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    A job's status, progress counters and, once finished, its result or error.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel", status_code=202)
+async def cancel_job(job_id: str):
+    """
+    Ask a job to stop. Queued jobs never start, running ones stop at their
+    next step and keep whatever they already stored.
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+
+from services.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics", tags=["Health"])
+async def get_metrics() -> dict:
+    """
+    Snapshot of the in-process counters, timings and pool gauges.
+
+    Returns:
+        dict: Counters, observations (count/sum/max/avg) and gauges
+    """
+    return metrics.snapshot()
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, Body
+from pydantic import BaseModel
+from typing import List, Optional
+
+from helpers.http_errors import too_many_requests
+from models.metadata_filter import MetadataFilterModel
+from services.query_engine_pool import DEFAULT_QUERY_CONFIG
+from services.retrieve_documents import retrieve_documents
+from services.scheduler import SchedulerBusy
+
+
+class RetrieveRequest(BaseModel):
+    text: str
+    top_k: int = DEFAULT_QUERY_CONFIG.top_k
+    fusion_mode: str = DEFAULT_QUERY_CONFIG.fusion_mode
+    retriever: str = DEFAULT_QUERY_CONFIG.retriever
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+    filters: Optional[List[MetadataFilterModel]] = None
+
+
+router = APIRouter()
+
+@router.post("/retrieve")
+async def retrieve(request: RetrieveRequest = Body(...)):
+    """
+    Search the corpus with the hybrid retriever, skipping the LLM.
+    Filters on pmid, journal, doi, title and authors are applied in SQL before ranking.
+
+    Returns:
+        dict: Node ids, PMIDs, titles, journals and fused scores in rank order, plus
+        embedding, retrieval and total timings in milliseconds
+    """
+    try:
+        result = await retrieve_documents(
+            request.text, request.top_k, request.fusion_mode, request.retriever,
+            hnsw_ef_search=request.hnsw_ef_search, ivfflat_probes=request.ivfflat_probes,
+            filters=request.filters,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SchedulerBusy as e:
+        raise too_many_requests(e)
+    except Exception as e:
+        print(f"Error retrieving documents: {e}")
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    print(f"Retrieved {len(result['results'])} documents in {result['timing']['total_ms']} ms")
+    return {**result, "count": len(result["results"])}
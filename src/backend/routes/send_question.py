@@ -1,23 +1,58 @@
-from fastapi import APIRouter, FastAPI, HTTPException, Body
+import asyncio
+import json
+import time
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from services.query_documents import query_documents
+from helpers.http_errors import too_many_requests
+from helpers.sse import format_sse, SSE_HEADERS
+from models.metadata_filter import MetadataFilterModel
+from services.metadata_columns import normalise_filters
+from services.query_engine_pool import DEFAULT_QUERY_CONFIG
+from services.query_documents import answer_question
+from services.stream_answer import stream_answer
+from services.batch_questions import answer_batch, BATCH_MAX_QUESTIONS, BATCH_LLM_CONCURRENCY, BATCH_MAX_IN_FLIGHT
 from services.llm import get_index
+from services.scheduler import SchedulerBusy
 
 
 # Define a Pydantic model for request validation
 class Question(BaseModel):
     text: str
+    # Restrict retrieval to matching papers, e.g. {"key": "journal", "value": "Toxicon"}
+    filters: Optional[List[MetadataFilterModel]] = None
+
+
+class BatchQuestions(BaseModel):
+    questions: List[str]
+    stream: bool = False
+    concurrency: Optional[int] = None
     
 router = APIRouter()
+
+
+def question_config(question: Question):
+    """The default engine configuration with the question's filters, 400 if they are invalid"""
+    try:
+        return DEFAULT_QUERY_CONFIG._replace(filters=normalise_filters(question.filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/questions/")
 async def send_question(question: Question = Body(...)):
+    config = question_config(question)
     try:
-        index = get_index()
-        response = query_documents(question.text, index)
+        # Resource initialisation is blocking, keep it off the event loop
+        index = await asyncio.to_thread(get_index)
+        result = await answer_question(question.text, index, config)
         # Print structured response
-        response_dict = response.response.model_dump()
-        print(response.response.model_dump_json(indent=2))
+        response_dict = result["response"]
+        if result["cache"]:
+            print(f"Answer served from the {result['cache']} cache")
+        print(json.dumps(response_dict, indent=2))
         print("\nRelationships:")
         if response_dict["relationships"]:
             print("---------------------")
@@ -27,11 +62,88 @@ async def send_question(question: Question = Body(...)):
             print("---------------------")
         print("\nExplanation:", response_dict["explanation"])
         print("\nSources:")
-        for node in response.source_nodes:
-            print(f"- {node.node.metadata.get('file_path', 'Unknown')}: "
-                    f"Score: {node.score:.3f}")
-        return {"response": response_dict, "sources": response.source_nodes}, 200
+        for source in result["sources"]:
+            print(f"- {source['node']['extra_info'].get('file_path', 'Unknown')}: "
+                    f"Score: {source['score']:.3f}")
+        return {"response": response_dict, "sources": result["sources"], "cache": result["cache"]}, 200
+    except SchedulerBusy as e:
+        raise too_many_requests(e)
     except Exception as e:
         print(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-        
\ No newline at end of file
+
+
+@router.post("/questions/stream")
+async def send_question_stream(question: Question = Body(...)):
+    """
+    Streaming variant of /questions/ using server-sent events.
+
+    Emits `sources` as soon as retrieval finishes, `token` while the answer
+    is generated, one `relationship` event per extracted relationship and a
+    final `done` event with the same body as /questions/. A `retry` event
+    means the reply did not parse and is being regenerated, the `done` event
+    holds the relationships that count. Failures after the stream has
+    started are reported as an `error` event.
+    """
+    config = question_config(question)
+
+    async def event_stream():
+        try:
+            async for event, data in stream_answer(question.text, config=config):
+                yield format_sse(event, data)
+        except SchedulerBusy as e:
+            yield format_sse("error", {"detail": str(e), "status": 429, "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield format_sse("error", {"detail": f"An error occurred: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/questions/batch")
+async def send_question_batch(batch: BatchQuestions = Body(...)):
+    """
+    Answer many questions in one call.
+
+    Questions are embedded in one batched call and retrieved in parallel,
+    with `concurrency` LLM generations in flight at a time. By default the
+    results come back in request order; with `stream` set each result is
+    sent as a `result` event as soon as it finishes, followed by `done`.
+    """
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    concurrency = min(max(batch.concurrency or BATCH_LLM_CONCURRENCY, 1), BATCH_MAX_IN_FLIGHT)
+    start = time.perf_counter()
+
+    if batch.stream:
+        async def event_stream():
+            try:
+                async for result in answer_batch(batch.questions, llm_concurrency=concurrency):
+                    yield format_sse("result", result)
+                yield format_sse("done", {
+                    "count": len(batch.questions),
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+                })
+            except SchedulerBusy as e:
+                yield format_sse("error", {"detail": str(e), "status": 429, "retry_after": e.retry_after})
+            except Exception as e:
+                print(f"Error streaming batch: {e}")
+                yield format_sse("error", {"detail": f"An error occurred: {str(e)}"})
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    try:
+        results = [result async for result in answer_batch(batch.questions, llm_concurrency=concurrency)]
+    except SchedulerBusy as e:
+        raise too_many_requests(e)
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    results.sort(key=lambda result: result["index"])
+    return {
+        "results": results,
+        "count": len(results),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,65 @@
+import asyncio
+from fastapi import APIRouter, Body, HTTPException
+from pydantic import BaseModel, Field
+
+from services.initalise_vector_store import get_vector_store
+from services.jobs import job_manager
+from services.vector_index import (
+    list_vector_indexes, create_vector_index, rebuild_vector_index, drop_vector_index,
+    INDEX_KINDS, HNSW_M, HNSW_EF_CONSTRUCTION, IVFFLAT_LISTS,
+)
+
+
+class VectorIndexRequest(BaseModel):
+    kind: str = Field("hnsw", description="hnsw, ivfflat or binary (HNSW over bit-quantised embeddings)")
+    m: int = Field(HNSW_M, ge=2, le=100, description="HNSW connections per node (hnsw and binary)")
+    ef_construction: int = Field(HNSW_EF_CONSTRUCTION, ge=4, le=1000, description="HNSW build candidate list size")
+    lists: int = Field(IVFFLAT_LISTS, ge=0, description="IVFFlat lists, 0 derives them from the row count")
+    rebuild: bool = Field(False, description="Replace an existing index of this kind with the new parameters")
+
+
+router = APIRouter()
+
+
+def _vector_store():
+    vector_store = get_vector_store()
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector store is not available")
+    return vector_store
+
+
+@router.get("/vector_index")
+async def get_vector_indexes():
+    """The ANN indexes on the document table, with their definitions and sizes"""
+    vector_store = await asyncio.to_thread(_vector_store)
+    indexes = await asyncio.to_thread(list_vector_indexes, vector_store)
+    return {"indexes": indexes, "count": len(indexes)}
+
+
+@router.post("/vector_index", status_code=202)
+async def build_vector_index(request: VectorIndexRequest = Body(...)):
+    """
+    Build or rebuild an index as a background job, poll /jobs/{job_id} for the outcome.
+    Builds run CONCURRENTLY, so reads and writes carry on meanwhile.
+    """
+    if request.kind not in INDEX_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(INDEX_KINDS)}")
+    vector_store = await asyncio.to_thread(_vector_store)
+    build = rebuild_vector_index if request.rebuild else create_vector_index
+    params = request.model_dump()
+
+    def work(job):
+        return {"indexes": build(vector_store, request.kind, request.m, request.ef_construction, request.lists)}
+
+    job = job_manager.submit("vector_index", work, params)
+    return {"status": "queued", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+
+@router.delete("/vector_index/{kind}")
+async def remove_vector_index(kind: str):
+    """Drop an index, dense retrieval falls back to exact scans"""
+    if kind not in INDEX_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(INDEX_KINDS)}")
+    vector_store = await asyncio.to_thread(_vector_store)
+    indexes = await asyncio.to_thread(drop_vector_index, vector_store, kind)
+    return {"indexes": indexes, "count": len(indexes)}
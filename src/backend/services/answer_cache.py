@@ -0,0 +1,389 @@
+import abc
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from services.metrics import metrics
+
+# Answer cache configuration | "memory" keeps answers per process, "postgres"
+# shares them between workers through the answer_cache table, "none" disables it
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# Cosine similarity above which a different question counts as a near duplicate,
+# 0 turns the semantic tier off. Off by default: biomedical questions that
+# differ only by a negation ("does X inhibit Y" / "does X not inhibit Y")
+# embed well above 0.95 with bge-m3, so only exact normalised matches are safe.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0"))
+ANSWER_CACHE_TABLE = "answer_cache"
+ANSWER_CACHE_GENERATION_TABLE = "answer_cache_generation"
+
+
+def normalise_question(text: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+class AnswerCache(abc.ABC):
+    """
+    Two tier cache of structured answers.
+
+    The exact tier matches on the normalised question, the semantic tier
+    (when a similarity threshold is set) on cosine similarity of the query
+    embedding. Entries are scoped to a query engine configuration, expire
+    after a TTL and are evicted least recently used first. Every corpus
+    change bumps the generation, kept wherever the entries are, and answers
+    that were computed against an older generation are never stored.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # Last generation this process saw, see current_generation
+        self.generation = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(question: str, config) -> str:
+        raw = f"{tuple(config)}|{normalise_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, config):
+        """Exact tier lookup, returns the cached payload or None"""
+        payload = self._get(self.make_key(question, config))
+        if payload is not None:
+            self.exact_hits += 1
+        return payload
+
+    def get_similar(self, embedding, config):
+        """Semantic tier lookup on the query embedding, returns the payload or None"""
+        payload = None
+        if embedding is not None and self.similarity_threshold > 0:
+            payload = self._get_similar(embedding, str(tuple(config)))
+        if payload is not None:
+            self.semantic_hits += 1
+        else:
+            self.misses += 1
+        return payload
+
+    def put(self, question: str, config, embedding, payload: dict, generation: int):
+        """
+        Store an answer unless the corpus changed while it was computed
+
+        Args:
+            generation (int): current_generation() from before retrieval started
+        """
+        self._put(self.make_key(question, config), str(tuple(config)), question, embedding, payload, generation)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "generation": self.generation,
+        }
+
+    @abc.abstractmethod
+    def current_generation(self) -> int:
+        """The corpus generation, read before computing an answer to put"""
+
+    @abc.abstractmethod
+    def invalidate(self):
+        """Bump the generation and drop every entry, called whenever the document corpus changes"""
+
+    @abc.abstractmethod
+    def _get(self, key: str):
+        pass
+
+    @abc.abstractmethod
+    def _get_similar(self, embedding, config_key: str):
+        pass
+
+    @abc.abstractmethod
+    def _put(self, key: str, config_key: str, question: str, embedding, payload: dict, generation: int):
+        pass
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+
+class DisabledAnswerCache(AnswerCache):
+    """Cache backend that never stores anything"""
+
+    def current_generation(self):
+        return self.generation
+
+    def invalidate(self):
+        pass
+
+    def _get(self, key):
+        return None
+
+    def _get_similar(self, embedding, config_key):
+        return None
+
+    def _put(self, key, config_key, question, embedding, payload, generation):
+        pass
+
+    def clear(self):
+        pass
+
+
+class InMemoryAnswerCache(AnswerCache):
+    """Per process LRU cache, entries are (config_key, unit embedding, payload, stored_at)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def current_generation(self):
+        with self._lock:
+            return self.generation
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.monotonic() - stored_at > self.ttl_seconds
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[3]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def _get_similar(self, embedding, config_key):
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, (entry_config, vector, _, stored_at) in list(self._entries.items()):
+                if self._expired(stored_at):
+                    del self._entries[key]
+                    continue
+                if entry_config != config_key or vector is None:
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][2]
+
+    def _put(self, key, config_key, question, embedding, payload, generation):
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (config_key, vector, payload, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PostgresAnswerCache(AnswerCache):
+    """
+    Cache shared by every worker through a table next to the document embeddings, on the shared pool
+
+    The generation is a single row next to it. Invalidating bumps it in the
+    same transaction as the DELETE, and a put locks it and only inserts when
+    it still matches, so no worker stores an answer from before another
+    worker's corpus change.
+    """
+
+    def __init__(self, embed_dim: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.embed_dim = embed_dim
+        self._engine = None
+        self._lock = Lock()
+
+    def _get_engine(self):
+        from sqlalchemy import text
+        from services.initalise_vector_store import get_vector_store
+
+        with self._lock:
+            if self._engine is None:
+                # Share the vector store's pool instead of opening a second one
+                vector_store = get_vector_store()
+                engine = vector_store.client if vector_store else None
+                if engine is None:
+                    raise RuntimeError("Vector store is not available")
+                with engine.begin() as conn:
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                    conn.execute(text(f"""
+                        CREATE TABLE IF NOT EXISTS {ANSWER_CACHE_TABLE} (
+                            cache_key TEXT PRIMARY KEY,
+                            config TEXT NOT NULL,
+                            question TEXT NOT NULL,
+                            embedding vector({self.embed_dim}),
+                            payload JSONB NOT NULL,
+                            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                            last_used_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                        )
+                    """))
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS {ANSWER_CACHE_TABLE}_last_used_idx "
+                        f"ON {ANSWER_CACHE_TABLE} (last_used_at)"
+                    ))
+                    conn.execute(text(f"""
+                        CREATE TABLE IF NOT EXISTS {ANSWER_CACHE_GENERATION_TABLE} (
+                            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                            generation BIGINT NOT NULL
+                        )
+                    """))
+                    conn.execute(text(
+                        f"INSERT INTO {ANSWER_CACHE_GENERATION_TABLE} (generation) VALUES (0) "
+                        f"ON CONFLICT (id) DO NOTHING"
+                    ))
+                self._engine = engine
+            return self._engine
+
+    def current_generation(self):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            self.generation = conn.execute(
+                text(f"SELECT generation FROM {ANSWER_CACHE_GENERATION_TABLE}")
+            ).scalar_one()
+        return self.generation
+
+    def invalidate(self):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            self.generation = conn.execute(text(
+                f"UPDATE {ANSWER_CACHE_GENERATION_TABLE} SET generation = generation + 1 RETURNING generation"
+            )).scalar_one()
+            conn.execute(text(f"DELETE FROM {ANSWER_CACHE_TABLE}"))
+
+    def _get(self, key):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            row = conn.execute(text(f"""
+                UPDATE {ANSWER_CACHE_TABLE} SET last_used_at = now()
+                WHERE cache_key = :key
+                  AND created_at > now() - make_interval(secs => :ttl)
+                RETURNING payload
+            """), {"key": key, "ttl": self.ttl_seconds}).fetchone()
+        return row.payload if row else None
+
+    def _get_similar(self, embedding, config_key):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            row = conn.execute(text(f"""
+                SELECT cache_key, payload,
+                       1 - (embedding <=> CAST(:embedding AS vector)) AS similarity
+                FROM {ANSWER_CACHE_TABLE}
+                WHERE config = :config
+                  AND embedding IS NOT NULL
+                  AND created_at > now() - make_interval(secs => :ttl)
+                ORDER BY embedding <=> CAST(:embedding AS vector)
+                LIMIT 1
+            """), {
+                "embedding": str(list(embedding)),
+                "config": config_key,
+                "ttl": self.ttl_seconds,
+            }).fetchone()
+            if row is None or row.similarity < self.similarity_threshold:
+                return None
+            conn.execute(
+                text(f"UPDATE {ANSWER_CACHE_TABLE} SET last_used_at = now() WHERE cache_key = :key"),
+                {"key": row.cache_key},
+            )
+        return row.payload
+
+    def _put(self, key, config_key, question, embedding, payload, generation):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            # FOR SHARE waits for a concurrent invalidate to commit and then
+            # reads its generation, and holds it off until this insert commits
+            current = conn.execute(
+                text(f"SELECT generation FROM {ANSWER_CACHE_GENERATION_TABLE} FOR SHARE")
+            ).scalar_one()
+            if current != generation:
+                return
+            conn.execute(text(f"""
+                INSERT INTO {ANSWER_CACHE_TABLE} (cache_key, config, question, embedding, payload)
+                VALUES (:key, :config, :question, CAST(:embedding AS vector), CAST(:payload AS JSONB))
+                ON CONFLICT (cache_key) DO UPDATE
+                SET payload = EXCLUDED.payload, embedding = EXCLUDED.embedding,
+                    created_at = now(), last_used_at = now()
+            """), {
+                "key": key,
+                "config": config_key,
+                "question": question,
+                "embedding": str(list(embedding)) if embedding is not None else None,
+                "payload": json.dumps(payload),
+            })
+            # Expire old entries and evict least recently used ones past the limit
+            conn.execute(text(f"""
+                DELETE FROM {ANSWER_CACHE_TABLE}
+                WHERE created_at <= now() - make_interval(secs => :ttl)
+                   OR cache_key IN (
+                       SELECT cache_key FROM {ANSWER_CACHE_TABLE}
+                       ORDER BY last_used_at DESC OFFSET :max_entries
+                   )
+            """), {"ttl": self.ttl_seconds, "max_entries": self.max_entries})
+
+    def clear(self):
+        from sqlalchemy import text
+
+        with self._get_engine().begin() as conn:
+            conn.execute(text(f"DELETE FROM {ANSWER_CACHE_TABLE}"))
+
+
+def create_answer_cache(backend: str = ANSWER_CACHE_BACKEND) -> AnswerCache:
+    if backend == "memory":
+        return InMemoryAnswerCache()
+    if backend == "postgres":
+        return PostgresAnswerCache()
+    if backend == "none":
+        return DisabledAnswerCache()
+    raise ValueError(f"Unknown answer cache backend: {backend}")
+
+
+# Process wide answer cache
+answer_cache = create_answer_cache()
+metrics.register_collector("answer_cache", answer_cache.stats)
+
+
+def invalidate_answer_cache():
+    """Forget every cached answer after the document corpus changed"""
+    try:
+        answer_cache.invalidate()
+        print("Answer cache invalidated")
+    except Exception as e:
+        print(f"Error invalidating answer cache: {e}")
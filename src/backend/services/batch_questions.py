@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+from typing import List
+from llama_index.core import VectorStoreIndex, Settings
+
+from services.llm import get_index
+from services.metrics import metrics
+from services.query_documents import answer_question
+from services.query_engine_pool import QueryEngineConfig, DEFAULT_QUERY_CONFIG
+from services.scheduler import scheduler_lane, BATCH
+
+# Batch configuration | LLM concurrency is what Ollama sees at once, in-flight
+# bounds how many questions are retrieving or waiting for the LLM together
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "16"))
+
+
+async def answer_batch(questions: List[str], index: VectorStoreIndex = None,
+                       config: QueryEngineConfig = DEFAULT_QUERY_CONFIG,
+                       llm_concurrency: int = BATCH_LLM_CONCURRENCY):
+    """
+    Answer many questions, yielding each result as soon as it finishes.
+
+    All questions are embedded up front in one batched call, retrieval runs
+    in parallel and at most `llm_concurrency` generations are sent to Ollama
+    at a time. Model calls go through the scheduler's batch lane. Each result
+    carries its position in the batch and its timing.
+
+    Yields:
+        dict: index, question, elapsed_ms and either the answer (response,
+        sources, cache) or an error message
+    """
+    if index is None:
+        index = await asyncio.to_thread(get_index)
+
+    start = time.perf_counter()
+    embed_model = Settings.embed_model
+    # Handed to each question, the cache may not hold them all by the time it runs
+    embeddings = [None] * len(questions)
+    if hasattr(embed_model, "aembed_queries"):
+        with scheduler_lane(BATCH):
+            embeddings = await embed_model.aembed_queries(questions)
+    metrics.observe("batch.embedding_ms", (time.perf_counter() - start) * 1000)
+
+    llm_limit = asyncio.Semaphore(llm_concurrency)
+    in_flight = asyncio.Semaphore(BATCH_MAX_IN_FLIGHT)
+
+    async def run(position: int, question: str) -> dict:
+        async with in_flight:
+            item_start = time.perf_counter()
+            try:
+                result = await answer_question(question, index, config, llm_limit=llm_limit,
+                                               query_embedding=embeddings[position])
+            except Exception as e:
+                print(f"Error answering batch question {position}: {e}")
+                result = {"error": str(e)}
+            elapsed_ms = (time.perf_counter() - item_start) * 1000
+            metrics.observe("batch.item_ms", elapsed_ms)
+            return {"index": position, "question": question, "elapsed_ms": round(elapsed_ms, 1), **result}
+
+    # Tasks copy the context they are created in, so all their model calls
+    # queue in the batch lane behind interactive questions
+    with scheduler_lane(BATCH):
+        tasks = [asyncio.create_task(run(position, question)) for position, question in enumerate(questions)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # Stop outstanding work if the client goes away mid-stream
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,134 @@
+import io
+import json
+import struct
+from typing import Iterable, Iterator, List
+
+import numpy as np
+from sqlalchemy import text
+
+# Binary COPY framing, see the PostgreSQL COPY documentation
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+STAGING_TABLE = "document_embeddings_staging"
+COPY_COLUMNS = ("node_id", "text", "metadata_", "embedding")
+
+
+def encode_vector(embedding, halfvec: bool = False) -> bytes:
+    """pgvector's binary format: dimensions and a reserved int16, then big-endian float32s (float16s for halfvec)"""
+    values = np.asarray(embedding, dtype=">f2" if halfvec else ">f4")
+    return struct.pack("!hh", len(values), 0) + values.tobytes()
+
+
+def _field(value: bytes) -> bytes:
+    if value is None:
+        return struct.pack("!i", -1)
+    return struct.pack("!i", len(value)) + value
+
+
+def encode_copy_rows(rows: Iterable[dict], jsonb: bool = False, halfvec: bool = False) -> Iterator[bytes]:
+    """
+    Encode table rows as a binary COPY stream, one chunk per row.
+
+    Args:
+        rows: Dicts with node_id, text, metadata_ and embedding
+        jsonb (bool): Whether metadata_ is jsonb rather than json
+        halfvec (bool): Whether embedding is halfvec rather than vector
+
+    Yields:
+        bytes: The header, each row, and the trailer
+    """
+    yield COPY_HEADER
+    column_count = struct.pack("!h", len(COPY_COLUMNS))
+    for row in rows:
+        metadata = json.dumps(row["metadata_"]).encode("utf-8")
+        if jsonb:
+            # jsonb's binary format is a version byte followed by the text
+            metadata = b"\x01" + metadata
+        yield b"".join((
+            column_count,
+            _field(row["node_id"].encode("utf-8")),
+            _field(row["text"].encode("utf-8")),
+            _field(metadata),
+            _field(encode_vector(row["embedding"], halfvec)),
+        ))
+    yield COPY_TRAILER
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view of a chunk iterator, so COPY streams rows as they are encoded"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._pending) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending += chunk
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def _staging_statement(table: str):
+    # Created per load with the target's column types as they are now, so a
+    # storage migration (vector to halfvec) is picked up by pooled
+    # connections too. ON COMMIT DROP cleans up if the merge never runs.
+    return text(
+        f"CREATE TEMPORARY TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+        f"SELECT {', '.join(COPY_COLUMNS)} FROM {table} WITH NO DATA"
+    )
+
+
+def _merge_statements(table: str):
+    columns = ", ".join(COPY_COLUMNS)
+    return [
+        text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE}"),
+        # Dropped straight away, so one transaction can load more than once
+        text(f"DROP TABLE {STAGING_TABLE}"),
+    ]
+
+
+def copy_rows(session, table: str, rows: List[dict], jsonb: bool = False, halfvec: bool = False):
+    """
+    Load rows into the table through COPY and a staging table, in the session's transaction.
+
+    Rows are streamed to the staging table in binary, then moved over with
+    one INSERT ... SELECT, so the table's generated columns and indexes are
+    filled exactly as for an ordinary insert.
+    """
+    session.execute(_staging_statement(table))
+    cursor = session.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+            _ChunkReader(encode_copy_rows(rows, jsonb, halfvec)),
+        )
+    finally:
+        cursor.close()
+    for statement in _merge_statements(table):
+        session.execute(statement)
+
+
+async def acopy_rows(session, table: str, rows: List[dict], jsonb: bool = False, halfvec: bool = False):
+    await session.execute(_staging_statement(table))
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+
+    async def source():
+        for chunk in encode_copy_rows(rows, jsonb, halfvec):
+            yield chunk
+
+    await raw.driver_connection.copy_to_table(
+        STAGING_TABLE, source=source(), columns=list(COPY_COLUMNS), format="binary"
+    )
+    for statement in _merge_statements(table):
+        await session.execute(statement)
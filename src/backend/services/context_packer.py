@@ -0,0 +1,93 @@
+import os
+from typing import List, Optional
+from llama_index.core import Settings
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.indices.prompt_helper import PromptHelper
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.prompts import BasePromptTemplate
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from services.llm_usage import record_context_tokens
+from services.metrics import metrics
+
+# Context packing configuration | the budget is further capped by what fits in
+# the model's context window next to the prompt, so one LLM call always suffices
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Nodes scoring below this fraction of the best node's score are dropped
+CONTEXT_SCORE_RATIO = float(os.getenv("CONTEXT_SCORE_RATIO", "0.5"))
+# CompactAndRefine joins node texts with a blank line
+CHUNK_SEPARATOR = "\n\n"
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """
+    Fit the retrieved nodes into a single prompt.
+
+    Nodes below an adaptive cutoff, relative to the best score, are dropped.
+    The rest are added best first while they fit in the token budget, which
+    is capped by the space the prompts leave in the LLM's context window. The
+    best node is truncated rather than dropped if it does not fit on its own.
+    """
+
+    token_budget: int = Field(default=CONTEXT_TOKEN_BUDGET)
+    score_ratio: float = Field(default=CONTEXT_SCORE_RATIO)
+    prompts: List[BasePromptTemplate] = Field(default_factory=list)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def available_tokens(self, query_str: str) -> int:
+        """Tokens left for context once the largest prompt and the query are in"""
+        available = self.token_budget
+        llm = Settings.llm
+        prompt_helper = PromptHelper.from_llm_metadata(llm.metadata)
+        for prompt in self.prompts:
+            prompt = prompt.partial_format(query_str=query_str)
+            available = min(available, prompt_helper._get_available_chunk_size(prompt, llm=llm))
+        return max(available, 0)
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+        tokenizer = Settings.tokenizer
+        budget = self.available_tokens(query_bundle.query_str if query_bundle else "")
+        separator_tokens = len(tokenizer(CHUNK_SEPARATOR))
+
+        ranked = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        cutoff = (ranked[0].score or 0.0) * self.score_ratio
+
+        packed = []
+        used = 0
+        for node in ranked:
+            if packed and (node.score or 0.0) < cutoff:
+                break
+            tokens = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+            cost = tokens + (separator_tokens if packed else 0)
+            if used + cost <= budget:
+                packed.append(node)
+                used += cost
+            elif not packed:
+                node = self._truncate(node, budget)
+                packed.append(node)
+                used = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+
+        metrics.incr("context_packer.dropped_nodes", len(nodes) - len(packed))
+        record_context_tokens(used)
+        return packed
+
+    def _truncate(self, node: NodeWithScore, budget: int) -> NodeWithScore:
+        """Shorten a node's text so the node, with its metadata, fits the budget"""
+        tokenizer = Settings.tokenizer
+        metadata_tokens = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM))) \
+            - len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.NONE)))
+        words = node.node.get_content(metadata_mode=MetadataMode.NONE).split(" ")
+        # Cut words until it fits, halving the overshoot each step
+        while words and len(tokenizer(" ".join(words))) > budget - metadata_tokens:
+            overshoot = len(tokenizer(" ".join(words))) - (budget - metadata_tokens)
+            words = words[:max(len(words) - max(overshoot // 2, 1), 0)]
+        truncated = node.node.model_copy()
+        truncated.set_content(" ".join(words))
+        metrics.incr("context_packer.truncated_nodes")
+        return NodeWithScore(node=truncated, score=node.score)
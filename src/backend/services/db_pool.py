@@ -0,0 +1,65 @@
+import time
+from threading import Lock
+
+from services.metrics import metrics
+
+
+class PoolMonitor:
+    """
+    Pool metrics for the SQLAlchemy engines the backend shares.
+
+    Checkout, checkin and new connections are counted through pool events.
+    Waiting time for a connection has no event of its own, so each pool's
+    internal get is wrapped to time it. Saturation is checked out connections
+    over the pool's capacity (size plus overflow), read at snapshot time.
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = Lock()
+
+    def instrument(self, name: str, engine):
+        """Attach the listeners to an engine's pool, once per engine"""
+        from sqlalchemy import event
+
+        # Async engines keep their pool on the wrapped sync engine
+        pool = getattr(engine, "sync_engine", engine).pool
+        with self._lock:
+            if self._engines.get(name) is pool:
+                return
+            self._engines[name] = pool
+
+        event.listen(pool, "connect", lambda *args: metrics.incr(f"db_pool.{name}.connects"))
+        event.listen(pool, "checkout", lambda *args: metrics.incr(f"db_pool.{name}.checkouts"))
+        event.listen(pool, "checkin", lambda *args: metrics.incr(f"db_pool.{name}.checkins"))
+
+        do_get = pool._do_get
+
+        def timed_do_get():
+            start = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                metrics.observe(f"db_pool.{name}.checkout_wait_ms", (time.perf_counter() - start) * 1000)
+
+        pool._do_get = timed_do_get
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = dict(self._engines)
+        stats = {}
+        for name, pool in pools.items():
+            size = pool.size()
+            checked_out = pool.checkedout()
+            capacity = size + max(pool._max_overflow, 0)
+            stats[name] = {
+                "size": size,
+                "checked_out": checked_out,
+                "overflow": pool.overflow(),
+                "saturation": round(checked_out / capacity, 3) if capacity else None,
+            }
+        return stats
+
+
+pool_monitor = PoolMonitor()
+metrics.register_collector("db_pool", pool_monitor.stats)
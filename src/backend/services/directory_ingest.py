@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterator, List, Optional
+
+from llama_index.core import Document
+
+from services.answer_cache import invalidate_answer_cache
+from services.document_store import store_documents
+from services.metrics import metrics
+
+# Directory ingestion configuration | files embedded and committed together,
+# at most two batches are held in memory at once
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# Threads reading files while the previous batch is embedded
+INGEST_READ_WORKERS = int(os.getenv("INGEST_READ_WORKERS", "4"))
+# Progress file kept in the ingested directory
+INGEST_CHECKPOINT_FILE = ".ingest_checkpoint.json"
+
+STATUSES = ("inserted", "updated", "unchanged")
+
+
+def iter_text_files(directory_path: str) -> Iterator[str]:
+    """
+    Yield the directory's .txt paths in name order. Only the names are listed
+    up front, so files can be moved out while the rest are still to come.
+    """
+    for name in sorted(os.listdir(directory_path)):
+        if name.endswith(".txt"):
+            yield os.path.join(directory_path, name)
+
+
+def read_document(text_path: str) -> Optional[Document]:
+    """
+    Read a text file and the JSON metadata next to it, if any
+
+    Args:
+        text_path (str): Path of the .txt file
+
+    Returns:
+        Document or None: The document, None if the text cannot be read
+    """
+    json_path = f"{os.path.splitext(text_path)[0]}.json"
+    try:
+        with open(text_path, "r") as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Error reading {text_path}: {e}")
+        return None
+
+    metadata = {"file_path": text_path}
+    if os.path.exists(json_path):
+        try:
+            with open(json_path, "r") as f:
+                metadata.update(json.load(f))
+            # Moved together with the text file once the batch is stored
+            metadata["json_file_path"] = json_path
+        except Exception as e:
+            print(f"Error reading JSON metadata {json_path}: {e}")
+    return Document(text=content, metadata=metadata)
+
+
+class Checkpoint:
+    """
+    Progress of a directory ingestion, kept in a small JSON file.
+
+    Files move to the processed directory as soon as their batch commits,
+    so whatever is still in the directory is what remains to do. The
+    checkpoint covers the gap between the commit and the moves, and keeps
+    the running totals across restarts until a run completes.
+    """
+
+    def __init__(self, directory_path: str):
+        self.path = os.path.join(directory_path, INGEST_CHECKPOINT_FILE)
+        self.state = {"committed": [], "counts": dict.fromkeys(STATUSES, 0), "batches": 0}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.state.update(json.load(f))
+            except Exception as e:
+                print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+
+    def save(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.state, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def move_files(paths: List[str], processed_dir: str):
+    for path in paths:
+        if os.path.exists(path):
+            shutil.move(path, os.path.join(processed_dir, os.path.basename(path)))
+
+
+def _batch_files(documents: List[Document]) -> List[str]:
+    files = []
+    for document in documents:
+        files.append(document.metadata["file_path"])
+        if document.metadata.get("json_file_path"):
+            files.append(document.metadata["json_file_path"])
+    return files
+
+
+def ingest_directory(vector_store, directory_path: str = "./documents",
+                     processed_dir: str = "./processed_documents",
+                     batch_size: int = INGEST_BATCH_SIZE,
+                     on_batch: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+    """
+    Stream a directory of documents into the vector store, batch by batch.
+
+    Files are read on a thread pool one batch ahead of the batch being
+    embedded, so memory holds two batches at most however large the
+    directory is. Each batch is committed on its own and its files moved
+    right after, so a failure only loses the batch in flight, and a rerun
+    resumes with the files that are left. Unchanged documents that a crash
+    left behind are skipped without embedding.
+
+    Args:
+        vector_store: The store to write to
+        directory_path (str): Directory holding .txt files and optional .json metadata
+        processed_dir (str): Where stored files are moved
+        batch_size (int): Documents per embedding and commit
+        on_batch (callable, optional): Called with each stored batch's status per doc_key,
+            raising from it stops the ingestion after that batch
+
+    Returns:
+        dict or None: Counts per status and batches stored, None if there were no files
+    """
+    os.makedirs(processed_dir, exist_ok=True)
+    checkpoint = Checkpoint(directory_path)
+    if checkpoint.state["committed"]:
+        # A previous run stopped after committing, before moving its files
+        move_files(checkpoint.state["committed"], processed_dir)
+        checkpoint.state["committed"] = []
+        checkpoint.save()
+
+    paths = iter_text_files(directory_path)
+    start = time.perf_counter()
+    found = False
+    with ThreadPoolExecutor(max_workers=INGEST_READ_WORKERS) as readers:
+        pending = [readers.submit(read_document, path) for path in islice(paths, batch_size)]
+        while pending:
+            found = True
+            batch = [document for document in (future.result() for future in pending) if document]
+            # Read the next batch while this one is embedded
+            pending = [readers.submit(read_document, path) for path in islice(paths, batch_size)]
+            if not batch:
+                continue
+
+            batch_start = time.perf_counter()
+            status = store_documents(vector_store, batch)
+            checkpoint.state["committed"] = _batch_files(batch)
+            for value in status.values():
+                checkpoint.state["counts"][value] += 1
+            checkpoint.state["batches"] += 1
+            checkpoint.save()
+
+            move_files(checkpoint.state["committed"], processed_dir)
+            checkpoint.state["committed"] = []
+            checkpoint.save()
+            if any(value != "unchanged" for value in status.values()):
+                invalidate_answer_cache()
+            metrics.incr("directory_ingest.batches")
+            metrics.observe("directory_ingest.batch_ms", (time.perf_counter() - batch_start) * 1000)
+            print(f"Stored batch {checkpoint.state['batches']} ({len(batch)} documents), "
+                  f"totals so far: {checkpoint.state['counts']}")
+            if on_batch is not None:
+                on_batch(status)
+
+    if not found:
+        return None
+    result = {**checkpoint.state["counts"], "batches": checkpoint.state["batches"],
+              "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+    checkpoint.clear()
+    return result
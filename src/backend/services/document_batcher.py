@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from typing import List
+
+from llama_index.core import Settings, Document
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import MetadataMode
+
+from services.answer_cache import invalidate_answer_cache
+from services.document_store import prepare_document, afind_known, split_known, awrite_nodes, DOC_KEY
+from services.initalise_vector_store import get_vector_store
+from services.metrics import metrics
+from services.scheduler import scheduler_lane, BATCH
+
+# Document ingestion configuration | documents embedded and inserted together
+DOCUMENT_BATCH_SIZE = int(os.getenv("DOCUMENT_BATCH_SIZE", "32"))
+# How long a single document waits for others to share its batch
+DOCUMENT_BATCH_MAX_WAIT_MS = float(os.getenv("DOCUMENT_BATCH_MAX_WAIT_MS", "50"))
+# Documents accepted by one /documents/batch request
+DOCUMENT_BATCH_MAX_DOCUMENTS = int(os.getenv("DOCUMENT_BATCH_MAX_DOCUMENTS", "1000"))
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def ingest_documents(documents: List[Document]) -> List[dict]:
+    """
+    Chunk, embed and store documents as one batch.
+
+    Documents the store already holds with the same content are skipped
+    before anything is embedded, changed ones replace their old rows. All
+    chunks are embedded in as few model requests as the embedding batch
+    size allows, then written in one transaction by write_nodes, streamed
+    through COPY by default, instead of building an index per document.
+
+    Args:
+        documents: The documents to store
+
+    Returns:
+        list: Per document id, status, stored node ids and the batch's timings, in input order
+    """
+    # Opens connections and runs startup checks the first time, off the loop
+    vector_store = await asyncio.to_thread(get_vector_store)
+    if not vector_store:
+        raise RuntimeError("Vector store is not available")
+
+    start = time.perf_counter()
+    documents = [prepare_document(document) for document in documents]
+    known = await afind_known(vector_store, [document.metadata[DOC_KEY] for document in documents])
+    to_write, _, status = split_known(documents, known)
+    lookup_ms = _elapsed_ms(start)
+
+    split_start = time.perf_counter()
+    nodes = await asyncio.to_thread(run_transformations, to_write, Settings.transformations) if to_write else []
+    split_ms = _elapsed_ms(split_start)
+
+    embed_start = time.perf_counter()
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    embeddings = await Settings.embed_model.aget_text_embedding_batch(texts) if texts else []
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    embedding_ms = _elapsed_ms(embed_start)
+
+    insert_start = time.perf_counter()
+    await awrite_nodes(vector_store, nodes, [document.metadata[DOC_KEY] for document in to_write])
+    insert_ms = _elapsed_ms(insert_start)
+    if to_write:
+        # A DELETE on the Postgres backend, keep it off the event loop
+        await asyncio.to_thread(invalidate_answer_cache)
+
+    timings = {
+        "lookup_ms": lookup_ms,
+        "split_ms": split_ms,
+        "embedding_ms": embedding_ms,
+        "insert_ms": insert_ms,
+        "total_ms": _elapsed_ms(start),
+    }
+    metrics.incr("documents.ingested", len(to_write))
+    metrics.incr("documents.nodes", len(nodes))
+    metrics.observe("documents.batch_size", len(documents))
+    metrics.observe("documents.embedding_ms", embedding_ms)
+    metrics.observe("documents.insert_ms", insert_ms)
+
+    node_ids = {key: [] for key in status}
+    for node in nodes:
+        node_ids[node.ref_doc_id].append(node.node_id)
+    return [
+        {"id": document.doc_id, "status": status[document.doc_id], "node_ids": node_ids[document.doc_id],
+         "batch_size": len(documents), "timings": timings}
+        for document in documents
+    ]
+
+
+class DocumentBatcher:
+    """
+    Coalesces concurrently submitted documents into ingestion batches.
+
+    A batch is flushed once it holds `batch_size` documents or its first
+    document has waited `max_wait_ms`, whichever comes first, so a lone
+    request only pays the wait window while a burst of single document
+    calls shares the lookup, the embedding requests and one write. Batches
+    run one at a time in the scheduler's batch lane, and documents queue up
+    meanwhile.
+    """
+
+    def __init__(self, batch_size: int = DOCUMENT_BATCH_SIZE, max_wait_ms: float = DOCUMENT_BATCH_MAX_WAIT_MS):
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue()
+                self._loop = loop
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, document: Document) -> dict:
+        """
+        Queue a document and wait for its batch to be stored
+
+        Returns:
+            dict: The document's id, node ids and timings, including time spent queued
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((document, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        with scheduler_lane(BATCH):
+            while True:
+                batch = [await self._queue.get()]
+                deadline = self._loop.time() + self.max_wait
+                while len(batch) < self.batch_size:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush(batch)
+
+    async def _flush(self, batch):
+        flushed_at = time.perf_counter()
+        try:
+            results = await ingest_documents([document for document, _, _ in batch])
+        except Exception as e:
+            print(f"Error ingesting document batch: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, queued_at), result in zip(batch, results):
+            if not future.done():
+                result["timings"] = {"queued_ms": round((flushed_at - queued_at) * 1000, 1), **result["timings"]}
+                future.set_result(result)
+
+
+# Process wide batcher for single document requests
+document_batcher = DocumentBatcher()
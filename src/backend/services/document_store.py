@@ -0,0 +1,224 @@
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+from llama_index.core import Document, Settings
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode, MetadataMode
+from sqlalchemy import bindparam, insert, text
+
+from services.bulk_writer import copy_rows, acopy_rows
+from services.metrics import metrics
+
+# Metadata keys that identify a stored document, kept out of the embedded
+# and LLM text. Postgres mirrors them into indexed columns.
+DOC_KEY = "doc_key"
+CONTENT_HASH = "content_hash"
+DEDUP_KEYS = [DOC_KEY, CONTENT_HASH]
+# file_path the API gives documents sent without metadata, not an identity
+UNKNOWN_FILE_PATH = "unknown"
+
+# How new rows are written | "copy" streams them through binary COPY into a
+# staging table, "insert" uses a multi-row INSERT
+DOCUMENT_WRITE_METHOD = os.getenv("DOCUMENT_WRITE_METHOD", "copy")
+
+
+def _table(vector_store) -> str:
+    return f'"{vector_store.schema_name}"."{vector_store._table_class.__tablename__}"'
+
+
+def ensure_dedup_columns(vector_store):
+    """
+    Add the doc_key and content_hash columns and their index, once per table.
+
+    Both are generated from the row's metadata, so every insert path, the
+    library's own included, fills them without knowing about them. Rows
+    stored before there were keys fall back to their PMID, so the next
+    ingestion of the same abstract replaces them instead of duplicating them.
+    """
+    tablename = vector_store._table_class.__tablename__
+    with vector_store._engine.begin() as connection:
+        connection.execute(text(f"""
+            ALTER TABLE {_table(vector_store)}
+                ADD COLUMN IF NOT EXISTS doc_key VARCHAR
+                    GENERATED ALWAYS AS (
+                        COALESCE(metadata_->>'{DOC_KEY}', 'pmid:' || (metadata_->>'pmid'))
+                    ) STORED,
+                ADD COLUMN IF NOT EXISTS content_hash VARCHAR
+                    GENERATED ALWAYS AS (metadata_->>'{CONTENT_HASH}') STORED
+        """))
+    # CONCURRENTLY cannot run inside a transaction, and keeps writes going
+    with vector_store._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{tablename}_doc_key_idx" '
+            f"ON {_table(vector_store)} (doc_key, content_hash)"
+        ))
+
+
+def content_hash(text_content: str) -> str:
+    return hashlib.sha256(text_content.encode("utf-8")).hexdigest()
+
+
+def prepare_document(document: Document) -> Document:
+    """
+    Give a document its deduplication key and content hash.
+
+    The key is the PMID when there is one, then a key the caller set in the
+    metadata, then the file the document was read from, so an edited file
+    replaces its old rows. The content hash only detects changes; it is the
+    key only for documents with no identity at all, such as API text sent
+    without an id. The document id becomes the key, so all of a document's
+    chunks can be found and replaced together. Only the text is hashed,
+    metadata changes alone do not trigger a re-embed.
+    """
+    digest = content_hash(document.text)
+    pmid = document.metadata.get("pmid")
+    file_path = document.metadata.get("file_path")
+    if pmid:
+        key = f"pmid:{pmid}"
+    elif document.metadata.get(DOC_KEY):
+        key = document.metadata[DOC_KEY]
+    elif file_path and file_path != UNKNOWN_FILE_PATH:
+        key = f"file:{os.path.normpath(file_path)}"
+    else:
+        key = f"sha256:{digest}"
+    document.metadata[DOC_KEY] = key
+    document.metadata[CONTENT_HASH] = digest
+    document.id_ = key
+    for excluded in (document.excluded_embed_metadata_keys, document.excluded_llm_metadata_keys):
+        excluded.extend(name for name in DEDUP_KEYS if name not in excluded)
+    return document
+
+
+def _known_query(vector_store):
+    return text(
+        f"SELECT DISTINCT doc_key, content_hash FROM {_table(vector_store)} WHERE doc_key IN :keys"
+    ).bindparams(bindparam("keys", expanding=True))
+
+
+def _delete_query(vector_store):
+    return text(
+        f"DELETE FROM {_table(vector_store)} WHERE doc_key IN :keys"
+    ).bindparams(bindparam("keys", expanding=True))
+
+
+def _lock_query(vector_store):
+    # Writers of one table take turns, so two batches holding the same
+    # document cannot both insert it
+    return text("SELECT pg_advisory_xact_lock(hashtext(:table))").bindparams(table=_table(vector_store))
+
+
+def split_known(documents: List[Document], known: Dict[str, set]) -> Tuple[List[Document], List[Document], Dict[str, str]]:
+    """
+    Sort prepared documents by what the store already holds.
+
+    Args:
+        documents: Documents passed through prepare_document
+        known: Stored content hashes per doc_key
+
+    Returns:
+        tuple: Documents to write, unchanged documents to skip, and the
+        status ("inserted", "updated" or "unchanged") of every doc_key
+    """
+    latest = {}
+    for document in documents:
+        # The last copy of a key sent twice in one batch wins
+        latest[document.metadata[DOC_KEY]] = document
+    to_write, unchanged, status = [], [], {}
+    for key, document in latest.items():
+        hashes = known.get(key)
+        if not hashes:
+            status[key] = "inserted"
+            to_write.append(document)
+        elif hashes == {document.metadata[CONTENT_HASH]}:
+            status[key] = "unchanged"
+            unchanged.append(document)
+        else:
+            status[key] = "updated"
+            to_write.append(document)
+    metrics.incr("documents.skipped_unchanged", len(unchanged))
+    return to_write, unchanged, status
+
+
+def _group_known(rows) -> Dict[str, set]:
+    known = {}
+    for key, digest in rows:
+        known.setdefault(key, set()).add(digest)
+    return known
+
+
+def find_known(vector_store, keys: List[str]) -> Dict[str, set]:
+    """Stored content hashes per doc_key, for the given keys"""
+    if not keys:
+        return {}
+    with vector_store.session() as session:
+        return _group_known(session.execute(_known_query(vector_store), {"keys": keys}).all())
+
+
+async def afind_known(vector_store, keys: List[str]) -> Dict[str, set]:
+    if not keys:
+        return {}
+    async with vector_store.async_session() as session:
+        result = await session.execute(_known_query(vector_store), {"keys": keys})
+        return _group_known(result.all())
+
+
+def _row_values(vector_store, nodes: List[BaseNode]) -> List[dict]:
+    return [vector_store.table_row(node) for node in nodes]
+
+
+def write_nodes(vector_store, nodes: List[BaseNode], keys: List[str], method: str = DOCUMENT_WRITE_METHOD):
+    """
+    Replace the stored rows of the given doc_keys with nodes, in one transaction.
+
+    Deleting the keys first turns an insert of a changed document into an
+    upsert, and makes writing the same document twice harmless.
+    """
+    if not keys:
+        return
+    values = _row_values(vector_store, nodes)
+    with vector_store.session() as session, session.begin():
+        session.execute(_lock_query(vector_store))
+        session.execute(_delete_query(vector_store), {"keys": keys})
+        if values and method == "copy":
+            copy_rows(session, _table(vector_store), values, jsonb=vector_store.use_jsonb,
+                      halfvec=vector_store.use_halfvec)
+        elif values:
+            session.execute(insert(vector_store.table), values)
+
+
+async def awrite_nodes(vector_store, nodes: List[BaseNode], keys: List[str], method: str = DOCUMENT_WRITE_METHOD):
+    if not keys:
+        return
+    values = _row_values(vector_store, nodes)
+    async with vector_store.async_session() as session, session.begin():
+        await session.execute(_lock_query(vector_store))
+        await session.execute(_delete_query(vector_store), {"keys": keys})
+        if values and method == "copy":
+            await acopy_rows(session, _table(vector_store), values, jsonb=vector_store.use_jsonb,
+                             halfvec=vector_store.use_halfvec)
+        elif values:
+            await session.execute(insert(vector_store.table), values)
+
+
+def store_documents(vector_store, documents: List[Document]) -> Dict[str, str]:
+    """
+    Incrementally store documents from synchronous code.
+
+    Unchanged documents are skipped before any embedding call, new and
+    changed ones are chunked, embedded in batches and written.
+
+    Returns:
+        dict: The status of every doc_key
+    """
+    documents = [prepare_document(document) for document in documents]
+    known = find_known(vector_store, [document.metadata[DOC_KEY] for document in documents])
+    to_write, _, status = split_known(documents, known)
+    if to_write:
+        nodes = run_transformations(to_write, Settings.transformations)
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = Settings.embed_model.get_text_embedding_batch(texts)
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        write_nodes(vector_store, nodes, [document.metadata[DOC_KEY] for document in to_write])
+    return status
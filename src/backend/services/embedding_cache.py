@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from services.metrics import metrics
+from services.scheduler import scheduler
+
+# Query embedding cache configuration | set EMBEDDING_CACHE_PATH to keep
+# embeddings on disk between restarts, leave it empty for memory only
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+
+
+class PersistentEmbeddingStore:
+    """On-disk embedding store backed by a single SQLite file"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def put(self, key: str, embedding: List[float]):
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)", (key, blob)
+            )
+            self._conn.commit()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that caches query embeddings.
+
+    Lookups go to a bounded in-memory LRU first and then to the optional
+    persistent store, keyed by model name plus a hash of the text. Identical
+    queries embedded concurrently (e.g. by both legs of the fusion retriever)
+    share a single call to the wrapped model. Document embeddings skip the
+    cache, and a batch of them goes to the model in a single request. Every
+    call that reaches the wrapped model takes a slot from the model's
+    scheduler first.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _lru: OrderedDict = PrivateAttr()
+    _max_entries: int = PrivateAttr()
+    _store: Optional[PersistentEmbeddingStore] = PrivateAttr()
+    _inflight: dict = PrivateAttr()
+    _lock: Lock = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 persist_path: Optional[str] = EMBEDDING_CACHE_PATH, **kwargs):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            callback_manager=inner.callback_manager,
+            **kwargs,
+        )
+        self._inner = inner
+        self._lru = OrderedDict()
+        self._max_entries = max_entries
+        self._store = PersistentEmbeddingStore(persist_path) if persist_path else None
+        self._inflight = {}
+        self._lock = Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def _scheduler(self):
+        return scheduler.for_model(self.model_name, kind="embedding")
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+        if embedding is not None:
+            metrics.incr("embedding_cache.memory_hits")
+        return embedding
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        embedding = self._store.get(key)
+        if embedding is not None:
+            metrics.incr("embedding_cache.disk_hits")
+            self._remember(key, embedding)
+        return embedding
+
+    def lookup(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query, or None (counted as a miss)"""
+        key = self._key(text)
+        embedding = self._memory_get(key)
+        if embedding is None and self._store is not None:
+            embedding = self._disk_get(key)
+        if embedding is None:
+            metrics.incr("embedding_cache.misses")
+        return embedding
+
+    async def alookup(self, text: str) -> Optional[List[float]]:
+        """lookup for async callers, the SQLite read runs in a worker thread"""
+        key = self._key(text)
+        embedding = self._memory_get(key)
+        if embedding is None and self._store is not None:
+            embedding = await asyncio.to_thread(self._disk_get, key)
+        if embedding is None:
+            metrics.incr("embedding_cache.misses")
+        return embedding
+
+    def store(self, text: str, embedding: List[float]):
+        """Add a query embedding to the cache, e.g. one computed in a batch"""
+        key = self._key(text)
+        self._remember(key, embedding)
+        if self._store is not None:
+            self._store.put(key, embedding)
+
+    async def astore(self, text: str, embedding: List[float]):
+        """store for async callers, the SQLite write runs in a worker thread"""
+        key = self._key(text)
+        self._remember(key, embedding)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.put, key, embedding)
+
+    def _remember(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._lru[key] = embedding
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._max_entries:
+                self._lru.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        embedding = self.lookup(query)
+        if embedding is None:
+            metrics.incr("embedding_cache.model_calls")
+            with self._scheduler.slot():
+                embedding = self._inner._get_query_embedding(query)
+            self.store(query, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        embedding = await self.alookup(query)
+        if embedding is not None:
+            return embedding
+
+        key = self._key(query)
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.incr("embedding_cache.coalesced")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, not this caller, so embed
+                # the query here instead
+                if not future.cancelled():
+                    raise
+                return await self._aget_query_embedding(query)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            metrics.incr("embedding_cache.model_calls")
+            async with self._scheduler.aslot():
+                embedding = await self._inner._aget_query_embedding(query)
+            future.set_result(embedding)
+            await self.astore(query, embedding)
+            return embedding
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark the exception as retrieved when nobody else was waiting
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            # Cancelled (client disconnect, batch cancel), release the followers
+            if not future.done():
+                future.cancel()
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed many queries with a single call to the wrapped model.
+
+        Cached queries are served from the cache, the rest are embedded in one
+        batch and stored, so later per-question lookups are all cache hits.
+        """
+        found = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            embedding = await self.alookup(query)
+            if embedding is None:
+                missing.append(query)
+            else:
+                found[query] = embedding
+
+        if missing:
+            metrics.incr("embedding_cache.model_calls")
+            embeddings = await self._aembed_batch(missing)
+            for query, embedding in zip(missing, embeddings):
+                await self.astore(query, embedding)
+                found[query] = embedding
+
+        return [found[query] for query in queries]
+
+    def _embed_options(self) -> dict:
+        from services.llm import model_keep_alive
+
+        return {
+            "model": self._inner.model_name,
+            "options": getattr(self._inner, "ollama_additional_kwargs", None),
+            "keep_alive": model_keep_alive(),
+        }
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with one request to the wrapped model where it supports it"""
+        client = getattr(self._inner, "_client", None)
+        with self._scheduler.slot():
+            if client is not None and hasattr(client, "embed"):
+                # Ollama's /api/embed accepts the whole batch in one request
+                result = client.embed(input=texts, **self._embed_options())
+                return [list(embedding) for embedding in result["embeddings"]]
+            return self._inner._get_text_embeddings(texts)
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        client = getattr(self._inner, "_async_client", None)
+        async with self._scheduler.aslot():
+            if client is not None and hasattr(client, "embed"):
+                result = await client.embed(input=texts, **self._embed_options())
+                return [list(embedding) for embedding in result["embeddings"]]
+            return await self._inner._aget_text_embeddings(texts)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        with self._scheduler.slot():
+            return self._inner._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        async with self._scheduler.aslot():
+            return await self._inner._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed_batch(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._lru)
+        return {
+            "model": self.model_name,
+            "memory_entries": size,
+            "max_entries": self._max_entries,
+            "persistent": self._store is not None,
+        }
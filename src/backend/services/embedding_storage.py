@@ -0,0 +1,213 @@
+"""
+How the document embeddings are stored and searched.
+
+"vector" keeps float32 embeddings, 4 KB per 1024-dimension row. "halfvec"
+keeps float16, halving the heap and the HNSW index at a recall cost that is
+usually below the noise. "binary" keeps halfvec rows but indexes only the
+sign bit of each dimension, a 32x smaller HNSW index. Queries search that
+index by Hamming distance for BINARY_RERANK_MULTIPLIER times the candidates
+and re-rank them by cosine distance on the stored floats.
+
+Switch an existing table with:
+    python -m services.embedding_storage --migrate halfvec
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from llama_index.core.vector_stores.types import MetadataFilters
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import bindparam, cast, func, select, text
+from sqlalchemy.dialects.postgresql import BIT
+
+# Embedding storage configuration | "vector", "halfvec" or "binary", see
+# above. Changing it for an existing table needs the migration.
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
+# Binary index candidates re-ranked on the floats, per result wanted
+BINARY_RERANK_MULTIPLIER = int(os.getenv("BINARY_RERANK_MULTIPLIER", "8"))
+
+STORAGE_TYPES = ("vector", "halfvec", "binary")
+
+
+def check_storage(storage: str):
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown embedding storage: {storage}, expected one of {', '.join(STORAGE_TYPES)}")
+
+
+def storage_of(vector_store) -> str:
+    return getattr(vector_store, "embedding_storage", "vector")
+
+
+def column_type(storage: str) -> str:
+    return "vector" if storage == "vector" else "halfvec"
+
+
+def operator_class(storage: str) -> str:
+    # PGVectorStore and the hybrid retriever rank by cosine distance (<=>)
+    return f"{column_type(storage)}_cosine_ops"
+
+
+def quantized_expression(dimensions: int, column: str = "embedding") -> str:
+    """The expression the binary index is built on, queries must order by exactly this"""
+    return f"CAST(binary_quantize({column}) AS bit({dimensions}))"
+
+
+def rerank_candidates(limit: int) -> int:
+    return limit * BINARY_RERANK_MULTIPLIER
+
+
+def dense_candidates_sql(vector_store) -> str:
+    """
+    The hybrid retriever's dense leg: the :candidates nearest rows to
+    :embedding that match {filters}, as (id, distance), ordered so the
+    table's ANN index serves it. The binary form also takes :rerank_candidates.
+    """
+    storage = storage_of(vector_store)
+    query_vector = f"CAST(CAST(:embedding AS text) AS {column_type(storage)})"
+    if storage != "binary":
+        return f"""
+    SELECT id, embedding <=> {query_vector} AS distance
+    FROM {{table}}
+    WHERE {{filters}}
+    ORDER BY distance
+    LIMIT :candidates
+"""
+    dimensions = vector_store.embed_dim
+    return f"""
+    SELECT id, embedding <=> {query_vector} AS distance
+    FROM (
+        SELECT id, embedding
+        FROM {{table}}
+        WHERE {{filters}}
+        ORDER BY {quantized_expression(dimensions)} <~> {quantized_expression(dimensions, query_vector)}
+        LIMIT :rerank_candidates
+    ) AS quantized
+    ORDER BY distance
+    LIMIT :candidates
+"""
+
+
+def build_rerank_query(vector_store, embedding: List[float], limit: int,
+                       metadata_filters: Optional[MetadataFilters] = None):
+    """
+    Dense query for binary storage: Hamming nearest candidates from the bit
+    index, re-ranked by cosine distance on the halfvec embeddings. Returns
+    the same columns as PGVectorStore's own query.
+    """
+    table = vector_store._table_class
+    dimensions = vector_store.embed_dim
+    query_vector = cast(bindparam("query_embedding", list(embedding), type_=HALFVEC(dimensions)), HALFVEC(dimensions))
+    hamming = cast(func.binary_quantize(table.embedding), BIT(dimensions)).op("<~>")(
+        cast(func.binary_quantize(query_vector), BIT(dimensions))
+    )
+    candidates = select(table.id, table.node_id, table.text, table.metadata_, table.embedding).order_by(hamming)
+    candidates = vector_store._apply_filters_and_limit(candidates, rerank_candidates(limit), metadata_filters).subquery()
+    distance = candidates.c.embedding.cosine_distance(query_vector).label("distance")
+    return (
+        select(candidates.c.id, candidates.c.node_id, candidates.c.text, candidates.c.metadata_, distance)
+        .order_by(distance)
+        .limit(limit)
+    )
+
+
+def _table(vector_store) -> str:
+    return f'"{vector_store.schema_name}"."{vector_store._table_class.__tablename__}"'
+
+
+def stored_column_type(vector_store) -> str:
+    """The embedding column's type in the database, e.g. "vector" or "halfvec" """
+    with vector_store._engine.connect() as connection:
+        stored = connection.execute(text("""
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding' AND NOT attisdropped
+        """), {"table": _table(vector_store)}).scalar()
+    return stored.split("(")[0] if stored else None
+
+
+def storage_problems(vector_store) -> List[str]:
+    """Differences between the configured storage and the table, empty when they agree"""
+    expected = column_type(storage_of(vector_store))
+    stored = stored_column_type(vector_store)
+    if stored and stored != expected:
+        return [f"embedding column is {stored} but EMBEDDING_STORAGE={storage_of(vector_store)} needs {expected}, "
+                f"run python -m services.embedding_storage --migrate {storage_of(vector_store)}"]
+    return []
+
+
+def migrate_embedding_storage(vector_store, storage: str) -> dict:
+    """
+    Convert the table's embeddings to another storage and rebuild its ANN index
+
+    The column change rewrites the table under an exclusive lock, so writes
+    and queries wait for it; plan it like any other schema migration. The
+    existing indexes are dropped first, since their operator classes only fit
+    the old type, and the storage's default index is built afterwards.
+    Restart the backend afterwards so pooled connections pick up the type.
+
+    Args:
+        vector_store: The store whose table is migrated
+        storage (str): "vector", "halfvec" or "binary"
+
+    Returns:
+        dict: The column type before and after, and the indexes afterwards
+    """
+    from services.vector_index import list_vector_indexes, ensure_vector_index
+
+    check_storage(storage)
+    dimensions = vector_store.embed_dim
+    target = column_type(storage)
+    before = stored_column_type(vector_store)
+    indexes = list_vector_indexes(vector_store)
+    if before != target:
+        stale = indexes
+    else:
+        # Same column type, only the float and the bit indexes swap
+        stale = [index for index in indexes if (index["kind"] == "binary") != (storage == "binary")]
+
+    with vector_store._engine.begin() as connection:
+        for index in stale:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{vector_store.schema_name}"."{index["name"]}"'))
+        if before != target:
+            print(f"Converting {_table(vector_store)}.embedding from {before} to {target}({dimensions})")
+            connection.execute(text(
+                f"ALTER TABLE {_table(vector_store)} ALTER COLUMN embedding TYPE {target}({dimensions}) "
+                f"USING embedding::{target}({dimensions})"
+            ))
+
+    vector_store.embedding_storage = storage
+    ensure_vector_index(vector_store)
+    return {"before": before, "after": stored_column_type(vector_store), "indexes": list_vector_indexes(vector_store)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check or migrate how embeddings are stored")
+    parser.add_argument("--migrate", choices=STORAGE_TYPES, help="Convert the table to this storage")
+    args = parser.parse_args(argv)
+
+    # Not get_vector_store, whose startup checks expect the configured storage
+    from services.initalise_vector_store import init_vector_store
+    vector_store = init_vector_store(args.migrate or EMBEDDING_STORAGE)
+    if not vector_store:
+        print("Vector store is not available")
+        return 1
+    vector_store._initialize()
+
+    if args.migrate:
+        result = migrate_embedding_storage(vector_store, args.migrate)
+        print(f"Embedding column {result['before']} -> {result['after']}")
+        for index in result["indexes"]:
+            print(f"  {index['name']} ({index['kind']}, {index['size_bytes'] / 2 ** 20:.1f} MB)")
+        if args.migrate != EMBEDDING_STORAGE:
+            print(f"Set EMBEDDING_STORAGE={args.migrate} before restarting the backend")
+        return 0
+
+    problems = storage_problems(vector_store)
+    print(f"Embedding column: {stored_column_type(vector_store)}, EMBEDDING_STORAGE={EMBEDDING_STORAGE}")
+    for problem in problems:
+        print(f"  {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
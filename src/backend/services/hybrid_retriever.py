@@ -0,0 +1,176 @@
+import os
+from typing import List
+from llama_index.core import Settings
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.vector_stores.postgres import PGVectorStore
+from llama_index.vector_stores.postgres.base import DBEmbeddingRow
+
+from services.embedding_storage import dense_candidates_sql, rerank_candidates, storage_of
+from services.metadata_columns import filters_sql
+from services.metrics import metrics
+from services.text_search import SPARSE_CANDIDATES, match_any
+from services.vector_index import binary_ef_search, current_search_tuning, search_settings
+
+# Candidates taken from each leg before fusion, as a multiple of top_k
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "1"))
+# Reciprocal rank fusion constant, the same k=60 QueryFusionRetriever uses
+RRF_K = 60
+
+# Fused score per mode, over the ranks and min-max normalised scores of both
+# legs. Each leg is weighted 1/2 to match QueryFusionRetriever's defaults.
+FUSION_EXPRESSIONS = {
+    "reciprocal_rerank": f"1.0 / ({RRF_K} + rank - 1)",
+    "relative_score": "0.5 * normalised",
+}
+
+HYBRID_QUERY = """
+WITH dense_candidates AS (
+    -- Plain ORDER BY distance LIMIT so the ANN index can serve it, see
+    -- services/embedding_storage.py
+{dense_candidates}),
+dense AS (
+    SELECT id, 1 - distance AS score, row_number() OVER (ORDER BY distance) AS rank
+    FROM dense_candidates
+),
+sparse_candidates AS (
+    -- GIN backed match on the stored tsvector, see services/text_search.py
+{sparse_candidates}),
+sparse AS (
+    SELECT id, score, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM sparse_candidates
+),
+legs AS (
+    SELECT id, rank,
+           CASE WHEN max(score) OVER () = min(score) OVER ()
+                THEN CASE WHEN max(score) OVER () > 0 THEN 1.0 ELSE 0.0 END
+                ELSE (score - min(score) OVER ()) / (max(score) OVER () - min(score) OVER ())
+           END AS normalised
+    FROM dense
+    UNION ALL
+    SELECT id, rank,
+           CASE WHEN max(score) OVER () = min(score) OVER ()
+                THEN CASE WHEN max(score) OVER () > 0 THEN 1.0 ELSE 0.0 END
+                ELSE (score - min(score) OVER ()) / (max(score) OVER () - min(score) OVER ())
+           END AS normalised
+    FROM sparse
+),
+fused AS (
+    SELECT id, sum({fusion}) AS score
+    FROM legs
+    GROUP BY id
+)
+SELECT d.node_id, d.text, d.metadata_, fused.score
+FROM fused
+JOIN {table} d ON d.id = fused.id
+ORDER BY fused.score DESC
+LIMIT :top_k
+"""
+
+
+class PostgresHybridRetriever(BaseRetriever):
+    """
+    Dense plus sparse hybrid retriever that runs entirely inside Postgres.
+
+    The pgvector nearest neighbours, the ts_rank full text ranking and the
+    score fusion are a single statement, so each question costs one round
+    trip and only the fused top_k rows leave the database. Scores follow
+    QueryFusionRetriever's reciprocal_rerank and relative_score modes.
+    """
+
+    def __init__(self, vector_store: PGVectorStore, top_k: int = 5,
+                 fusion_mode: str = "relative_score",
+                 candidate_k: int = None, hnsw_ef_search: int = None,
+                 ivfflat_probes: int = None, filters: tuple = None, **kwargs):
+        """
+        Args:
+            vector_store (PGVectorStore): The store holding the document embeddings
+            top_k (int): Number of fused results to return
+            fusion_mode (str): "reciprocal_rerank" or "relative_score"
+            candidate_k (int, optional): Rows taken from each leg before fusion
+            hnsw_ef_search (int, optional): HNSW search effort for the dense
+                leg, a search_tuning block around the query takes precedence
+            ivfflat_probes (int, optional): IVFFlat lists probed by the dense leg
+            filters (tuple, optional): Normalised metadata filters, applied
+                to both legs before ranking, see metadata_columns
+        """
+        if fusion_mode not in FUSION_EXPRESSIONS:
+            raise ValueError(f"Fusion mode not supported in SQL: {fusion_mode}")
+        super().__init__(**kwargs)
+        self._vector_store = vector_store
+        self._top_k = top_k
+        self._candidate_k = candidate_k or top_k * HYBRID_CANDIDATE_MULTIPLIER
+        self._fusion_mode = fusion_mode
+        self._hnsw_ef_search = hnsw_ef_search
+        self._ivfflat_probes = ivfflat_probes
+        self._filtered = bool(filters)
+        self._filter_sql, self._filter_params = filters_sql(filters)
+        self._sql = None
+
+    def _settings(self):
+        """SET LOCAL statements for this query's search effort"""
+        tuning = current_search_tuning()
+        ef_search = tuning.hnsw_ef_search or self._hnsw_ef_search
+        if storage_of(self._vector_store) == "binary":
+            ef_search = binary_ef_search(ef_search, rerank_candidates(self._candidate_k))
+        return search_settings(ef_search, tuning.ivfflat_probes or self._ivfflat_probes, filtered=self._filtered)
+
+    def _statement(self):
+        from sqlalchemy import text
+
+        if self._sql is None:
+            self._vector_store._initialize()
+            table = f"{self._vector_store.schema_name}.{self._vector_store._table_class.__tablename__}"
+            self._sql = text(HYBRID_QUERY.format(
+                table=table, fusion=FUSION_EXPRESSIONS[self._fusion_mode],
+                dense_candidates=dense_candidates_sql(self._vector_store).format(table=table, filters=self._filter_sql),
+                sparse_candidates=SPARSE_CANDIDATES.format(table=table, filters=self._filter_sql),
+            ))
+        return self._sql
+
+    def _params(self, query_bundle: QueryBundle) -> dict:
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        return {
+            "embedding": str(list(embedding)),
+            "query": query_bundle.query_str,
+            "match_any": match_any(query_bundle.query_str),
+            "text_search_config": self._vector_store.text_search_config,
+            "candidates": self._candidate_k,
+            "rerank_candidates": rerank_candidates(self._candidate_k),
+            "top_k": self._top_k,
+            **self._filter_params,
+        }
+
+    def _to_nodes(self, rows) -> List[NodeWithScore]:
+        result = self._vector_store._db_rows_to_query_result([
+            DBEmbeddingRow(node_id=row.node_id, text=row.text,
+                           metadata=row.metadata_, similarity=float(row.score))
+            for row in rows
+        ])
+        metrics.incr("hybrid_retriever.queries")
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, score in zip(result.nodes, result.similarities)
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        statement = self._statement()
+        params = self._params(query_bundle)
+        with self._vector_store._session() as session, session.begin():
+            for setting in self._settings():
+                session.execute(setting)
+            rows = session.execute(statement, params).all()
+        return self._to_nodes(rows)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = await Settings.embed_model.aget_query_embedding(query_bundle.query_str)
+        statement = self._statement()
+        params = self._params(query_bundle)
+        async with self._vector_store._async_session() as session, session.begin():
+            for setting in self._settings():
+                await session.execute(setting)
+            rows = (await session.execute(statement, params)).all()
+        return self._to_nodes(rows)
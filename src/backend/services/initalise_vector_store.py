@@ -1,9 +1,13 @@
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext, Document
 from llama_index.vector_stores.postgres import PGVectorStore
 import os
-import shutil
-import json
+from threading import Lock
 
+from services.db_pool import pool_monitor
+from services.embedding_storage import EMBEDDING_STORAGE, check_storage, column_type
+from services.directory_ingest import ingest_directory
+from services.text_search import TEXT_SEARCH_CONFIG
+from services.vector_index import TunedPGVectorStore
 
 # Database configuration | Modify this for your database
 DB_CONFIG = {
@@ -15,9 +19,30 @@ DB_CONFIG = {
 }
 
 
-def init_vector_store():
+# Connection pool configuration | shared by the sync and async engines of the
+# process wide vector store, and by everything else that talks to Postgres
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+
+_vector_store = None
+_vector_store_lock = Lock()
+
+
+def init_vector_store(storage: str = EMBEDDING_STORAGE):
+    """
+    Build a new PGVectorStore, use get_vector_store to share the process wide one
+
+    Args:
+        storage (str): "vector" (float32), "halfvec" (float16) or "binary"
+            (float16 rows, bit-quantised index and re-rank), see
+            services/embedding_storage.py
+    """
+    check_storage(storage)
     try:
-        vector_store = PGVectorStore.from_params(
+        vector_store = TunedPGVectorStore.from_params(
             database=DB_CONFIG["dbname"],
             host=DB_CONFIG["host"],
             password=DB_CONFIG["password"],
@@ -26,88 +51,70 @@ def init_vector_store():
             table_name="document_embeddings",
             embed_dim=1024,
             hybrid_search=True,
-            text_search_config="english",
+            text_search_config=TEXT_SEARCH_CONFIG,
+            use_halfvec=column_type(storage) == "halfvec",
+            create_engine_kwargs={
+                "pool_size": DB_POOL_SIZE,
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_pre_ping": DB_POOL_PRE_PING,
+                "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+                "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+            },
         )
+        # Raise instead of marking a half set up store as initialised, so the
+        # next get_vector_store call tries again
+        vector_store.initialization_fail_on_error = True
+        vector_store.embedding_storage = storage
         return vector_store
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
 
+def get_vector_store():
+    """
+    Get the process wide vector store, creating and connecting it on first use.
+
+    Every code path shares its sync and async connection pools, and the
+    extension and table checks run once per process instead of once per call.
+    The column and index setup is not done here, see services/schema.py.
+    """
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = init_vector_store()
+        if _vector_store is not None and not _vector_store._is_initialized:
+            try:
+                _vector_store._initialize()
+            except Exception as e:
+                # Retried on the next call, with the same engines
+                print(f"Error initialising vector store: {e}")
+            if getattr(_vector_store, "_engine", None) is not None:
+                pool_monitor.instrument("vector_store", _vector_store._engine)
+                pool_monitor.instrument("vector_store_async", _vector_store._async_engine)
+        return _vector_store
+
+
 def upload_documents(directory_path="./documents", processed_dir="./processed_documents"):
-    os.makedirs(processed_dir, exist_ok=True)
-    try:
-        # Process text files for content and JSON files for metadata
-        documents = []
-        
-        # Get all text files
-        text_files = [f for f in os.listdir(directory_path) if f.endswith('.txt')]
-        
-        for text_file in text_files:
-            base_name = os.path.splitext(text_file)[0]
-            json_file = f"{base_name}.json"
-            text_path = os.path.join(directory_path, text_file)
-            json_path = os.path.join(directory_path, json_file)
-            
-            # Read text content
-            with open(text_path, 'r') as f:
-                content = f.read()
-            
-            # Read metadata from JSON if it exists
-            metadata = {"file_path": text_path}  # Default metadata with file path
-            if os.path.exists(json_path):
-                try:
-                    with open(json_path, 'r') as f:
-                        json_metadata = json.load(f)
-                    metadata.update(json_metadata)  # Add JSON content to metadata
-                    # Add json file path to be moved later
-                    metadata["json_file_path"] = json_path
-                except Exception as e:
-                    print(f"Error reading JSON metadata {json_path}: {e}")
-            
-            # Create document object
-            doc = Document(text=content, metadata=metadata)
-            documents.append(doc)
-        
-        if not documents:
-            print("No text documents found to embed")
-            return False
-    except Exception as e:
-        print(f"Error loading documents: {e}")
-        return False
+    """
+    Store the documents in a directory, see ingest_directory
 
-    vector_store = init_vector_store()
-    if not vector_store:
+    Returns:
+        dict or False: Counts per status, False if there was nothing to store or a batch failed
+    """
+    vector_store = get_vector_store()
+    if not vector_store or not vector_store._is_initialized:
         return False
 
     try:
-        storage_context = StorageContext.from_defaults(
-            vector_store=vector_store)
-        index = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=storage_context,
-            show_progress=True
-        )
-        print(f"Successfully embedded {len(documents)} documents")
-
-        # Move files to processed directory
-        for doc in documents:
-            file_path = doc.metadata.get("file_path")
-            if file_path and os.path.exists(file_path):
-                destination = os.path.join(
-                    processed_dir, os.path.basename(file_path))
-                print(f"Moving {file_path} to {destination}")
-                shutil.move(file_path, destination)
-            
-            # Also move the JSON files
-            json_file_path = doc.metadata.get("json_file_path")
-            if json_file_path and os.path.exists(json_file_path):
-                json_destination = os.path.join(
-                    processed_dir, os.path.basename(json_file_path))
-                print(f"Moving {json_file_path} to {json_destination}")
-                shutil.move(json_file_path, json_destination)
-                
-        return index
+        result = ingest_directory(vector_store, directory_path, processed_dir)
     except Exception as e:
+        # Batches stored before the failure stay stored, a rerun resumes after them
         print(f"Error embedding documents: {e}")
-        return False
\ No newline at end of file
+        return False
+    if result is None:
+        print("No text documents found to embed")
+        return False
+    print(f"Embedded {result['inserted']} new and {result['updated']} changed documents, "
+          f"skipped {result['unchanged']} unchanged, in {result['batches']} batches")
+    return result
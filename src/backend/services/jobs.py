@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from services.metrics import metrics
+from services.scheduler import scheduler_lane, BATCH
+
+# Background job configuration | jobs run at the same time, the rest queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs kept for /jobs/{id} before the oldest are forgotten
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "200"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been asked to stop"""
+
+
+class Job:
+    """
+    A unit of background work and its progress.
+
+    The work function receives the job, bumps its progress counters with
+    `advance` and calls `check_cancelled` (or `wait`) between steps, so a
+    cancellation takes effect at the next step boundary.
+    """
+
+    def __init__(self, kind: str, params: dict, progress: Dict[str, int]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = dict(progress)
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def advance(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.progress[counter] = self.progress.get(counter, 0) + amount
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def wait(self, seconds: float):
+        """Sleep, waking up early to stop if the job is cancelled meanwhile"""
+        if self._cancel.wait(seconds):
+            self.check_cancelled()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            progress = dict(self.progress)
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else None,
+        }
+
+
+class JobManager:
+    """
+    In-process job queue served by a small pool of worker threads.
+
+    Jobs live in memory only, so they do not survive a restart. Work runs in
+    the scheduler's batch lane, behind interactive questions.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_finished: int = JOB_MAX_FINISHED):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._max_finished = max_finished
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, work: Callable[[Job], Optional[dict]], params: dict,
+               progress: Dict[str, int] = None) -> Job:
+        """
+        Queue work to run in the background
+
+        Args:
+            kind (str): Job type, reported back with the job
+            work (callable): Called with the job, its return value becomes the job result
+            params (dict): The job's input, reported back with the job
+            progress (dict, optional): Counters starting values
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(kind, params, progress or {})
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        metrics.incr(f"jobs.{kind}.submitted")
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: Job, work: Callable[[Job], Optional[dict]]):
+        # Under the job lock, so a cancel either lands before the job starts
+        # or finds it running and is seen at its first step
+        with job._lock:
+            cancelled = job.cancel_requested
+            if not cancelled:
+                job.status = RUNNING
+                job.started_at = time.time()
+        if cancelled:
+            self._finish(job, CANCELLED)
+            return
+        try:
+            with scheduler_lane(BATCH):
+                job.result = work(job)
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str):
+        with job._lock:
+            job.status = status
+            job.finished_at = time.time()
+        metrics.incr(f"jobs.{job.kind}.{status}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop, a queued job never starts, a running one stops at its next step"""
+        job = self.get(job_id)
+        if job is not None:
+            with job._lock:
+                if job.status not in FINISHED:
+                    job._cancel.set()
+        return job
+
+    def list(self) -> list:
+        with self._lock:
+            self._prune()
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING) + FINISHED}
+
+
+# Process wide job manager
+job_manager = JobManager()
+metrics.register_collector("jobs", job_manager.stats)
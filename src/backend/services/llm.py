@@ -1,8 +1,12 @@
+import os
+from threading import Lock
 from llama_index.core import Settings
 from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.llms.ollama import Ollama
-from services.initalise_vector_store import init_vector_store
+from services.structured_ollama import StructuredOllama
+from services.initalise_vector_store import get_vector_store
 from models.structured_response import BioMedicalResponse
+from services.embedding_cache import CachedEmbedding
+from services.metrics import metrics
 from llama_index.core import VectorStoreIndex, Settings, StorageContext
 import sys
 from state import app_state
@@ -14,6 +18,12 @@ from state import app_state
 # If you can't figure this out, just ask your instructor or email me.
 base_url = "http://172.20.80.1:11434"
 
+# Model residency | how long Ollama keeps a model loaded after each request.
+# Reloading deepseek-r1 takes seconds and throws away the prompt KV cache, so
+# keep it well past the gap between bursts, or pin it with OLLAMA_PIN_MODELS
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PIN_MODELS = os.getenv("OLLAMA_PIN_MODELS", "false").lower() == "true"
+
 # Database configuration
 DB_CONFIG = {
     "dbname": "vector_db",
@@ -23,58 +33,84 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# Serialises initialise_resources between warm-up and the first request
+_resources_lock = Lock()
+
+
+def model_keep_alive():
+    """keep_alive sent with every Ollama request, -1 keeps the model loaded indefinitely"""
+    return -1 if OLLAMA_PIN_MODELS else OLLAMA_KEEP_ALIVE
+
+
 # Initialize Ollama models
 def setup_models():
-    Settings.embed_model = OllamaEmbedding(
-        model_name="bge-m3:latest",
-        base_url=base_url
+    # Repeated queries are answered from the embedding cache instead of Ollama
+    Settings.embed_model = CachedEmbedding(
+        OllamaEmbedding(
+            model_name="bge-m3:latest",
+            base_url=base_url
+        )
     )
-    Settings.llm = Ollama(
+    metrics.register_collector("embedding_cache", Settings.embed_model.stats)
+    # Schema-constrained decoding with a capped token budget and a parse retry
+    Settings.llm = StructuredOllama(
         model="deepseek-r1:14b",
         base_url=base_url,
         temperature=0.3,  # Set temperature for more deterministic responses
+        keep_alive=model_keep_alive(),
         # top_p=0.9,  # Set top_p for nucleus sampling
         # verbose=True,  # Enable verbose mode
     ).as_structured_llm(output_cls=BioMedicalResponse)
 
 
 def initialise_resources(store=None, index=None):
-    """Initialize all LLM and vector store resources"""
-    try:
-        print("Initializing LLM resources...")
-        # Setup LLM and embedding models
-        setup_models()
-
-        if store:
-            # Use provided vector store
-            vector_store = store
-        else:
-            vector_store = init_vector_store()
-        if not vector_store:
-            print("Failed to initialize vector store")
+    """Initialize all LLM and vector store resources, once per process"""
+    # Warm-up and the first request's get_index can both get here, and a
+    # second run would replace the embedding cache and build another index
+    with _resources_lock:
+        if app_state.index is not None:
+            return True
+        try:
+            print("Initializing LLM resources...")
+            # Setup LLM and embedding models
+            setup_models()
+
+            if store:
+                # Use provided vector store
+                vector_store = store
+            else:
+                vector_store = get_vector_store()
+            if not vector_store or not vector_store._is_initialized:
+                print("Failed to initialize vector store")
+                return False
+
+            # Create storage context and index
+            storage_context = StorageContext.from_defaults(
+                vector_store=vector_store)
+            if index:
+                index = index
+            else:
+                index = VectorStoreIndex.from_vector_store(
+                    vector_store=vector_store,
+                    storage_context=storage_context
+                )
+
+            # Store in global state
+            app_state.vector_store = vector_store
+            app_state.index = index
+            app_state.initialized = True
+
+            print("LLM resources initialized successfully")
+            return True
+        except Exception as e:
+            print(f"Error initializing resources: {e}", file=sys.stderr)
             return False
 
-        # Create storage context and index
-        storage_context = StorageContext.from_defaults(
-            vector_store=vector_store)
-        if index:
-            index = index
-        else:
-            index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store,
-                storage_context=storage_context
-            )
-
-        # Store in global state
-        app_state.vector_store = vector_store
-        app_state.index = index
-        app_state.initialized = True
-
-        print("LLM resources initialized successfully")
-        return True
-    except Exception as e:
-        print(f"Error initializing resources: {e}", file=sys.stderr)
-        return False
+
+def get_base_llm():
+    """Get the underlying Ollama LLM without the structured output wrapper"""
+    llm = Settings.llm
+    return getattr(llm, "llm", llm)
 
 
 def get_index():
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events.llm import LLMChatStartEvent
+
+from services.metrics import metrics
+
+# Usage of the request currently being answered, None outside of one
+_current_usage: ContextVar[Optional[dict]] = ContextVar("llm_usage", default=None)
+
+# Wrappers whose chat calls are forwarded to an inner LLM, which emits its own event
+WRAPPER_LLMS = {"structured_llm"}
+
+
+class LLMCallCounter(BaseEventHandler):
+    """Count every chat call that reaches a model, per process and per request"""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMCallCounter"
+
+    def handle(self, event: Any, **kwargs: Any) -> None:
+        if not isinstance(event, LLMChatStartEvent):
+            return
+        if event.model_dict.get("class_name") in WRAPPER_LLMS:
+            return
+        metrics.incr("llm.calls")
+        usage = _current_usage.get()
+        if usage is not None:
+            usage["llm_calls"] += 1
+
+
+get_dispatcher().add_event_handler(LLMCallCounter())
+
+
+@contextmanager
+def track_llm_usage():
+    """
+    Collect LLM calls and context tokens for everything run inside the block.
+
+    Yields:
+        dict: llm_calls and context_tokens, filled in as the request runs
+    """
+    usage = {"llm_calls": 0, "context_tokens": 0}
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        metrics.observe("llm.calls_per_request", usage["llm_calls"])
+        metrics.observe("llm.context_tokens", usage["context_tokens"])
+
+
+def record_context_tokens(tokens: int):
+    """Add the size of a packed context to the current request's usage"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage["context_tokens"] += tokens
@@ -0,0 +1,194 @@
+"""
+Typed, indexed copies of the hot PubMed metadata fields.
+
+pmid, journal, doi, title and authors are stored columns generated from
+metadata_, so every insert path fills them without knowing about them, and
+each has an index: b-tree for the text fields, GIN for the authors array.
+Filters on these keys are written against the columns with bound values,
+and apply inside the dense and sparse queries before ranking, so a
+selective filter narrows the rows through its index instead of scanning
+the JSON of every row.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+from llama_index.core.vector_stores.types import FilterCondition, MetadataFilter, MetadataFilters
+from sqlalchemy import ARRAY, VARCHAR, bindparam, text
+
+# Column per metadata key: SQL type and index method. Empty strings, which
+# extract_metadata writes for missing fields, are stored as NULL.
+PROMOTED_COLUMNS = {
+    "pmid": ("VARCHAR", "btree"),
+    "journal": ("VARCHAR", "btree"),
+    "doi": ("VARCHAR", "btree"),
+    "title": ("TEXT", "btree"),
+    "authors": ("TEXT[]", "gin"),
+}
+ARRAY_FUNCTION = "metadata_text_array"
+
+# Filter operators per column kind, with the condition each one becomes.
+# Only equality, membership and the array operators can use the indexes,
+# text_match is a substring test on rows the other conditions left.
+SCALAR_CONDITIONS = {
+    "==": "{column} = CAST(:{name} AS text)",
+    "!=": "{column} <> CAST(:{name} AS text)",
+    "in": "{column} = ANY(CAST(:{name} AS text[]))",
+    "nin": "NOT ({column} = ANY(CAST(:{name} AS text[])))",
+    "text_match": "{column} LIKE '%' || CAST(:{name} AS text) || '%'",
+    "text_match_insensitive": "{column} ILIKE '%' || CAST(:{name} AS text) || '%'",
+}
+ARRAY_CONDITIONS = {
+    "contains": "{column} @> ARRAY[CAST(:{name} AS text)]",
+    "any": "{column} && CAST(:{name} AS text[])",
+    "all": "{column} @> CAST(:{name} AS text[])",
+}
+LIST_OPERATORS = ("in", "nin", "any", "all")
+# Filters a single request may combine
+MAX_FILTERS = 10
+
+
+def _table(vector_store) -> str:
+    return f'"{vector_store.schema_name}"."{vector_store._table_class.__tablename__}"'
+
+
+def _json_type(vector_store) -> str:
+    return "jsonb" if vector_store.use_jsonb else "json"
+
+
+def ensure_metadata_columns(vector_store):
+    """
+    Add the promoted metadata columns and their indexes, once per table.
+
+    Adding the columns rewrites the table the first time. authors goes
+    through a small IMMUTABLE function, since a generated column cannot
+    hold the subquery that turns a JSON array into text[].
+    """
+    schema = vector_store.schema_name
+    tablename = vector_store._table_class.__tablename__
+    json_type = _json_type(vector_store)
+    function = f'"{schema}".{ARRAY_FUNCTION}'
+    with vector_store._engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT to_regprocedure(:signature)"), {"signature": f"{function}({json_type})"}
+        ).scalar()
+        if exists is None:
+            connection.execute(text(f"""
+                CREATE FUNCTION {function}(value {json_type}) RETURNS text[]
+                LANGUAGE sql IMMUTABLE AS $$
+                    SELECT CASE {json_type}_typeof(value)
+                        WHEN 'array' THEN ARRAY(SELECT {json_type}_array_elements_text(value))
+                        WHEN 'string' THEN ARRAY[value #>> '{{}}']
+                    END
+                $$
+            """))
+
+        columns = []
+        for key, (sql_type, _) in PROMOTED_COLUMNS.items():
+            if sql_type == "TEXT[]":
+                expression = f"{function}(metadata_->'{key}')"
+            else:
+                expression = f"NULLIF(metadata_->>'{key}', '')"
+            columns.append(f"ADD COLUMN IF NOT EXISTS {key} {sql_type} GENERATED ALWAYS AS ({expression}) STORED")
+        connection.execute(text(f"ALTER TABLE {_table(vector_store)} {', '.join(columns)}"))
+
+    # CONCURRENTLY cannot run inside a transaction, and keeps writes going
+    with vector_store._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for key, (_, method) in PROMOTED_COLUMNS.items():
+            connection.execute(text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{tablename}_{key}_idx" '
+                f"ON {_table(vector_store)} USING {method} ({key})"
+            ))
+
+
+def normalise_filters(filters: Optional[Iterable]) -> Optional[Tuple]:
+    """
+    Validate filters and turn them into a hashable tuple for QueryEngineConfig
+
+    Args:
+        filters: Dicts or objects with key, operator and value
+
+    Returns:
+        tuple: (key, operator, value) triples in a stable order, list values
+            as tuples, or None without filters
+    """
+    if not filters:
+        return None
+    normalised = set()
+    for item in filters:
+        item = item if isinstance(item, dict) else item.model_dump()
+        key, operator, value = item["key"], item.get("operator", "=="), item["value"]
+        if key not in PROMOTED_COLUMNS:
+            raise ValueError(f"Cannot filter on {key}, filterable keys are {', '.join(PROMOTED_COLUMNS)}")
+        conditions = _conditions(key)
+        if operator not in conditions:
+            raise ValueError(f"Operator {operator} is not supported for {key}, use one of {', '.join(conditions)}")
+        if operator in LIST_OPERATORS:
+            values = [value] if isinstance(value, str) else list(value)
+            if not values:
+                raise ValueError(f"Operator {operator} on {key} needs at least one value")
+            value = tuple(str(entry) for entry in values)
+        elif not isinstance(value, (str, int)):
+            raise ValueError(f"Operator {operator} on {key} takes a single value")
+        else:
+            value = str(value)
+        normalised.add((key, operator, value))
+    if len(normalised) > MAX_FILTERS:
+        raise ValueError(f"At most {MAX_FILTERS} filters are allowed")
+    return tuple(sorted(normalised, key=repr))
+
+
+def to_metadata_filters(filters: Optional[Tuple]) -> Optional[MetadataFilters]:
+    """The normalised filters as LlamaIndex MetadataFilters, all of which must hold"""
+    if not filters:
+        return None
+    return MetadataFilters(
+        filters=[
+            MetadataFilter(key=key, operator=operator, value=list(value) if isinstance(value, tuple) else value)
+            for key, operator, value in filters
+        ],
+        condition=FilterCondition.AND,
+    )
+
+
+def _conditions(key: str) -> dict:
+    return ARRAY_CONDITIONS if PROMOTED_COLUMNS[key][0] == "TEXT[]" else SCALAR_CONDITIONS
+
+
+def condition_sql(key: str, operator: str, name: str) -> str:
+    """SQL condition on the promoted column, reading its value from :name"""
+    return _conditions(key)[operator].format(column=key, name=name)
+
+
+def is_promoted(filter_: MetadataFilter) -> bool:
+    """Whether a filter can run against a promoted column"""
+    operator = getattr(filter_.operator, "value", filter_.operator)
+    return filter_.key in PROMOTED_COLUMNS and operator in _conditions(filter_.key)
+
+
+def filter_clause(filter_: MetadataFilter):
+    """PGVectorStore filter clause on the promoted column, with the value bound rather than inlined"""
+    operator = getattr(filter_.operator, "value", filter_.operator)
+    if operator in LIST_OPERATORS:
+        value = [filter_.value] if isinstance(filter_.value, str) else [str(entry) for entry in filter_.value]
+        parameter = bindparam("value", value, type_=ARRAY(VARCHAR), unique=True)
+    else:
+        parameter = bindparam("value", str(filter_.value), type_=VARCHAR, unique=True)
+    return text(condition_sql(filter_.key, operator, "value")).bindparams(parameter)
+
+
+def filters_sql(filters: Optional[Tuple]) -> Tuple[str, dict]:
+    """
+    The filters as one SQL condition for hand written statements
+
+    Returns:
+        tuple: The AND-ed conditions ("TRUE" without filters) and their
+            parameters, named filter_0, filter_1, ...
+    """
+    if not filters:
+        return "TRUE", {}
+    conditions: List[str] = []
+    params = {}
+    for number, (key, operator, value) in enumerate(filters):
+        name = f"filter_{number}"
+        conditions.append(condition_sql(key, operator, name))
+        params[name] = list(value) if isinstance(value, tuple) else value
+    return " AND ".join(conditions), params
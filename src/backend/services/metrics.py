@@ -0,0 +1,52 @@
+from threading import Lock
+from typing import Callable, Dict
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry.
+
+    Counters only ever go up, observations keep count/sum/max so averages can
+    be derived, and collectors are callables sampled when a snapshot is taken
+    (for state that already lives elsewhere, such as pool sizes).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: Dict[str, float] = {}
+        self._observations: Dict[str, Dict[str, float]] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            stats = self._observations.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["max"] = max(stats["max"], value)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            observations = {name: dict(stats) for name, stats in self._observations.items()}
+            collectors = dict(self._collectors)
+        for stats in observations.values():
+            stats["avg"] = stats["sum"] / stats["count"] if stats["count"] else 0.0
+        gauges = {}
+        for name, collector in collectors.items():
+            try:
+                gauges[name] = collector()
+            except Exception as e:
+                gauges[name] = {"error": str(e)}
+        return {"counters": counters, "observations": observations, "gauges": gauges}
+
+
+# Process wide metrics registry
+metrics = Metrics()
@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import shutil
+import urllib.parse
+import urllib.request
+import uuid
+
+from services.directory_ingest import ingest_directory, move_files
+from services.initalise_vector_store import get_vector_store
+from services.jobs import Job, JobCancelled
+
+# PubMed download configuration | jobs download into their own folder here,
+# and leave what they could not embed behind for the next upload
+PUBMED_DOCUMENTS_DIR = os.getenv("PUBMED_DOCUMENTS_DIR", "./documents")
+PUBMED_PROCESSED_DIR = os.getenv("PUBMED_PROCESSED_DIR", "./processed_documents")
+# Abstracts one search job may download
+PUBMED_MAX_DOCUMENTS = int(os.getenv("PUBMED_MAX_DOCUMENTS", "10"))
+# Abstracts per efetch call, and the pause between calls for NCBI's rate limit
+PUBMED_FETCH_BATCH = int(os.getenv("PUBMED_FETCH_BATCH", "5"))
+PUBMED_FETCH_INTERVAL_SECONDS = float(os.getenv("PUBMED_FETCH_INTERVAL_SECONDS", "1"))
+
+BASE_URL = "http://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+PROGRESS = {"fetched": 0, "parsed": 0, "embedded": 0, "unchanged": 0, "failed": 0}
+
+
+def extract_metadata(abstract_text, pmid):
+    """Extract metadata from a single abstract text."""
+    study = {
+        "id": str(uuid.uuid4()),
+        "pmid": pmid,
+        "journal": "",
+        "title": "",
+        "authors": [],
+        "doi": ""
+    }
+
+    # Split the abstract text into sections based on double newlines
+    sections = abstract_text.split('\n\n')
+
+    # Ensure there are enough sections to extract basic metadata
+    if len(sections) >= 5:
+        # Journal: First section
+        study["journal"] = sections[0].strip()
+
+        # Title: Second section
+        study["title"] = sections[1].strip()
+
+        # Authors: Third section, split by commas
+        authors_line = sections[2].strip()
+        study["authors"] = [author.strip() for author in authors_line.split(',')]
+
+        # Author Information: Fourth section, lines after "Author information:"
+        # author_info_section = sections[3]
+        # if author_info_section.startswith("Author information:"):
+        #     author_info_lines = author_info_section.split('\n')[1:]
+        #     study["author_info"] = [line.strip() for line in author_info_lines]
+        # DOI: Search sections for "DOI:"
+        for section in sections:
+            if section.startswith("DOI:"):
+                doi_match = re.search(r'DOI: (.+)', section)
+                if doi_match:
+                    study["doi"] = doi_match.group(1).strip()
+                break
+
+    return study
+
+
+def _read(url: str) -> str:
+    with urllib.request.urlopen(url) as f:
+        return f.read().decode('utf-8')
+
+
+def download_abstracts(job: Job, query: str, max_documents: int, documents_dir: str) -> int:
+    """
+    Search PubMed and save each abstract as <pmid>.txt with a <pmid>.json of metadata
+
+    Returns:
+        int: Abstracts saved
+    """
+    # Call the esearch command, asking for as many ids as will be downloaded
+    search_url = (f"{BASE_URL}esearch.fcgi?db=pubmed&term={urllib.parse.quote(query)}"
+                  f"&usehistory=y&rettype=json&retmax={max_documents}")
+    search_data = _read(search_url)
+
+    # Extract abstract count and PMIDs
+    total_abstract_count = int(re.findall(r"<Count>(\d+?)</Count>", search_data)[0])
+    pmid = re.findall(r"<Id>(\d+?)</Id>", search_data)
+
+    # Extract webenv and querykey
+    fetch_webenv = "&WebEnv=" + re.findall(r"<WebEnv>(\S+)<\/WebEnv>", search_data)[0]
+    fetch_querykey = "&query_key=" + re.findall(r"<QueryKey>(\d+?)</QueryKey>", search_data)[0]
+
+    retmax = min(PUBMED_FETCH_BATCH, max_documents)
+    retstart = 0
+    saved = 0
+    while True:
+        job.check_cancelled()
+        fetch_url = (f"{BASE_URL}efetch.fcgi?db=pubmed{fetch_querykey}{fetch_webenv}"
+                     f"&retstart={retstart}&retmax={retmax}&retmode=text&rettype=abstract")
+        abstracts = _read(fetch_url).split("\n\n\n")
+
+        # Save abstracts to files
+        for i, abstract in enumerate(abstracts):
+            if retstart + i >= len(pmid) or saved >= max_documents:
+                break
+            job.advance("fetched")
+
+            abs_fields = abstract.split("\n\n")
+            if len(abs_fields) < 5:  # Not enough fields to find the abstract in
+                job.advance("failed")
+                continue
+            current_pmid = pmid[retstart + i]
+
+            # Save text file with abstract content
+            with open(os.path.join(documents_dir, f"{current_pmid}.txt"), "w", encoding='utf-8') as fp_text:
+                fp_text.write(abs_fields[4].replace("\n", ""))
+
+            # Extract and save metadata to JSON
+            metadata = extract_metadata(abstract, current_pmid)
+            with open(os.path.join(documents_dir, f"{current_pmid}.json"), 'w', encoding='utf-8') as fp_json:
+                json.dump(metadata, fp_json, indent=4, ensure_ascii=False)
+            saved += 1
+            job.advance("parsed")
+
+        if saved >= max_documents or retstart + retmax >= min(total_abstract_count, len(pmid)):
+            return saved
+
+        # Wait to avoid API rate limits
+        job.wait(PUBMED_FETCH_INTERVAL_SECONDS)
+        retstart += retmax
+
+
+def run_pubmed_search(job: Job) -> dict:
+    """
+    Job body for /pubmed/search/: download the abstracts, then embed them.
+
+    Each job downloads into a folder of its own, so concurrent searches do
+    not ingest each other's files. Embedding goes batch by batch and updates
+    the job after each one. On failure the files not yet stored are handed
+    to the shared documents folder for the next upload, on cancellation they
+    are dropped.
+    """
+    query = job.params["query"]
+    documents_dir = os.path.join(PUBMED_DOCUMENTS_DIR, f"pubmed_job_{job.id}")
+    os.makedirs(documents_dir, exist_ok=True)
+
+    def on_batch(status: dict):
+        for value in status.values():
+            job.advance("unchanged" if value == "unchanged" else "embedded")
+        job.check_cancelled()
+
+    try:
+        saved = download_abstracts(job, query, job.params["max_documents"], documents_dir)
+        if saved:
+            vector_store = get_vector_store()
+            if not vector_store:
+                raise RuntimeError("Vector store is not available")
+            ingest_directory(vector_store, documents_dir, PUBMED_PROCESSED_DIR, on_batch=on_batch)
+        return {
+            "query": query,
+            "document_count": saved,
+            "message": f"Downloaded and embedded {saved} abstracts",
+        }
+    except JobCancelled:
+        raise
+    except Exception:
+        leftover = [os.path.join(documents_dir, name) for name in os.listdir(documents_dir)
+                    if name.endswith((".txt", ".json"))]
+        move_files(leftover, PUBMED_DOCUMENTS_DIR)
+        raise
+    finally:
+        shutil.rmtree(documents_dir, ignore_errors=True)
@@ -1,22 +1,66 @@
-from llama_index.core import VectorStoreIndex, PromptTemplate
+import asyncio
+from contextlib import nullcontext
+from fastapi.encoders import jsonable_encoder
+from llama_index.core import VectorStoreIndex, Settings
 from llama_index.core.response_synthesizers import CompactAndRefine
 from llama_index.core.retrievers import QueryFusionRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
-from models.structured_response import RelationshipType
-from llama_index.core.prompts import PromptTemplate
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.prompts import BasePromptTemplate, ChatPromptTemplate, PromptTemplate
+from llama_index.core.schema import QueryBundle
 from models.structured_response import RelationshipType
 from services.llm import get_index
+from services.answer_cache import answer_cache
+from services.context_packer import ContextPacker
+from services.hybrid_retriever import PostgresHybridRetriever
+from services.llm_usage import track_llm_usage
+from services.metadata_columns import to_metadata_filters
+from services.metrics import metrics
+from services.single_flight import SingleFlight
+from services.query_engine_pool import QueryEnginePool, QueryEngineConfig, DEFAULT_QUERY_CONFIG
+
+
+# Prompt v2 | everything that does not change between requests lives in the
+# system message, so every request starts with the same tokens and Ollama can
+# reuse the KV cache for them. Only the user message carries context and query.
+STATIC_SYSTEM_PROMPT = f"""You are a precise and knowledgeable assistant specializing in bio-medical relationship extraction. Use the provided context consisting of research papers to answer the query in a structured JSON format, extracting relevant information as per the instructions.
+You should ignore the metadata, other than the title for information about the paper and focus solely on the text of the documents.
+
+**Instructions:**
+1. Extract relationships between entities using only the following relationship types:
+{", ".join(r.value for r in RelationshipType)}
+2. Use exact entity names from the context, avoiding generic terms.
+3. Ensure that order of the entities is preserved, i.e. if an organism produces a chemical, the relationship should be `ORGANISM PRODUCES CHEMICAL`, not `CHEMICAL PRODUCES ORGANISM`.
+4. Link relationships as pairs or triplets where applicable:
+- If an entity is isolated from an organism (`ISOLATED_FROM`), check if the same organism produces it (`PRODUCES`).
+- If a chemical is a metabolite (`METABOLITE_OF`) or precursor (`PRECURSOR_OF`), check for related biosynthetic relationships.
+5. Provide a concise natural language explanation of why you extracted the relationships you did.
+6. If the query’s answer or relationship type is not found, return an empty list of relationships and an explanation stating: "Not found in the provided context."
+"""
+
+USER_PROMPT = """**Context:**
+{context_str}
+
+**Query:**
+{query_str}
+"""
+
+
+def build_system_prompt(prompt_version: str = "v1") -> BasePromptTemplate:
+    """Build the question answering prompt for a given prompt version"""
+    if prompt_version == "v2":
+        return ChatPromptTemplate(message_templates=[
+            ChatMessage(role=MessageRole.SYSTEM, content=STATIC_SYSTEM_PROMPT),
+            ChatMessage(role=MessageRole.USER, content=USER_PROMPT),
+        ])
+    if prompt_version != "v1":
+        raise ValueError(f"Unknown prompt version: {prompt_version}")
 
-def query_documents(query_str: str, index: VectorStoreIndex = None):
-    # Get index from global state if not provided
-    if index is None:
-        index = get_index()
-        
     # Define system prompt for structured output
     relationship_types_str = ", ".join([r.value for r in RelationshipType])
 
     # Define the template string with relationship types inserted
-    system_prompt = PromptTemplate(
+    return PromptTemplate(
         f"""
         You are a precise and knowledgeable assistant specializing in bio-medical relationship extraction. Use the provided context consisting of research papers to answer the query in a structured JSON format, extracting relevant information as per the instructions.
         You should ignore the metadata, other than the title for information about the paper and focus solely on the text of the documents.
@@ -40,33 +84,155 @@ def query_documents(query_str: str, index: VectorStoreIndex = None):
         """
     )
 
-    # Create query engine with structured output
+
+def build_fusion_retriever(index: VectorStoreIndex, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG) -> QueryFusionRetriever:
+    """Build the dense plus sparse hybrid retriever for one configuration"""
+    if config.retriever == "sql":
+        return PostgresHybridRetriever(
+            index.vector_store, top_k=config.top_k, fusion_mode=config.fusion_mode,
+            filters=config.filters,
+        )
+    if config.retriever != "fusion":
+        raise ValueError(f"Unknown retriever: {config.retriever}")
+
+    # Filters reach PGVectorStore's WHERE clause, ahead of ranking
+    filters = to_metadata_filters(config.filters)
     vector_retriever = index.as_retriever(
         vector_store_query_mode="default",
-        similarity_top_k=5,
+        similarity_top_k=config.top_k,
+        filters=filters,
     )
     text_retriever = index.as_retriever(
         vector_store_query_mode="sparse",
-        similarity_top_k=5,
+        similarity_top_k=config.top_k,
+        filters=filters,
     )
     retriever = QueryFusionRetriever(
         [vector_retriever, text_retriever],
-        similarity_top_k=5,
+        similarity_top_k=config.top_k,
         num_queries=1,
-        mode="relative_score",
-        use_async=False,
+        mode=config.fusion_mode,
+        use_async=True,
     )
+    return retriever
+
 
+def build_query_engine(index: VectorStoreIndex, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+    """Build the hybrid retrieval and structured synthesis pipeline for one configuration"""
+    system_prompt = build_system_prompt(config.prompt_version)
+
+    # Create query engine with structured output
+    retriever = build_fusion_retriever(index, config)
     response_synthesizer = CompactAndRefine()
+    # Packing the context to fit one prompt keeps CompactAndRefine to a single LLM call
+    context_packer = ContextPacker(
+        prompts=[system_prompt, response_synthesizer.get_prompts()["refine_template"]]
+    )
     query_engine = RetrieverQueryEngine(
         retriever=retriever,
         response_synthesizer=response_synthesizer,
+        node_postprocessors=[context_packer],
     )
 
     query_engine.update_prompts(
         {"response_synthesizer:text_qa_template": system_prompt}
     )
+    return query_engine
+
+
+# Process wide pool of ready-built query engines
+query_engine_pool = QueryEnginePool(build_query_engine)
+metrics.register_collector("query_engine_pool", query_engine_pool.stats)
+
+
+def query_documents(query_str: str, index: VectorStoreIndex = None, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+    # Get index from global state if not provided
+    if index is None:
+        index = get_index()
 
     # Execute query and return structured response
-    response = query_engine.query(query_str)
+    with query_engine_pool.borrow(index, config) as query_engine:
+        response = query_engine.query(query_str)
+    return response
+
+
+async def aquery_documents(query_str: str, index: VectorStoreIndex = None, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG,
+                           query_embedding=None, llm_limit=None):
+    """
+    Async version of query_documents for use inside the event loop.
+
+    Dense and sparse retrieval run concurrently against the async Postgres
+    engine and the LLM call is awaited, so a slow generation never blocks
+    other requests on the same worker.
+
+    Args:
+        query_embedding (list, optional): Precomputed embedding of the query
+        llm_limit (asyncio.Semaphore, optional): Held only around the LLM
+            call, so retrieval for many questions can run in parallel
+    """
+    if index is None:
+        index = await asyncio.to_thread(get_index)
+
+    query_bundle = QueryBundle(query_str, embedding=query_embedding)
+    with query_engine_pool.borrow(index, config) as query_engine:
+        nodes = await query_engine.aretrieve(query_bundle)
+        async with llm_limit or nullcontext():
+            response = await query_engine.asynthesize(query_bundle, nodes)
     return response
+
+
+# Identical questions asked while one is being answered share its answer
+answer_flight = SingleFlight("answer_flight")
+metrics.register_collector("answer_flight", answer_flight.stats)
+
+
+async def answer_question(query_str: str, index: VectorStoreIndex = None, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG,
+                          llm_limit=None, query_embedding=None) -> dict:
+    """
+    Answer a question, serving repeats and near duplicates from the answer cache
+
+    Concurrent requests for the same normalised question are coalesced, only
+    the first one retrieves and generates and the others wait for its answer.
+
+    Args:
+        query_embedding (list, optional): Precomputed embedding of the question,
+            embedded on demand otherwise
+
+    Returns:
+        dict: The structured response, its serialised source nodes and which
+        cache tier answered it ("exact", "semantic", "coalesced" or None)
+    """
+    payload = await asyncio.to_thread(answer_cache.get, query_str, config)
+    if payload is not None:
+        return {**payload, "cache": "exact"}
+
+    result, leader = await answer_flight.do(
+        answer_cache.make_key(query_str, config),
+        lambda: _answer_uncached(query_str, index, config, llm_limit, query_embedding),
+    )
+    if not leader and result["cache"] is None:
+        metrics.incr("answer_flight.llm_calls_saved")
+        return {**result, "cache": "coalesced"}
+    return result
+
+
+async def _answer_uncached(query_str: str, index: VectorStoreIndex, config: QueryEngineConfig, llm_limit,
+                           query_embedding=None) -> dict:
+    if index is None:
+        index = await asyncio.to_thread(get_index)
+
+    generation = await asyncio.to_thread(answer_cache.current_generation)
+    if query_embedding is None:
+        query_embedding = await Settings.embed_model.aget_query_embedding(query_str)
+    payload = await asyncio.to_thread(answer_cache.get_similar, query_embedding, config)
+    if payload is not None:
+        return {**payload, "cache": "semantic"}
+
+    with track_llm_usage():
+        response = await aquery_documents(query_str, index, config, query_embedding, llm_limit)
+    payload = {
+        "response": response.response.model_dump(mode="json"),
+        "sources": jsonable_encoder(response.source_nodes),
+    }
+    await asyncio.to_thread(answer_cache.put, query_str, config, query_embedding, payload, generation)
+    return {**payload, "cache": None}
@@ -0,0 +1,112 @@
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, NamedTuple, Optional
+
+
+class QueryEngineConfig(NamedTuple):
+    """Everything that changes how a query engine is built"""
+    top_k: int = 5
+    fusion_mode: str = "relative_score"
+    # "v2" keeps a static system prefix that Ollama can serve from its KV cache
+    prompt_version: str = os.getenv("PROMPT_VERSION", "v2")
+    # "fusion" fuses two retrievers in Python, "sql" runs both legs and the
+    # fusion as one Postgres statement
+    retriever: str = os.getenv("HYBRID_RETRIEVER", "fusion")
+    # Metadata filters from metadata_columns.normalise_filters, applied in SQL
+    filters: Optional[tuple] = None
+
+
+DEFAULT_QUERY_CONFIG = QueryEngineConfig()
+
+# Idle engines kept per (index, configuration) pair
+POOL_MAX_IDLE = 8
+# Configurations kept at all, filters make every combination its own one, so
+# the least recently used configuration's engines are dropped beyond this
+POOL_MAX_CONFIGURATIONS = 64
+
+
+class QueryEnginePool:
+    """
+    Pool of ready-built query engines, keyed by index and configuration.
+
+    Building the prompt, retrievers, fusion retriever and synthesizer is pure
+    overhead per request, so engines are built once and handed out again.
+    Borrowing never blocks: if no idle engine exists a new one is built and
+    it joins the pool when it is returned.
+    """
+
+    def __init__(self, factory: Callable, max_idle: int = POOL_MAX_IDLE,
+                 max_configurations: int = POOL_MAX_CONFIGURATIONS):
+        """
+        Args:
+            factory (Callable): Builds an engine from (index, config)
+            max_idle (int): Maximum idle engines kept per key
+            max_configurations (int): Maximum keys kept, the least recently
+                used key is evicted to make room for a new one
+        """
+        self._factory = factory
+        self._max_idle = max_idle
+        self._max_configurations = max_configurations
+        self._idle = OrderedDict()
+        self._lock = Lock()
+        self.built = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def _key(self, index, config: QueryEngineConfig):
+        # Engines hold a reference to their index, so its id stays unique
+        # for as long as any pooled engine for it is alive
+        return (id(index), config)
+
+    def acquire(self, index, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+        """Take an idle engine for this configuration or build a new one"""
+        key = self._key(index, config)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                engine = idle.pop()
+                if not idle:
+                    del self._idle[key]
+                return engine
+            self.built += 1
+        return self._factory(index, config)
+
+    def release(self, engine, index, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+        """Return an engine to the pool, dropping it if its key already has max_idle engines"""
+        key = self._key(index, config)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self._max_idle:
+                idle.append(engine)
+            while len(self._idle) > self._max_configurations:
+                self._idle.popitem(last=False)
+                self.evicted += 1
+
+    @contextmanager
+    def borrow(self, index, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+        """Context manager that acquires an engine and always returns it"""
+        engine = self.acquire(index, config)
+        try:
+            yield engine
+        finally:
+            self.release(engine, index, config)
+
+    def clear(self):
+        """Drop every pooled engine, e.g. after the index is rebuilt"""
+        with self._lock:
+            self._idle.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = sum(len(engines) for engines in self._idle.values())
+            return {
+                "built": self.built,
+                "reused": self.reused,
+                "evicted": self.evicted,
+                "idle": idle,
+                "configurations": len(self._idle),
+            }
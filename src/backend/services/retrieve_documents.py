@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.retrievers.fusion_retriever import FUSION_MODES
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from services.llm import get_index
+from services.metadata_columns import normalise_filters
+from services.metrics import metrics
+from services.query_documents import build_fusion_retriever
+from services.query_engine_pool import QueryEnginePool, QueryEngineConfig, DEFAULT_QUERY_CONFIG
+from services.vector_index import search_tuning
+
+# Retrieval only configuration
+RETRIEVE_MAX_TOP_K = int(os.getenv("RETRIEVE_MAX_TOP_K", "100"))
+RETRIEVE_FUSION_MODES = [mode.value for mode in FUSION_MODES]
+# Upper bound for per request hnsw_ef_search and ivfflat_probes (pgvector allows 1000)
+RETRIEVE_MAX_SEARCH_EFFORT = int(os.getenv("RETRIEVE_MAX_SEARCH_EFFORT", "1000"))
+
+
+# Process wide pool of fusion retrievers, separate from the full query engines
+retriever_pool = QueryEnginePool(build_fusion_retriever)
+metrics.register_collector("retriever_pool", retriever_pool.stats)
+
+
+def compact_node(node_with_score: NodeWithScore) -> dict:
+    """Reduce a retrieved node to its id, PMID, title, journal and fused score"""
+    node = node_with_score.node
+    metadata = node.metadata or {}
+    pmid = metadata.get("pmid")
+    if not pmid and metadata.get("file_path"):
+        # PubMed downloads are stored as <pmid>.txt
+        stem = os.path.splitext(os.path.basename(metadata["file_path"]))[0]
+        pmid = stem if stem.isdigit() else None
+    return {
+        "node_id": node.node_id,
+        "pmid": pmid,
+        "title": metadata.get("title"),
+        "journal": metadata.get("journal"),
+        "score": node_with_score.score,
+    }
+
+
+async def retrieve_documents(query_str: str, top_k: int = DEFAULT_QUERY_CONFIG.top_k,
+                             fusion_mode: str = DEFAULT_QUERY_CONFIG.fusion_mode,
+                             retriever: str = DEFAULT_QUERY_CONFIG.retriever,
+                             index: VectorStoreIndex = None,
+                             hnsw_ef_search: int = None, ivfflat_probes: int = None,
+                             filters: list = None) -> dict:
+    """
+    Run the dense plus sparse fusion used for answering, without the LLM.
+
+    Args:
+        query_str (str): The search text
+        top_k (int): Number of fused results to return
+        fusion_mode (str): One of RETRIEVE_FUSION_MODES
+        retriever (str): "fusion" or "sql", see QueryEngineConfig
+        hnsw_ef_search (int, optional): HNSW search effort, higher for better recall
+        ivfflat_probes (int, optional): IVFFlat lists probed, higher for better recall
+        filters (list, optional): Metadata filters on the promoted columns,
+            all of which must hold
+
+    Returns:
+        dict: Compact results in rank order and timings in milliseconds
+    """
+    if fusion_mode not in RETRIEVE_FUSION_MODES:
+        raise ValueError(f"Unknown fusion mode: {fusion_mode}")
+    if not 1 <= top_k <= RETRIEVE_MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {RETRIEVE_MAX_TOP_K}")
+    for name, value in (("hnsw_ef_search", hnsw_ef_search), ("ivfflat_probes", ivfflat_probes)):
+        if value is not None and not 1 <= value <= RETRIEVE_MAX_SEARCH_EFFORT:
+            raise ValueError(f"{name} must be between 1 and {RETRIEVE_MAX_SEARCH_EFFORT}")
+    filters = normalise_filters(filters)
+
+    start = time.perf_counter()
+    if index is None:
+        index = await asyncio.to_thread(get_index)
+
+    query_embedding = await Settings.embed_model.aget_query_embedding(query_str)
+    embedded = time.perf_counter()
+
+    # The search effort is set per query, so it does not multiply the pooled configurations
+    config = QueryEngineConfig(top_k=top_k, fusion_mode=fusion_mode, retriever=retriever, filters=filters)
+    with retriever_pool.borrow(index, config) as hybrid_retriever, search_tuning(hnsw_ef_search, ivfflat_probes):
+        nodes = await hybrid_retriever.aretrieve(QueryBundle(query_str, embedding=query_embedding))
+    retrieved = time.perf_counter()
+
+    timing = {
+        "embedding_ms": round((embedded - start) * 1000, 2),
+        "retrieval_ms": round((retrieved - embedded) * 1000, 2),
+        "total_ms": round((retrieved - start) * 1000, 2),
+    }
+    metrics.observe("retrieve.total_ms", timing["total_ms"])
+    return {"results": [compact_node(node) for node in nodes], "timing": timing}
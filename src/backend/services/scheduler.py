@@ -0,0 +1,214 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from services.metrics import metrics
+
+# Scheduler configuration | concurrent requests Ollama gets per model, by
+# default one generation and a few embeddings at a time. Override per model
+# with e.g. SCHEDULER_MODEL_CONCURRENCY="deepseek-r1:14b=2,bge-m3:latest=8"
+SCHEDULER_LLM_CONCURRENCY = int(os.getenv("SCHEDULER_LLM_CONCURRENCY", "1"))
+SCHEDULER_EMBED_CONCURRENCY = int(os.getenv("SCHEDULER_EMBED_CONCURRENCY", "4"))
+SCHEDULER_MODEL_CONCURRENCY = os.getenv("SCHEDULER_MODEL_CONCURRENCY", "")
+# Waiting requests allowed per lane and model before new ones are turned away
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))
+# Seconds clients are told to wait before retrying a rejected request
+SCHEDULER_RETRY_AFTER = int(os.getenv("SCHEDULER_RETRY_AFTER", "5"))
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# Lane of the work running in the current context, interactive unless set
+_current_lane: ContextVar[str] = ContextVar("scheduler_lane", default=INTERACTIVE)
+
+
+class SchedulerBusy(Exception):
+    """Raised when a model's queue is full, routes turn it into HTTP 429"""
+
+    def __init__(self, model: str, lane: str, retry_after: int = SCHEDULER_RETRY_AFTER):
+        super().__init__(f"Too many queued requests for {model} ({lane}), retry in {retry_after}s")
+        self.model = model
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+@contextmanager
+def scheduler_lane(lane: str):
+    """Run everything in the block, including threads it starts via to_thread, in a lane"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown scheduler lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class _Waiter:
+    """A queued request, woken either through an Event or an asyncio future"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ModelScheduler:
+    """
+    Admission control for one model.
+
+    At most `concurrency` requests run at once. The rest wait in their lane,
+    and a freed slot always goes to the oldest interactive request before
+    any batch request. A lane with `max_queue` waiters rejects new requests
+    with SchedulerBusy instead of letting them pile up until they time out.
+    Threads and coroutines share the same slots.
+    """
+
+    def __init__(self, model: str, concurrency: int, max_queue: int = SCHEDULER_MAX_QUEUE):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lanes = {lane: deque() for lane in LANES}
+        self._lock = threading.Lock()
+
+    def _try_admit(self, lane: str, loop=None):
+        """Take a free slot, or queue a waiter, returns the waiter or None if admitted"""
+        with self._lock:
+            if self.active < self.concurrency and not any(self._lanes.values()):
+                self.active += 1
+                self.admitted += 1
+                return None
+            queue = self._lanes[lane]
+            if len(queue) >= self.max_queue:
+                self.rejected += 1
+                metrics.incr(f"scheduler.rejected.{lane}")
+                raise SchedulerBusy(self.model, lane)
+            waiter = _Waiter(loop)
+            queue.append(waiter)
+            return waiter
+
+    def _cancel(self, waiter: _Waiter, lane: str) -> bool:
+        """Remove a waiter that gave up, returns False if it was already handed a slot"""
+        with self._lock:
+            try:
+                self._lanes[lane].remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def acquire(self):
+        """Block the calling thread until a slot is free"""
+        lane = _current_lane.get()
+        start = time.perf_counter()
+        waiter = self._try_admit(lane)
+        if waiter is not None:
+            waiter.event.wait()
+        metrics.observe(f"scheduler.wait_ms.{lane}", (time.perf_counter() - start) * 1000)
+
+    async def aacquire(self):
+        """Wait for a slot without blocking the event loop"""
+        lane = _current_lane.get()
+        start = time.perf_counter()
+        waiter = self._try_admit(lane, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if not self._cancel(waiter, lane):
+                    # The slot was handed over as we were cancelled, pass it on
+                    self.release()
+                raise
+        metrics.observe(f"scheduler.wait_ms.{lane}", (time.perf_counter() - start) * 1000)
+
+    def release(self):
+        """Hand the slot to the next waiter, interactive lane first"""
+        with self._lock:
+            for lane in LANES:
+                if self._lanes[lane]:
+                    waiter = self._lanes[lane].popleft()
+                    self.admitted += 1
+                    break
+            else:
+                self.active -= 1
+                return
+        waiter.wake()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "active": self.active,
+                "queued": {lane: len(queue) for lane, queue in self._lanes.items()},
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+def _parse_model_concurrency(value: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, limit = item.rpartition("=")
+        limits[model] = int(limit)
+    return limits
+
+
+class Scheduler:
+    """Process wide registry of per model schedulers"""
+
+    def __init__(self):
+        self._models = {}
+        self._overrides = _parse_model_concurrency(SCHEDULER_MODEL_CONCURRENCY)
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str, kind: str = "llm") -> ModelScheduler:
+        """Get the scheduler for a model, kind ("llm" or "embedding") picks the default concurrency"""
+        with self._lock:
+            scheduler = self._models.get(model)
+            if scheduler is None:
+                default = SCHEDULER_EMBED_CONCURRENCY if kind == "embedding" else SCHEDULER_LLM_CONCURRENCY
+                scheduler = ModelScheduler(model, self._overrides.get(model, default))
+                self._models[model] = scheduler
+            return scheduler
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = dict(self._models)
+        return {model: scheduler.stats() for model, scheduler in models.items()}
+
+
+scheduler = Scheduler()
+metrics.register_collector("scheduler", scheduler.stats)
@@ -0,0 +1,72 @@
+"""
+Schema and index setup for the document table.
+
+Adds the dedup and promoted metadata columns, checks the full text column
+and its GIN index, checks the embedding storage and builds the ANN index
+when there is none. Column additions rewrite the table and index builds
+can take minutes on a large corpus, so this runs once, from warm-up in a
+worker thread or as an explicit migration, never from get_vector_store:
+    python -m services.schema
+"""
+import os
+import sys
+
+from services.document_store import ensure_dedup_columns
+from services.embedding_storage import storage_problems
+from services.metadata_columns import ensure_metadata_columns
+from services.text_search import ensure_text_search
+from services.vector_index import ensure_vector_index
+
+# Schema configuration | "true" runs the setup during warm-up, set "false"
+# when deployments run python -m services.schema as a migration step instead
+SCHEMA_SETUP_ON_STARTUP = os.getenv("SCHEMA_SETUP_ON_STARTUP", "true").lower() == "true"
+
+
+def ensure_schema(vector_store) -> bool:
+    """
+    Bring the document table's columns and indexes up to date
+
+    Args:
+        vector_store: An initialised store, see get_vector_store
+
+    Returns:
+        bool: False if the columns the queries need could not be added
+    """
+    try:
+        ensure_dedup_columns(vector_store)
+        ensure_metadata_columns(vector_store)
+    except Exception as e:
+        print(f"Error adding document columns: {e}")
+        return False
+    try:
+        status = ensure_text_search(vector_store)
+        for problem in status["problems"]:
+            print(f"Full text search: {problem}")
+    except Exception as e:
+        # Dense retrieval still works, sparse queries fail or scan
+        print(f"Error checking full text search schema: {e}")
+    try:
+        problems = storage_problems(vector_store)
+        for problem in problems:
+            print(f"Embedding storage: {problem}")
+        # An index for the other storage's column type would fail
+        if not problems:
+            ensure_vector_index(vector_store)
+    except Exception as e:
+        # Queries still work without it, as exact scans
+        print(f"Error creating vector index: {e}")
+    return True
+
+
+def main() -> int:
+    from services.initalise_vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+    if not vector_store or not vector_store._is_initialized:
+        print("Vector store is not available")
+        return 1
+    return 0 if ensure_schema(vector_store) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
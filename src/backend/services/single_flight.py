@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Tuple
+
+from services.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one computation.
+
+    The first caller for a key starts the work as its own task. Callers that
+    arrive while it is running await the same task and receive the same
+    result or exception. The task is shielded, so a caller that disconnects
+    does not cancel the work the others are waiting on. Work that cannot be
+    one coroutine, like a streamed answer, leads by hand through start.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name (str): Prefix for the leaders/coalesced counters
+        """
+        self.name = name
+        self._inflight = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn for key unless a run is already in flight.
+
+        Returns:
+            tuple: The result and whether this caller started the computation
+        """
+        while True:
+            task = self._inflight.get(key)
+            leader = task is None
+            if leader:
+                metrics.incr(f"{self.name}.leaders")
+                task = self._track(key, asyncio.ensure_future(fn()))
+            else:
+                metrics.incr(f"{self.name}.coalesced")
+            try:
+                return await asyncio.shield(task), leader
+            except asyncio.CancelledError:
+                # A hand led computation was abandoned, not this caller, so try again
+                if leader or not task.cancelled():
+                    raise
+
+    def get(self, key: str):
+        """The computation in flight for key, await it through asyncio.shield, or None"""
+        return self._inflight.get(key)
+
+    def start(self, key: str) -> asyncio.Future:
+        """
+        Lead key by hand, for work that cannot be a single coroutine.
+
+        Callers of do for the same key wait on the returned future until it
+        is resolved with set_result or set_exception. Cancel it if the work
+        is abandoned, and they compute the result themselves.
+        """
+        metrics.incr(f"{self.name}.leaders")
+        return self._track(key, asyncio.get_running_loop().create_future())
+
+    def _track(self, key: str, future: asyncio.Future) -> asyncio.Future:
+        self._inflight[key] = future
+
+        def done(_):
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        future.add_done_callback(done)
+        return future
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight)}
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from contextlib import aclosing
+from fastapi.encoders import jsonable_encoder
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.llms import ChatMessage, ChatResponse
+from llama_index.core.schema import MetadataMode, QueryBundle
+from pydantic import ValidationError
+
+from helpers.llm_output import RelationshipStreamParser
+from models.structured_response import BioMedicalResponse, Relationship
+from services.answer_cache import answer_cache
+from services.llm import get_index, get_base_llm
+from services.llm_usage import track_llm_usage
+from services.metrics import metrics
+from services.query_documents import answer_flight, build_system_prompt, query_engine_pool
+from services.query_engine_pool import QueryEngineConfig, DEFAULT_QUERY_CONFIG
+
+
+async def stream_answer(query_str: str, index: VectorStoreIndex = None, config: QueryEngineConfig = DEFAULT_QUERY_CONFIG):
+    """
+    Answer a question as a sequence of events instead of a single response.
+
+    Streams share answer_question's single flight: a stream for a question
+    already being answered, streamed or not, waits for that answer and
+    replays it, and requests arriving during a stream wait for it. A final
+    reply that does not parse is regenerated under the same retry budget as
+    the non-streaming path.
+
+    Yields (event, data) tuples:
+        sources       the retrieved source nodes, sent before generation starts
+        token         generation progress, the token count so far and the new text
+        relationship  each relationship as soon as it is complete in the partial JSON
+        retry         the streamed reply did not parse and is being regenerated,
+                      relationships sent so far may not be in the final answer
+        done          the full structured response and its sources
+    """
+    start = time.perf_counter()
+
+    payload = await asyncio.to_thread(answer_cache.get, query_str, config)
+    if payload is not None:
+        for event in _replay({**payload, "cache": "exact"}):
+            yield event
+        return
+
+    key = answer_cache.make_key(query_str, config)
+    while (in_flight := answer_flight.get(key)) is not None:
+        metrics.incr("answer_flight.coalesced")
+        try:
+            result = await asyncio.shield(in_flight)
+        except asyncio.CancelledError:
+            # The leading stream was abandoned, not this one
+            if not in_flight.cancelled():
+                raise
+            continue
+        metrics.incr("answer_flight.llm_calls_saved")
+        for event in _replay({**result, "cache": result["cache"] or "coalesced"}):
+            yield event
+        return
+
+    future = answer_flight.start(key)
+    try:
+        # aclosing ends the inner stream here, not later from another context
+        async with aclosing(_stream_uncached(query_str, index, config, start)) as events:
+            async for event in events:
+                if event[0] == "done":
+                    future.set_result(event[1])
+                yield event
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved when nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        # Client disconnected or the stream was closed, release the followers
+        if not future.done():
+            future.cancel()
+
+
+def _replay(result: dict):
+    """The events of a stream whose answer is already known"""
+    yield "sources", result["sources"]
+    for relationship in result["response"]["relationships"]:
+        yield "relationship", relationship
+    yield "done", result
+
+
+async def _stream_uncached(query_str: str, index: VectorStoreIndex, config: QueryEngineConfig, start: float):
+    if index is None:
+        index = await asyncio.to_thread(get_index)
+
+    generation = await asyncio.to_thread(answer_cache.current_generation)
+    query_embedding = await Settings.embed_model.aget_query_embedding(query_str)
+    payload = await asyncio.to_thread(answer_cache.get_similar, query_embedding, config)
+    if payload is not None:
+        for event in _replay({**payload, "cache": "semantic"}):
+            yield event
+        return
+
+    with track_llm_usage():
+        with query_engine_pool.borrow(index, config) as query_engine:
+            source_nodes = await query_engine.aretrieve(QueryBundle(query_str, embedding=query_embedding))
+        sources = jsonable_encoder(source_nodes)
+        metrics.observe("stream.time_to_sources_ms", (time.perf_counter() - start) * 1000)
+        yield "sources", sources
+
+        context_str = "\n\n".join(
+            node.node.get_content(metadata_mode=MetadataMode.LLM) for node in source_nodes
+        )
+        messages = build_system_prompt(config.prompt_version).format_messages(
+            context_str=context_str, query_str=query_str
+        )
+
+        llm = get_base_llm()
+        schema = BioMedicalResponse.model_json_schema()
+        parser = RelationshipStreamParser()
+        tokens = 0
+        first_relationship = True
+        stream = await llm.astream_chat(messages, format=schema)
+        chunk = None
+        async for chunk in stream:
+            if not chunk.delta:
+                continue
+            tokens += 1
+            yield "token", {"tokens": tokens, "delta": chunk.delta}
+            for candidate in parser.feed(chunk.delta):
+                try:
+                    relationship = Relationship.model_validate(candidate)
+                except ValidationError:
+                    continue
+                if first_relationship:
+                    metrics.observe("stream.time_to_first_relationship_ms", (time.perf_counter() - start) * 1000)
+                    first_relationship = False
+                yield "relationship", relationship.model_dump(mode="json")
+
+        # The final chunk carries the whole reply and Ollama's token counts
+        final = chunk or ChatResponse(message=ChatMessage(role="assistant", content=parser.text))
+        response = llm.parse_reply(BioMedicalResponse, final, 0)
+        attempt = 1
+        while response is None:
+            yield "retry", {"attempt": attempt}
+            response = llm.parse_reply(BioMedicalResponse, await llm.achat(messages, format=schema), attempt)
+            attempt += 1
+
+    payload = {"response": response.model_dump(mode="json"), "sources": sources}
+    await asyncio.to_thread(answer_cache.put, query_str, config, query_embedding, payload, generation)
+    yield "done", {**payload, "cache": None}
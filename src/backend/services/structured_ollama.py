@@ -0,0 +1,176 @@
+import os
+import re
+from typing import Any, Dict, Optional, Sequence, Type
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import ChatMessage, ChatResponse
+from llama_index.core.prompts import BasePromptTemplate
+from llama_index.core.types import PydanticProgramMode
+from llama_index.llms.ollama import Ollama
+from pydantic import BaseModel, ValidationError
+
+from helpers.llm_output import strip_think_blocks
+from services.metrics import metrics
+from services.scheduler import scheduler
+
+# Structured output configuration | num_predict caps every generated token,
+# deepseek-r1's <think> trace and the JSON answer after it alike, so a long
+# trace truncates the JSON (counted as structured_output.truncated). It is
+# only a guard against runaway generations, keep it well above the longest
+# reasoning seen, -1 removes the cap.
+STRUCTURED_NUM_PREDICT = int(os.getenv("STRUCTURED_NUM_PREDICT", "8192"))
+# Extra generations allowed when the output still does not parse
+STRUCTURED_PARSE_RETRIES = int(os.getenv("STRUCTURED_PARSE_RETRIES", "1"))
+
+JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def parse_structured_output(output_cls: Type[BaseModel], text: str) -> BaseModel:
+    """
+    Parse model output into output_cls in a single pass.
+
+    Think blocks are removed first. If the remainder is not valid on its own,
+    e.g. because of a code fence or trailing prose, the outermost JSON object
+    in it is tried before giving up.
+
+    Raises:
+        ValidationError: If no valid object can be found
+    """
+    text = strip_think_blocks(text)
+    try:
+        return output_cls.model_validate_json(text)
+    except ValidationError:
+        match = JSON_OBJECT.search(text)
+        if match is None or match.group(0) == text:
+            raise
+        return output_cls.model_validate_json(match.group(0))
+
+
+class StructuredOllama(Ollama):
+    """
+    Ollama LLM with single pass structured output parsing.
+
+    structured_predict sends the output class's JSON schema as Ollama's
+    `format`, like the stock Ollama.structured_predict. The reply is parsed
+    with parse_structured_output, which also copes with think blocks and
+    surrounding prose, and regenerated only if it still fails, up to
+    STRUCTURED_PARSE_RETRIES times. Every reply's eval_count is recorded.
+
+    Every chat call, streamed or not, first takes a slot from the model's
+    scheduler, so generations are admitted by priority lane and capped at the
+    configured concurrency.
+    """
+
+    _parse_retries: int = PrivateAttr()
+
+    @property
+    def parse_retries(self) -> int:
+        return self._parse_retries
+
+    def __init__(self, num_predict: int = STRUCTURED_NUM_PREDICT,
+                 parse_retries: int = STRUCTURED_PARSE_RETRIES, **kwargs: Any):
+        additional_kwargs = {"num_predict": num_predict, **kwargs.pop("additional_kwargs", {})}
+        super().__init__(additional_kwargs=additional_kwargs, **kwargs)
+        self._parse_retries = parse_retries
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StructuredOllama"
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with scheduler.for_model(self.model).slot():
+            return super().chat(messages, **kwargs)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        async with scheduler.for_model(self.model).aslot():
+            return await super().achat(messages, **kwargs)
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        model_scheduler = scheduler.for_model(self.model)
+        model_scheduler.acquire()
+        try:
+            stream = super().stream_chat(messages, **kwargs)
+        except BaseException:
+            model_scheduler.release()
+            raise
+
+        def gen():
+            # Hold the slot until the stream is exhausted or closed
+            try:
+                yield from stream
+            finally:
+                model_scheduler.release()
+
+        return gen()
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        model_scheduler = scheduler.for_model(self.model)
+        await model_scheduler.aacquire()
+        try:
+            stream = await super().astream_chat(messages, **kwargs)
+        except BaseException:
+            model_scheduler.release()
+            raise
+
+        async def gen():
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                model_scheduler.release()
+
+        return gen()
+
+    @staticmethod
+    def record_usage(response: ChatResponse):
+        """Record the generated and prompt token counts Ollama reports"""
+        raw = response.raw or {}
+        if raw.get("eval_count") is not None:
+            metrics.observe("llm.eval_count", raw["eval_count"])
+        if raw.get("prompt_eval_count") is not None:
+            metrics.observe("llm.prompt_eval_count", raw["prompt_eval_count"])
+        if raw.get("done_reason") == "length":
+            metrics.incr("structured_output.truncated")
+
+    def parse_reply(self, output_cls: Type[BaseModel], response: ChatResponse, attempt: int):
+        """
+        Parse one reply, the attempt-th generation counting from 0
+
+        Returns:
+            BaseModel or None: The parsed reply, None when a retry is allowed
+
+        Raises:
+            ValidationError: When the reply does not parse and no retry is left
+        """
+        self.record_usage(response)
+        try:
+            return parse_structured_output(output_cls, response.message.content or "")
+        except ValidationError:
+            if attempt >= self._parse_retries:
+                metrics.incr("structured_output.parse_failures")
+                raise
+            metrics.incr("structured_output.parse_retries")
+            return None
+
+    def structured_predict(self, output_cls: Type[BaseModel], prompt: BasePromptTemplate,
+                           llm_kwargs: Optional[Dict[str, Any]] = None, **prompt_args: Any) -> BaseModel:
+        if self.pydantic_program_mode != PydanticProgramMode.DEFAULT:
+            return super().structured_predict(output_cls, prompt, llm_kwargs, **prompt_args)
+
+        llm_kwargs = {**(llm_kwargs or {}), "format": output_cls.model_json_schema()}
+        messages = prompt.format_messages(**prompt_args)
+        for attempt in range(self._parse_retries + 1):
+            result = self.parse_reply(output_cls, self.chat(messages, **llm_kwargs), attempt)
+            if result is not None:
+                return result
+
+    async def astructured_predict(self, output_cls: Type[BaseModel], prompt: BasePromptTemplate,
+                                  llm_kwargs: Optional[Dict[str, Any]] = None, **prompt_args: Any) -> BaseModel:
+        if self.pydantic_program_mode != PydanticProgramMode.DEFAULT:
+            return await super().astructured_predict(output_cls, prompt, llm_kwargs, **prompt_args)
+
+        llm_kwargs = {**(llm_kwargs or {}), "format": output_cls.model_json_schema()}
+        messages = prompt.format_messages(**prompt_args)
+        for attempt in range(self._parse_retries + 1):
+            result = self.parse_reply(output_cls, await self.achat(messages, **llm_kwargs), attempt)
+            if result is not None:
+                return result
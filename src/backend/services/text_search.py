@@ -0,0 +1,293 @@
+"""
+Full text (sparse) retrieval schema and queries.
+
+The document table keeps a stored tsvector column, text_search_tsv, that
+Postgres computes from the text on insert, and a GIN index over it. Sparse
+queries turn the question into a tsquery and match with @@ against the
+stored column, so the index narrows the rows and ranking reads the
+precomputed vectors instead of calling to_tsvector per row. Plain questions
+match any of their lexemes, questions with websearch syntax go through
+websearch_to_tsquery.
+
+Check or repair the schema, and check that the sparse queries use the index:
+    python -m services.text_search --explain "saponin toxicity in starfish"
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Any, List, Optional
+
+from llama_index.core.vector_stores.types import MetadataFilters
+from sqlalchemy import select, text, type_coerce
+from sqlalchemy.sql import func
+from sqlalchemy.types import UserDefinedType
+
+# Full text configuration | the text search config the tsvector column is
+# built with and questions are parsed with
+TEXT_SEARCH_CONFIG = os.getenv("TEXT_SEARCH_CONFIG", "english")
+# "any" matches documents sharing any term of a plain question, "all" needs
+# every term. Questions using websearch syntax ("quoted phrases", -term) are
+# always taken as written.
+TEXT_SEARCH_MATCH = os.getenv("TEXT_SEARCH_MATCH", "any")
+
+TSV_COLUMN = "text_search_tsv"
+EXPLAIN_QUERY = "saponin toxicity in starfish"
+
+# Phrases and exclusions, a question using either is left to websearch_to_tsquery.
+# A plain "or" needs no special case, "any" already ORs the terms and "all"
+# passes the question to websearch_to_tsquery anyway.
+WEBSEARCH_OPERATORS = re.compile(r'"|(^|\s)-\w')
+
+# Top ranked rows matching the question and {filters}. The join to a single query row
+# keeps the match a parameterised @@ that a bitmap scan on the GIN index
+# answers, and ts_rank reads the stored column. The "any" query ORs the
+# question's own lexemes, quoted and parsed with the simple config so they
+# are taken as they are.
+SPARSE_CANDIDATES = f"""
+    SELECT t.id, ts_rank(t.{TSV_COLUMN}, q.query) AS score
+    FROM {{table}} t
+    CROSS JOIN (
+        SELECT CASE WHEN CAST(:match_any AS boolean)
+                    THEN to_tsquery('simple', (
+                        SELECT string_agg(quote_literal(lexeme), ' | ')
+                        FROM unnest(tsvector_to_array(to_tsvector(p.config, p.question))) AS lexeme
+                    ))
+                    ELSE websearch_to_tsquery(p.config, p.question)
+               END AS query
+        FROM (
+            SELECT CAST(CAST(:text_search_config AS text) AS regconfig) AS config, CAST(:query AS text) AS question
+        ) AS p
+    ) AS q
+    WHERE t.{TSV_COLUMN} @@ q.query AND {{filters}}
+    ORDER BY score DESC
+    LIMIT :candidates
+"""
+
+
+class REGCONFIG(UserDefinedType):
+    cache_ok = True
+
+    def get_col_spec(self, **kw: Any) -> str:
+        return "regconfig"
+
+
+def match_any(query_str: str) -> bool:
+    """Whether the question's terms are OR-ed rather than AND-ed"""
+    return TEXT_SEARCH_MATCH == "any" and not WEBSEARCH_OPERATORS.search(query_str)
+
+
+def any_terms_query(config, query_str: str):
+    """tsquery ORing the lexemes to_tsvector finds in the question"""
+    lexeme = func.unnest(func.tsvector_to_array(func.to_tsvector(config, query_str))).table_valued("lexeme")
+    terms = select(func.string_agg(func.quote_literal(lexeme.c.lexeme), " | ")).scalar_subquery()
+    return func.to_tsquery(type_coerce("simple", REGCONFIG), terms)
+
+
+def build_sparse_query(vector_store, query_str: Optional[str], limit: int,
+                       metadata_filters: Optional[MetadataFilters] = None):
+    """
+    PGVectorStore's sparse query, against the stored tsvector column.
+
+    The stock query goes through plainto_tsquery and to_tsquery, which drops
+    quoted phrases and exclusions, so questions using them are parsed with
+    websearch_to_tsquery. Terms are still OR-ed for plain questions, like
+    the stock query, so recall stays the same.
+    """
+    if query_str is None:
+        raise ValueError("query_str must be specified for a sparse vector query.")
+    table = vector_store._table_class
+    config = type_coerce(vector_store.text_search_config, REGCONFIG)
+    if match_any(query_str):
+        ts_query = any_terms_query(config, query_str)
+    else:
+        ts_query = func.websearch_to_tsquery(config, query_str)
+    stmt = (
+        select(
+            table.id,
+            table.node_id,
+            table.text,
+            table.metadata_,
+            func.ts_rank(table.text_search_tsv, ts_query).label("rank"),
+        )
+        .where(table.text_search_tsv.op("@@")(ts_query))
+        .order_by(text("rank desc"))
+    )
+    return vector_store._apply_filters_and_limit(stmt, limit, metadata_filters)
+
+
+def _table(vector_store) -> str:
+    return f'"{vector_store.schema_name}"."{vector_store._table_class.__tablename__}"'
+
+
+def gin_index_name(vector_store) -> str:
+    # The name PGVectorStore gives the index when it creates the table
+    return f"{vector_store.table_name}_idx"
+
+
+def _column(connection, vector_store):
+    return connection.execute(text("""
+        SELECT a.attnum, format_type(a.atttypid, a.atttypmod) AS type, a.attgenerated AS generated,
+               pg_get_expr(d.adbin, d.adrelid) AS expression
+        FROM pg_attribute a
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE a.attrelid = CAST(:table AS regclass) AND a.attname = :column AND NOT a.attisdropped
+    """), {"table": _table(vector_store), "column": TSV_COLUMN}).mappings().first()
+
+
+def _gin_indexes(connection, vector_store, attnum: int) -> List[dict]:
+    rows = connection.execute(text("""
+        SELECT c.relname AS name, i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = CAST(:table AS regclass) AND am.amname = 'gin'
+          AND i.indnatts = 1 AND i.indkey[0] = :attnum
+    """), {"table": _table(vector_store), "attnum": attnum}).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _add_column_statement(vector_store) -> str:
+    return (f"ADD COLUMN {TSV_COLUMN} tsvector GENERATED ALWAYS AS "
+            f"(to_tsvector('{vector_store.text_search_config}'::regconfig, text)) STORED")
+
+
+def ensure_text_search(vector_store, fix: bool = True) -> dict:
+    """
+    Verify the stored tsvector column and its GIN index, creating them if missing
+
+    Args:
+        vector_store: The store whose table is checked
+        fix (bool): Create or rebuild what is missing, otherwise only report
+
+    Returns:
+        dict: "column" and "index" states ("ok", "created", "rebuilt" or
+            "missing"), the index name and any problems found
+    """
+    schema = vector_store.schema_name
+    config = vector_store.text_search_config
+    status = {"column": "ok", "index": "ok", "index_name": gin_index_name(vector_store), "problems": []}
+
+    with vector_store._engine.begin() as connection:
+        column = _column(connection, vector_store)
+        if column is None or column["generated"] != "s" or column["type"] != "tsvector":
+            problem = ("missing" if column is None
+                       else f"{TSV_COLUMN} is a plain {column['type']} column, not computed on insert")
+            status["problems"].append(f"{TSV_COLUMN}: {problem}")
+            if not fix:
+                status["column"] = "missing"
+            else:
+                # Rewrites the table once, the column is derived from text so
+                # nothing is lost by dropping a plain one
+                print(f"Adding stored {TSV_COLUMN} column to {_table(vector_store)}, this rewrites the table")
+                drop = f"DROP COLUMN IF EXISTS {TSV_COLUMN}, " if column is not None else ""
+                connection.execute(text(f"ALTER TABLE {_table(vector_store)} {drop}{_add_column_statement(vector_store)}"))
+                status["column"] = "created" if column is None else "rebuilt"
+                column = _column(connection, vector_store)
+        elif f"'{config}'" not in (column["expression"] or ""):
+            status["problems"].append(
+                f"{TSV_COLUMN} is built as {column['expression']}, questions are parsed with '{config}'"
+            )
+        indexes = _gin_indexes(connection, vector_store, column["attnum"]) if column is not None else []
+
+    valid = [index for index in indexes if index["valid"]]
+    if valid:
+        status["index_name"] = valid[0]["name"]
+        return status
+    status["problems"].append(f"no valid GIN index on {TSV_COLUMN}")
+    if not fix or column is None:
+        status["index"] = "missing"
+        return status
+
+    name = status["index_name"]
+    # CONCURRENTLY cannot run inside a transaction
+    with vector_store._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index in indexes:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{index["name"]}"'))
+        print(f"Creating GIN index {name} on {_table(vector_store)}.{TSV_COLUMN}")
+        connection.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {_table(vector_store)} USING gin ({TSV_COLUMN})'
+        ))
+    status["index"] = "rebuilt" if indexes else "created"
+    return status
+
+
+def _scans(plan: dict) -> List[dict]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_scans(child))
+    return nodes
+
+
+def explain_sparse(vector_store, query_str: str = EXPLAIN_QUERY, top_k: int = 10) -> List[dict]:
+    """
+    EXPLAIN the sparse queries and report whether they can run off the GIN index.
+
+    Sequential scans are disabled while planning, since on a small table the
+    planner rightly prefers one; if a Seq Scan on the table is still in the
+    plan the index cannot answer the query. A to_tsvector call anywhere in
+    the plan means text vectors are being recomputed per row.
+
+    Returns:
+        list: One entry per query ("library sparse" and "hybrid sparse leg")
+            with "ok", the problems found and the plan
+    """
+    statements = {
+        "library sparse": build_sparse_query(vector_store, query_str, top_k),
+        "hybrid sparse leg": text(SPARSE_CANDIDATES.format(table=_table(vector_store), filters="TRUE")).bindparams(
+            match_any=match_any(query_str), text_search_config=vector_store.text_search_config,
+            query=query_str, candidates=top_k,
+        ),
+    }
+    table_name = vector_store._table_class.__tablename__
+    results = []
+    with vector_store._session() as session, session.begin():
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        for label, statement in statements.items():
+            compiled = statement.compile(dialect=vector_store._engine.dialect,
+                                         compile_kwargs={"render_postcompile": True})
+            plan = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+            ).scalar()
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            problems = [
+                f"Seq Scan on {node['Relation Name']}" for node in _scans(plan[0]["Plan"])
+                if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table_name
+            ]
+            if "to_tsvector" in json.dumps(plan):
+                problems.append("to_tsvector is evaluated while querying")
+            results.append({"query": label, "ok": not problems, "problems": problems, "plan": plan})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or create the full text search schema")
+    parser.add_argument("--check", action="store_true", help="Only report, do not create anything")
+    parser.add_argument("--explain", nargs="?", const=EXPLAIN_QUERY, metavar="QUERY",
+                        help="Also EXPLAIN the sparse queries for QUERY and fail on a sequential scan")
+    args = parser.parse_args(argv)
+
+    from services.initalise_vector_store import get_vector_store
+    vector_store = get_vector_store()
+    if not vector_store or not vector_store._is_initialized:
+        print("Vector store is not available")
+        return 1
+
+    status = ensure_text_search(vector_store, fix=not args.check)
+    print(f"Column {TSV_COLUMN}: {status['column']}, GIN index {status['index_name']}: {status['index']}")
+    failed = status["column"] == "missing" or status["index"] == "missing"
+    for problem in status["problems"]:
+        print(f"  {problem}")
+
+    if args.explain:
+        for result in explain_sparse(vector_store, args.explain):
+            print(f"{result['query']}: {'index scan' if result['ok'] else 'FAILED'}")
+            for problem in result["problems"]:
+                print(f"  {problem}")
+            failed = failed or not result["ok"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+import math
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, List, NamedTuple, Optional
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import MetadataFilter, MetadataFilters
+from llama_index.vector_stores.postgres import PGVectorStore
+from llama_index.vector_stores.postgres.base import DBEmbeddingRow
+from sqlalchemy import text
+
+from services.embedding_storage import (
+    EMBEDDING_STORAGE, build_rerank_query, operator_class, quantized_expression, rerank_candidates, storage_of,
+)
+from services.metadata_columns import filter_clause, is_promoted
+from services.text_search import build_sparse_query
+
+# Approximate nearest neighbour index configuration | "hnsw" is created
+# automatically when the table has no ANN index (over the bit-quantised
+# embeddings for binary storage), "ivfflat" needs data to train its lists so
+# it is only built on request, "none" leaves it alone
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# 0 picks rows / 1000 up to a million rows and sqrt(rows) beyond
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))
+# Per query defaults, higher trades latency for recall
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# How dense queries with metadata filters search | "iterative" keeps the ANN
+# index and lets it continue until top_k rows pass the filter (pgvector
+# 0.8+), so broad filters cost about as much as no filter. "exact" ranks only
+# the rows the filter indexes select, which only pays off when every filter
+# is very selective, since it scans whatever the filter leaves. "planner"
+# leaves the choice to Postgres.
+FILTERED_SEARCH = os.getenv("FILTERED_SEARCH", "iterative")
+# Memory for index builds, an HNSW build that fits is several times faster
+VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "512MB")
+
+# "binary" is an HNSW index over binary_quantize(embedding), for binary storage
+INDEX_KINDS = ("hnsw", "ivfflat", "binary")
+
+
+class SearchTuning(NamedTuple):
+    """Per request ANN search effort, None uses the defaults above"""
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+
+
+# Set per request rather than built into pooled engines, so varying it does
+# not create a new query engine configuration
+_search_tuning: ContextVar[SearchTuning] = ContextVar("search_tuning", default=SearchTuning())
+
+
+@contextmanager
+def search_tuning(hnsw_ef_search: Optional[int] = None, ivfflat_probes: Optional[int] = None):
+    """
+    Use this search effort for the dense queries run inside the block
+
+    Tasks and worker threads started inside it inherit the setting.
+    """
+    token = _search_tuning.set(SearchTuning(hnsw_ef_search, ivfflat_probes))
+    try:
+        yield
+    finally:
+        _search_tuning.reset(token)
+
+
+def current_search_tuning() -> SearchTuning:
+    return _search_tuning.get()
+
+
+def search_settings(hnsw_ef_search: Optional[int] = None, ivfflat_probes: Optional[int] = None,
+                    filtered: bool = False) -> List:
+    """
+    SET LOCAL statements for the ANN search parameters of one transaction.
+
+    SET cannot take bind parameters, so the values are validated as integers
+    before being written into the statement. LOCAL keeps them from leaking
+    onto the pooled connection. Filtered queries also get FILTERED_SEARCH's
+    settings.
+    """
+    ef_search = int(hnsw_ef_search or HNSW_EF_SEARCH)
+    probes = int(ivfflat_probes or IVFFLAT_PROBES)
+    if ef_search < 1 or probes < 1:
+        raise ValueError("hnsw_ef_search and ivfflat_probes must be positive")
+    settings = [
+        text(f"SET LOCAL hnsw.ef_search = {ef_search}"),
+        text(f"SET LOCAL ivfflat.probes = {probes}"),
+    ]
+    if filtered and FILTERED_SEARCH == "exact":
+        # Bitmap scans on the filter indexes stay available, the ANN index does not
+        settings.append(text("SET LOCAL enable_indexscan = off"))
+    elif filtered and FILTERED_SEARCH == "iterative":
+        # strict_order keeps HNSW results sorted by distance, IVFFlat only has relaxed_order
+        settings.append(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+        settings.append(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+    return settings
+
+
+def binary_ef_search(hnsw_ef_search: Optional[int], candidates: int) -> int:
+    """HNSW returns at most ef_search rows, so raise it to cover every re-rank candidate"""
+    return min(1000, max(hnsw_ef_search or HNSW_EF_SEARCH, candidates))
+
+
+class TunedPGVectorStore(PGVectorStore):
+    """
+    PGVectorStore whose dense queries apply hnsw_ef_search and ivfflat_probes.
+
+    Both come from the query's vector_store_kwargs or the surrounding
+    search_tuning block, falling back to HNSW_EF_SEARCH and
+    IVFFLAT_PROBES, and are set for the query's
+    transaction only. The stock store sets them for the whole connection,
+    reads ef_search only when it built the index itself, and sends probes
+    as a bind parameter, which asyncpg rejects.
+
+    Sparse queries parse the question with websearch_to_tsquery, see
+    services/text_search.py. With binary embedding_storage dense queries
+    search the bit index and re-rank on the floats, see
+    services/embedding_storage.py. Filters on the promoted metadata keys
+    run against their indexed columns, see services/metadata_columns.py.
+    """
+
+    embedding_storage: str = EMBEDDING_STORAGE
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TunedPGVectorStore"
+
+    # The PGVectorStore internals the document writer needs, in one place so
+    # a library upgrade that renames them only needs changes here
+    def session(self):
+        """A new sync ORM session on the store's pool"""
+        return self._session()
+
+    def async_session(self):
+        """A new async ORM session on the store's pool"""
+        return self._async_session()
+
+    @property
+    def table(self):
+        """The ORM class of the document table"""
+        return self._table_class
+
+    def table_row(self, node: BaseNode) -> dict:
+        """Column values of the row the store would write for node"""
+        row = self._node_to_table_row(node)
+        return {"node_id": row.node_id, "embedding": row.embedding, "text": row.text, "metadata_": row.metadata_}
+
+    def _connect(self) -> Any:
+        # A failed _initialize is retried on the next get_vector_store call,
+        # keep the pools from the first attempt instead of leaking them
+        if getattr(self, "_engine", None) is not None:
+            return
+        super()._connect()
+
+    def _build_filter_clause(self, filter_: MetadataFilter) -> Any:
+        if is_promoted(filter_):
+            return filter_clause(filter_)
+        return super()._build_filter_clause(filter_)
+
+    def _build_sparse_query(self, query_str: Optional[str], limit: int,
+                            metadata_filters: Optional[MetadataFilters] = None) -> Any:
+        return build_sparse_query(self, query_str, limit, metadata_filters)
+
+    @staticmethod
+    def _rows(result) -> List[DBEmbeddingRow]:
+        return [
+            DBEmbeddingRow(
+                node_id=item.node_id,
+                text=item.text,
+                metadata=item.metadata_,
+                similarity=(1 - item.distance) if item.distance is not None else 0,
+            )
+            for item in result.all()
+        ]
+
+    def _dense_query(self, embedding: Optional[List[float]], limit: int,
+                     metadata_filters: Optional[MetadataFilters], kwargs: dict):
+        """The statement and its SET LOCAL settings"""
+        tuning = current_search_tuning()
+        ef_search = kwargs.get("hnsw_ef_search") or tuning.hnsw_ef_search
+        probes = kwargs.get("ivfflat_probes") or tuning.ivfflat_probes
+        if self.embedding_storage == "binary" and embedding is not None:
+            ef_search = binary_ef_search(ef_search, rerank_candidates(limit))
+            stmt = build_rerank_query(self, embedding, limit, metadata_filters)
+        else:
+            stmt = self._build_query(embedding, limit, metadata_filters)
+        filtered = bool(metadata_filters and metadata_filters.filters)
+        return stmt, search_settings(ef_search, probes, filtered)
+
+    def _query_with_score(self, embedding: Optional[List[float]], limit: int = 10,
+                          metadata_filters: Optional[MetadataFilters] = None, **kwargs: Any) -> List[DBEmbeddingRow]:
+        stmt, settings = self._dense_query(embedding, limit, metadata_filters, kwargs)
+        with self._session() as session, session.begin():
+            for statement in settings:
+                session.execute(statement)
+            return self._rows(session.execute(stmt))
+
+    async def _aquery_with_score(self, embedding: Optional[List[float]], limit: int = 10,
+                                 metadata_filters: Optional[MetadataFilters] = None,
+                                 **kwargs: Any) -> List[DBEmbeddingRow]:
+        stmt, settings = self._dense_query(embedding, limit, metadata_filters, kwargs)
+        async with self._async_session() as session, session.begin():
+            for statement in settings:
+                await session.execute(statement)
+            return self._rows(await session.execute(stmt))
+
+
+def _table(vector_store) -> str:
+    return f'"{vector_store.schema_name}"."{vector_store._table_class.__tablename__}"'
+
+
+def index_name(vector_store, kind: str) -> str:
+    return f"{vector_store._table_class.__tablename__}_embedding_{kind}_idx"
+
+
+def default_lists(row_count: int) -> int:
+    """pgvector's guidance for IVFFlat lists"""
+    if row_count > 1_000_000:
+        return int(math.sqrt(row_count))
+    return max(1, row_count // 1000)
+
+
+def list_vector_indexes(vector_store) -> List[dict]:
+    """The table's HNSW, IVFFlat and binary indexes with their definitions, sizes and validity"""
+    query = text("""
+        SELECT c.relname AS name, am.amname AS kind, pg_get_indexdef(i.indexrelid) AS definition,
+               pg_relation_size(i.indexrelid) AS size_bytes, i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = CAST(:table AS regclass) AND am.amname IN ('hnsw', 'ivfflat')
+        ORDER BY c.relname
+    """)
+    with vector_store._engine.connect() as connection:
+        rows = connection.execute(query, {"table": _table(vector_store)}).mappings().all()
+    indexes = [dict(row) for row in rows]
+    for index in indexes:
+        if "binary_quantize" in index["definition"]:
+            index["kind"] = "binary"
+    return indexes
+
+
+def _autocommit(vector_store):
+    # CREATE and DROP INDEX CONCURRENTLY cannot run inside a transaction
+    return vector_store._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _index_options(vector_store, kind: str, m: int, ef_construction: int, lists: int) -> str:
+    if kind in ("hnsw", "binary"):
+        return f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    if not lists:
+        with vector_store._engine.connect() as connection:
+            row_count = connection.execute(text(f"SELECT count(*) FROM {_table(vector_store)}")).scalar()
+        lists = default_lists(row_count)
+    return f"WITH (lists = {int(lists)})"
+
+
+def _create(vector_store, kind: str, name: str, m: int, ef_construction: int, lists: int):
+    options = _index_options(vector_store, kind, m, ef_construction, lists)
+    schema = vector_store.schema_name
+    if kind == "binary":
+        method, column = "hnsw", f"({quantized_expression(vector_store.embed_dim)}) bit_hamming_ops"
+    else:
+        method, column = kind, f"embedding {operator_class(storage_of(vector_store))}"
+    with _autocommit(vector_store) as connection:
+        # A failed concurrent build leaves an invalid index behind, which
+        # IF NOT EXISTS would then keep, so clear it first
+        invalid = connection.execute(text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :name AND NOT i.indisvalid
+        """), {"schema": schema, "name": name}).first()
+        if invalid:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}"'))
+        connection.execute(text(f"SET maintenance_work_mem = '{VECTOR_INDEX_MAINTENANCE_WORK_MEM}'"))
+        try:
+            connection.execute(text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {_table(vector_store)} '
+                f"USING {method} ({column}) {options}"
+            ))
+        finally:
+            connection.execute(text("RESET maintenance_work_mem"))
+
+
+def _check_kind(kind: str):
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown vector index type: {kind}, expected one of {', '.join(INDEX_KINDS)}")
+
+
+def create_vector_index(vector_store, kind: str = "hnsw", m: int = HNSW_M,
+                        ef_construction: int = HNSW_EF_CONSTRUCTION, lists: int = IVFFLAT_LISTS) -> List[dict]:
+    """
+    Build an HNSW or IVFFlat index on the embeddings without blocking writes
+
+    Args:
+        vector_store: The store whose table gets the index
+        kind (str): "hnsw", "ivfflat" or "binary"
+        m (int): HNSW connections per node
+        ef_construction (int): HNSW candidate list size while building
+        lists (int): IVFFlat lists, 0 derives them from the row count
+
+    Returns:
+        list: The table's vector indexes afterwards
+    """
+    _check_kind(kind)
+    _create(vector_store, kind, index_name(vector_store, kind), m, ef_construction, lists)
+    print(f"Created {kind} index on {_table(vector_store)}")
+    return list_vector_indexes(vector_store)
+
+
+def rebuild_vector_index(vector_store, kind: str = "hnsw", m: int = HNSW_M,
+                         ef_construction: int = HNSW_EF_CONSTRUCTION, lists: int = IVFFLAT_LISTS) -> List[dict]:
+    """
+    Rebuild an index with new parameters, e.g. more IVFFlat lists after the corpus grew.
+
+    The new index is built next to the old one and swapped in by rename, so
+    queries keep an index to use the whole time.
+    """
+    _check_kind(kind)
+    name = index_name(vector_store, kind)
+    schema = vector_store.schema_name
+    # A leftover from an interrupted rebuild may be valid but have other
+    # parameters, IF NOT EXISTS would keep it and swap it in
+    with _autocommit(vector_store) as connection:
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}_rebuild"'))
+    _create(vector_store, kind, f"{name}_rebuild", m, ef_construction, lists)
+    with _autocommit(vector_store) as connection:
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}"'))
+        connection.execute(text(f'ALTER INDEX "{schema}"."{name}_rebuild" RENAME TO "{name}"'))
+    print(f"Rebuilt {kind} index on {_table(vector_store)}")
+    return list_vector_indexes(vector_store)
+
+
+def drop_vector_index(vector_store, kind: str) -> List[dict]:
+    """Drop an index, dense queries fall back to exact scans"""
+    _check_kind(kind)
+    with _autocommit(vector_store) as connection:
+        connection.execute(text(
+            f'DROP INDEX CONCURRENTLY IF EXISTS "{vector_store.schema_name}"."{index_name(vector_store, kind)}"'
+        ))
+    print(f"Dropped {kind} index on {_table(vector_store)}")
+    return list_vector_indexes(vector_store)
+
+
+def ensure_vector_index(vector_store):
+    """Create the configured HNSW index at startup when the table has no ANN index at all"""
+    if VECTOR_INDEX_TYPE != "hnsw":
+        return
+    if not list_vector_indexes(vector_store):
+        kind = "binary" if storage_of(vector_store) == "binary" else "hnsw"
+        print(f"No vector index found, building {kind} index (one-off, may take a while on large tables)")
+        create_vector_index(vector_store, kind)
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import time
+from llama_index.core import Settings
+
+from services.llm import initialise_resources, get_base_llm, model_keep_alive
+from services.metrics import metrics
+from services.query_documents import STATIC_SYSTEM_PROMPT
+from state import app_state
+
+# Seconds between warm-up attempts while a dependency is still unavailable
+WARM_UP_RETRY_SECONDS = int(os.getenv("WARM_UP_RETRY_SECONDS", "10"))
+
+
+def _initialise():
+    if not app_state.initialized and not initialise_resources():
+        raise RuntimeError("Failed to initialise resources")
+
+
+def _schema():
+    from services.initalise_vector_store import get_vector_store
+    from services.schema import SCHEMA_SETUP_ON_STARTUP, ensure_schema
+
+    if SCHEMA_SETUP_ON_STARTUP and not ensure_schema(get_vector_store()):
+        raise RuntimeError("Document table columns could not be added")
+
+
+async def _embedding():
+    # Straight to Ollama, so the dummy text never lands in the query cache
+    embed_model = getattr(Settings.embed_model, "inner", Settings.embed_model)
+    await embed_model._async_client.embed(
+        model=embed_model.model_name, input="warm up", keep_alive=model_keep_alive()
+    )
+
+
+async def _generation():
+    # Same options as real requests, so Ollama does not reload the model with
+    # another context size, and the static system prompt lands in the KV cache
+    llm = get_base_llm()
+    await llm.async_client.chat(
+        model=llm.model,
+        messages=[
+            {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+            {"role": "user", "content": "Reply with OK."},
+        ],
+        options={**llm._model_kwargs, "num_predict": 1},
+        keep_alive=model_keep_alive(),
+    )
+
+
+async def _database():
+    from sqlalchemy import text
+
+    from services.initalise_vector_store import get_vector_store
+
+    # Connects and checks the table on first use, which blocks
+    vector_store = await asyncio.to_thread(get_vector_store)
+    if not vector_store or not vector_store._is_initialized:
+        raise RuntimeError("Vector store is not initialised")
+    await asyncio.to_thread(_ping, vector_store._session)
+    async with vector_store._async_session() as session:
+        await session.execute(text("SELECT 1"))
+
+
+def _ping(session_factory):
+    from sqlalchemy import text
+
+    with session_factory() as session:
+        session.execute(text("SELECT 1"))
+
+
+async def _run_stages() -> bool:
+    stages = [
+        ("resources", lambda: asyncio.to_thread(_initialise)),
+        # Table rewrites and index builds, kept off the event loop
+        ("schema", lambda: asyncio.to_thread(_schema)),
+        ("database", _database),
+        ("embedding", _embedding),
+        ("generation", _generation),
+    ]
+    for name, stage in stages:
+        if app_state.warm_up.get(name) == "ok":
+            continue
+        start = time.perf_counter()
+        try:
+            await stage()
+        except Exception as e:
+            app_state.warm_up[name] = f"error: {e}"
+            print(f"Warm-up stage {name} failed: {e}", file=sys.stderr)
+            return False
+        app_state.warm_up[name] = "ok"
+        metrics.observe(f"warm_up.{name}_ms", (time.perf_counter() - start) * 1000)
+    return True
+
+
+async def warm_up():
+    """
+    Bring the service to full speed before it takes traffic.
+
+    Initialises the index, brings the table's columns and indexes up to date
+    (see services/schema.py), opens the sync and async database pools, and loads
+    the embedding model and the LLM into Ollama with a dummy embedding and a
+    one-token generation. Failed stages are retried until every stage has
+    succeeded, and only then is app_state.ready set.
+    """
+    print("Warming up...")
+    start = time.perf_counter()
+    while not await _run_stages():
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+    app_state.ready = True
+    print(f"Warm-up finished in {time.perf_counter() - start:.1f}s, ready for traffic")
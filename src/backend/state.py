@@ -7,6 +7,9 @@ class AppState:
     vector_store: PGVectorStore = None
     index: VectorStoreIndex = None
     initialized: bool = False
+    # Set once warm-up has loaded the models and opened the database pool
+    ready: bool = False
+    warm_up: dict = {}
 
 # Create singleton instance
 app_state = AppState()
@@ -0,0 +1,88 @@
+import pytest
+
+from services.answer_cache import DisabledAnswerCache, InMemoryAnswerCache, create_answer_cache, normalise_question
+from services.query_engine_pool import DEFAULT_QUERY_CONFIG, QueryEngineConfig
+
+QUESTION = "Which organisms produce saponins?"
+ANSWER = {"response": "Sea cucumbers", "relationships": []}
+
+
+def put(cache, question=QUESTION, payload=ANSWER, embedding=None, config=DEFAULT_QUERY_CONFIG):
+    cache.put(question, config, embedding, payload, cache.current_generation())
+
+
+def test_questions_are_normalised():
+    assert normalise_question("  Which organisms\n produce SAPONINS?! ") == "which organisms produce saponins"
+
+
+def test_put_then_get_matches_the_normalised_question():
+    cache = InMemoryAnswerCache()
+    assert cache.get(QUESTION, DEFAULT_QUERY_CONFIG) is None
+    put(cache)
+    assert cache.get("which organisms produce saponins", DEFAULT_QUERY_CONFIG) == ANSWER
+    assert cache.get(QUESTION, QueryEngineConfig(top_k=10)) is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_invalidate_drops_entries():
+    cache = InMemoryAnswerCache()
+    put(cache)
+    cache.invalidate()
+    assert cache.get(QUESTION, DEFAULT_QUERY_CONFIG) is None
+    assert cache.current_generation() == 1
+
+
+def test_an_answer_computed_before_an_invalidation_is_not_stored():
+    cache = InMemoryAnswerCache()
+    generation = cache.current_generation()
+    # The corpus changes while the answer is being computed
+    cache.invalidate()
+    cache.put(QUESTION, DEFAULT_QUERY_CONFIG, None, ANSWER, generation)
+    assert cache.get(QUESTION, DEFAULT_QUERY_CONFIG) is None
+
+
+def test_threshold_zero_skips_the_semantic_tier():
+    cache = InMemoryAnswerCache(similarity_threshold=0)
+    put(cache, embedding=[1.0, 0.0])
+    assert cache.get_similar([1.0, 0.0], DEFAULT_QUERY_CONFIG) is None
+    assert cache.stats()["semantic_hits"] == 0
+    assert cache.stats()["misses"] == 1
+
+
+def test_near_duplicates_hit_above_the_threshold():
+    cache = InMemoryAnswerCache(similarity_threshold=0.9)
+    put(cache, embedding=[1.0, 0.0])
+    assert cache.get_similar([2.0, 0.1], DEFAULT_QUERY_CONFIG) == ANSWER
+    assert cache.get_similar([1.0, 1.0], DEFAULT_QUERY_CONFIG) is None
+    assert cache.get_similar([1.0, 0.0], QueryEngineConfig(top_k=10)) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = InMemoryAnswerCache(max_entries=2)
+    put(cache, "first")
+    put(cache, "second")
+    cache.get("first", DEFAULT_QUERY_CONFIG)
+    put(cache, "third")
+    assert cache.get("second", DEFAULT_QUERY_CONFIG) is None
+    assert cache.get("first", DEFAULT_QUERY_CONFIG) == ANSWER
+    assert cache.get("third", DEFAULT_QUERY_CONFIG) == ANSWER
+
+
+def test_expired_entries_are_not_returned():
+    cache = InMemoryAnswerCache(ttl_seconds=-1, similarity_threshold=0.5)
+    put(cache, embedding=[1.0])
+    assert cache.get(QUESTION, DEFAULT_QUERY_CONFIG) is None
+    assert cache.get_similar([1.0], DEFAULT_QUERY_CONFIG) is None
+
+
+def test_disabled_backend_stores_nothing():
+    cache = create_answer_cache("none")
+    assert isinstance(cache, DisabledAnswerCache)
+    put(cache)
+    assert cache.get(QUESTION, DEFAULT_QUERY_CONFIG) is None
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_answer_cache("redis")
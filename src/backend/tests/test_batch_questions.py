@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from llama_index.core import Settings
+
+from services import batch_questions
+from services.batch_questions import answer_batch
+from services.embedding_cache import CachedEmbedding
+from tests.test_embedding_cache import CountingEmbedding
+
+
+@pytest.fixture
+def answered(monkeypatch):
+    """The embedding each question was answered with, instead of retrieval and the LLM"""
+    answered = {}
+
+    async def answer_question(question, index, config, llm_limit=None, query_embedding=None):
+        answered[question] = query_embedding
+        return {"response": question, "cache": None}
+
+    monkeypatch.setattr(batch_questions, "answer_question", answer_question)
+    return answered
+
+
+@pytest.fixture
+def inner():
+    embed_model = Settings._embed_model
+    inner = CountingEmbedding(model_name="counting")
+    # Smaller than the batch, so the cache cannot hold every question's embedding
+    Settings.embed_model = CachedEmbedding(inner, max_entries=2, persist_path=None)
+    yield inner
+    Settings._embed_model = embed_model
+
+
+def test_questions_are_answered_with_the_batch_embeddings(answered, inner):
+    questions = ["a", "bb", "ccc", "dddd", "bb"]
+
+    async def run():
+        return [result async for result in answer_batch(questions, index=object())]
+
+    results = asyncio.run(run())
+    assert sorted(result["index"] for result in results) == list(range(len(questions)))
+    assert inner.calls == [("batch", ("a", "bb", "ccc", "dddd"))]
+    assert answered == {question: [float(len(question)), 1.0] for question in questions}
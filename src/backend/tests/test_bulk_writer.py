@@ -0,0 +1,83 @@
+import json
+import struct
+
+import numpy as np
+
+from services.bulk_writer import COPY_COLUMNS, COPY_HEADER, COPY_TRAILER, _ChunkReader, encode_copy_rows, encode_vector
+
+ROWS = [
+    {"node_id": "a", "text": "saponin kills starfish", "metadata_": {"pmid": "1"}, "embedding": [0.5, -1.0, 2.0]},
+    {"node_id": "b", "text": "holothurin – toxin", "metadata_": {}, "embedding": [0.0, 0.25, 1.5]},
+]
+
+
+def decode(stream: bytes):
+    """Parse a binary COPY stream back into rows of raw field bytes"""
+    assert stream.startswith(COPY_HEADER)
+    assert stream.endswith(COPY_TRAILER)
+    body = stream[len(COPY_HEADER):-len(COPY_TRAILER)]
+    rows, pos = [], 0
+    while pos < len(body):
+        (count,), pos = struct.unpack_from("!h", body, pos), pos + 2
+        fields = []
+        for _ in range(count):
+            (length,), pos = struct.unpack_from("!i", body, pos), pos + 4
+            fields.append(None if length == -1 else body[pos:pos + length])
+            pos += max(length, 0)
+        rows.append(fields)
+    return rows
+
+
+def decode_vector(field: bytes, halfvec: bool = False):
+    dimensions, reserved = struct.unpack_from("!hh", field)
+    assert reserved == 0
+    values = np.frombuffer(field[4:], dtype=">f2" if halfvec else ">f4")
+    assert len(values) == dimensions
+    return values.tolist()
+
+
+def test_rows_round_trip():
+    rows = decode(b"".join(encode_copy_rows(ROWS)))
+    assert len(rows) == len(ROWS)
+    for fields, row in zip(rows, ROWS):
+        assert len(fields) == len(COPY_COLUMNS)
+        node_id, text, metadata, embedding = fields
+        assert node_id.decode("utf-8") == row["node_id"]
+        assert text.decode("utf-8") == row["text"]
+        assert json.loads(metadata) == row["metadata_"]
+        assert decode_vector(embedding) == row["embedding"]
+
+
+def test_jsonb_metadata_has_a_version_byte():
+    (fields,) = decode(b"".join(encode_copy_rows(ROWS[:1], jsonb=True)))
+    assert fields[2][:1] == b"\x01"
+    assert json.loads(fields[2][1:]) == ROWS[0]["metadata_"]
+
+
+def test_halfvec_embeddings_are_float16():
+    (fields,) = decode(b"".join(encode_copy_rows(ROWS[:1], halfvec=True)))
+    assert len(fields[3]) == 4 + 2 * len(ROWS[0]["embedding"])
+    assert decode_vector(fields[3], halfvec=True) == ROWS[0]["embedding"]
+
+
+def test_no_rows_is_header_and_trailer():
+    assert b"".join(encode_copy_rows([])) == COPY_HEADER + COPY_TRAILER
+
+
+def test_vector_header_counts_dimensions():
+    assert encode_vector([1.0] * 1024)[:4] == struct.pack("!hh", 1024, 0)
+
+
+def test_chunk_reader_serves_any_read_size():
+    stream = b"".join(encode_copy_rows(ROWS))
+    for size in (1, 7, 4096):
+        reader = _ChunkReader(encode_copy_rows(ROWS))
+        read = b""
+        while True:
+            data = reader.read(size)
+            if not data:
+                break
+            assert len(data) <= size
+            read += data
+        assert read == stream
+    assert _ChunkReader(encode_copy_rows(ROWS)).read() == stream
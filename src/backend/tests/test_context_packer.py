@@ -0,0 +1,62 @@
+import pytest
+from llama_index.core import Settings
+from llama_index.core.llms.mock import MockLLM
+from llama_index.core.prompts import PromptTemplate
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from services.context_packer import ContextPacker
+
+
+@pytest.fixture(autouse=True)
+def word_tokens():
+    """One token per word, so budgets are easy to count"""
+    llm, tokenizer = Settings._llm, Settings._tokenizer
+    Settings.llm = MockLLM()
+    Settings.tokenizer = str.split
+    yield
+    Settings._llm, Settings._tokenizer = llm, tokenizer
+
+
+def node(words: int, score: float, name: str = "word") -> NodeWithScore:
+    return NodeWithScore(node=TextNode(text=" ".join([name] * words)), score=score)
+
+
+def pack(packer, nodes, query="question"):
+    return packer.postprocess_nodes(nodes, QueryBundle(query))
+
+
+def test_nodes_are_packed_best_first_within_the_budget():
+    packer = ContextPacker(token_budget=25, score_ratio=0.0)
+    packed = pack(packer, [node(10, 0.5, "c"), node(10, 0.9, "a"), node(10, 0.7, "b")])
+    assert [item.score for item in packed] == [0.9, 0.7]
+
+
+def test_smaller_nodes_still_fill_the_budget_after_one_does_not_fit():
+    packer = ContextPacker(token_budget=25, score_ratio=0.0)
+    packed = pack(packer, [node(10, 0.9), node(20, 0.8), node(5, 0.7)])
+    assert [item.score for item in packed] == [0.9, 0.7]
+
+
+def test_nodes_far_below_the_best_score_are_dropped():
+    packer = ContextPacker(token_budget=100, score_ratio=0.5)
+    packed = pack(packer, [node(5, 0.9), node(5, 0.5), node(5, 0.4)])
+    assert [item.score for item in packed] == [0.9, 0.5]
+
+
+def test_the_best_node_is_truncated_rather_than_dropped():
+    packer = ContextPacker(token_budget=10, score_ratio=0.0)
+    packed = pack(packer, [node(50, 0.9), node(5, 0.1)])
+    assert len(packed) == 1
+    assert packed[0].score == 0.9
+    assert 0 < len(packed[0].node.get_content().split()) <= 10
+
+
+def test_the_budget_is_capped_by_the_prompt_window():
+    long_prompt = PromptTemplate(" ".join(["instruction"] * 3500) + " {context_str} {query_str}")
+    packer = ContextPacker(token_budget=3000, prompts=[long_prompt])
+    assert packer.available_tokens("question") < 200
+    assert ContextPacker(token_budget=3000).available_tokens("question") == 3000
+
+
+def test_no_nodes_pack_to_nothing():
+    assert pack(ContextPacker(), []) == []
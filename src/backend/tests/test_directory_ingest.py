@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from services import directory_ingest
+from services.directory_ingest import INGEST_CHECKPOINT_FILE, STATUSES, Checkpoint, ingest_directory
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Documents store_documents was called with, by file name, instead of a database"""
+    stored = []
+
+    def store_documents(vector_store, documents):
+        names = [os.path.basename(document.metadata["file_path"]) for document in documents]
+        stored.extend(names)
+        return {name: "inserted" for name in names}
+
+    monkeypatch.setattr(directory_ingest, "store_documents", store_documents)
+    monkeypatch.setattr(directory_ingest, "invalidate_answer_cache", lambda: None)
+    return stored
+
+
+@pytest.fixture
+def directories(tmp_path):
+    documents, processed = tmp_path / "documents", tmp_path / "processed"
+    documents.mkdir()
+    for number in range(5):
+        (documents / f"{number}.txt").write_text(f"abstract {number}")
+        (documents / f"{number}.json").write_text(json.dumps({"pmid": str(number)}))
+    return documents, processed
+
+
+def remaining(directory):
+    return sorted(name for name in os.listdir(directory) if name != INGEST_CHECKPOINT_FILE)
+
+
+def test_files_are_stored_in_batches_and_moved(stored, directories):
+    documents, processed = directories
+    result = ingest_directory(None, str(documents), str(processed), batch_size=2)
+    assert stored == [f"{number}.txt" for number in range(5)]
+    assert result["inserted"] == 5 and result["batches"] == 3
+    assert remaining(documents) == []
+    assert len(os.listdir(processed)) == 10
+    assert not (documents / INGEST_CHECKPOINT_FILE).exists()
+
+
+def test_a_stopped_run_resumes_with_the_files_left(stored, directories):
+    documents, processed = directories
+
+    def stop(status):
+        raise Stop()
+
+    with pytest.raises(Stop):
+        ingest_directory(None, str(documents), str(processed), batch_size=2, on_batch=stop)
+    assert stored == ["0.txt", "1.txt"]
+    assert remaining(documents) == ["2.json", "2.txt", "3.json", "3.txt", "4.json", "4.txt"]
+    assert Checkpoint(str(documents)).state["counts"]["inserted"] == 2
+
+    result = ingest_directory(None, str(documents), str(processed), batch_size=2)
+    assert stored == [f"{number}.txt" for number in range(5)]
+    # Totals carry over from the stopped run
+    assert result["inserted"] == 5 and result["batches"] == 3
+
+
+def test_files_committed_before_a_crash_are_moved_not_stored_again(stored, directories):
+    documents, processed = directories
+    checkpoint = Checkpoint(str(documents))
+    checkpoint.state["committed"] = [str(documents / "0.txt"), str(documents / "0.json")]
+    checkpoint.state["counts"]["inserted"] = 1
+    checkpoint.state["batches"] = 1
+    checkpoint.save()
+
+    result = ingest_directory(None, str(documents), str(processed), batch_size=10)
+    assert "0.txt" not in stored
+    assert (processed / "0.txt").exists() and (processed / "0.json").exists()
+    assert result["inserted"] == 5 and result["batches"] == 2
+
+
+def test_an_unreadable_checkpoint_starts_afresh(directories):
+    documents, _ = directories
+    (documents / INGEST_CHECKPOINT_FILE).write_text("{not json")
+    state = Checkpoint(str(documents)).state
+    assert state == {"committed": [], "counts": dict.fromkeys(STATUSES, 0), "batches": 0}
+
+
+def test_an_empty_directory_returns_none(stored, tmp_path):
+    assert ingest_directory(None, str(tmp_path), str(tmp_path / "processed")) is None
+    assert stored == []
@@ -0,0 +1,77 @@
+import os
+
+from llama_index.core import Document
+from llama_index.core.schema import MetadataMode
+
+from services.document_store import (
+    CONTENT_HASH, DOC_KEY, UNKNOWN_FILE_PATH, content_hash, prepare_document, split_known,
+)
+
+TEXT = "Holothurin from sea cucumbers is toxic to fish."
+
+
+def key_of(**metadata) -> str:
+    return prepare_document(Document(text=TEXT, metadata=metadata)).metadata[DOC_KEY]
+
+
+def test_pmid_is_the_key_above_everything_else():
+    assert key_of(pmid="123", doc_key="mine", file_path="a.txt") == "pmid:123"
+
+
+def test_caller_key_comes_before_the_file():
+    assert key_of(doc_key="mine", file_path="a.txt") == "mine"
+
+
+def test_the_file_path_keys_documents_without_an_id():
+    assert key_of(file_path="documents/./a.txt") == f"file:{os.path.normpath('documents/a.txt')}"
+
+
+def test_content_hash_keys_documents_with_no_identity():
+    digest = content_hash(TEXT)
+    assert key_of() == f"sha256:{digest}"
+    assert key_of(file_path=UNKNOWN_FILE_PATH) == f"sha256:{digest}"
+    assert key_of(pmid="", doc_key="") == f"sha256:{digest}"
+
+
+def test_prepared_documents_carry_their_key_and_hash_outside_the_embedded_text():
+    document = prepare_document(Document(text=TEXT, metadata={"pmid": "123"}))
+    assert document.doc_id == "pmid:123"
+    assert document.metadata[CONTENT_HASH] == content_hash(TEXT)
+    for mode in (MetadataMode.EMBED, MetadataMode.LLM):
+        content = document.get_content(metadata_mode=mode)
+        assert "pmid:123" not in content and content_hash(TEXT) not in content
+    # Preparing again does not repeat the exclusions
+    again = prepare_document(document)
+    assert again.excluded_embed_metadata_keys.count(DOC_KEY) == 1
+
+
+def test_only_the_text_changes_the_hash():
+    first = prepare_document(Document(text=TEXT, metadata={"pmid": "1", "title": "a"}))
+    second = prepare_document(Document(text=TEXT, metadata={"pmid": "1", "title": "b"}))
+    assert first.metadata[CONTENT_HASH] == second.metadata[CONTENT_HASH]
+
+
+def prepared(pmid: str, text: str = TEXT) -> Document:
+    return prepare_document(Document(text=text, metadata={"pmid": pmid}))
+
+
+def test_new_unchanged_and_changed_documents_are_told_apart():
+    new, same, changed = prepared("1"), prepared("2"), prepared("3", "An edited abstract.")
+    known = {"pmid:2": {content_hash(TEXT)}, "pmid:3": {content_hash(TEXT)}}
+    to_write, unchanged, status = split_known([new, same, changed], known)
+    assert status == {"pmid:1": "inserted", "pmid:2": "unchanged", "pmid:3": "updated"}
+    assert to_write == [new, changed]
+    assert unchanged == [same]
+
+
+def test_a_document_stored_with_several_hashes_is_rewritten():
+    document = prepared("1")
+    _, _, status = split_known([document], {"pmid:1": {content_hash(TEXT), content_hash("old")}})
+    assert status == {"pmid:1": "updated"}
+
+
+def test_the_last_copy_of_a_repeated_key_wins():
+    first, last = prepared("1", "first version"), prepared("1", "second version")
+    to_write, _, status = split_known([first, last], {})
+    assert to_write == [last]
+    assert status == {"pmid:1": "inserted"}
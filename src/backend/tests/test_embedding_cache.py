@@ -0,0 +1,124 @@
+import asyncio
+from typing import List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from services.embedding_cache import CachedEmbedding, PersistentEmbeddingStore
+
+
+class CountingEmbedding(BaseEmbedding):
+    """Embeds a text as [len(text), 1.0] and records every call it gets"""
+
+    _calls: list = PrivateAttr(default_factory=list)
+
+    @property
+    def calls(self) -> list:
+        return self._calls
+
+    @staticmethod
+    def vector(text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._calls.append(("query", query))
+        return self.vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        self._calls.append(("query", query))
+        # Long enough for concurrent callers to find the call in flight
+        await asyncio.sleep(0.01)
+        return self.vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._calls.append(("text", text))
+        return self.vector(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._calls.append(("batch", tuple(texts)))
+        return [self.vector(text) for text in texts]
+
+
+def cached(**kwargs):
+    inner = CountingEmbedding(model_name="counting")
+    return CachedEmbedding(inner, persist_path=kwargs.pop("persist_path", None), **kwargs), inner
+
+
+def test_repeated_queries_reach_the_model_once():
+    embedding, inner = cached()
+    assert embedding.get_query_embedding("saponin") == [7.0, 1.0]
+    assert embedding.get_query_embedding("saponin") == [7.0, 1.0]
+    assert inner.calls == [("query", "saponin")]
+
+
+def test_least_recently_used_queries_are_evicted():
+    embedding, inner = cached(max_entries=2)
+    for query in ("a", "b", "a", "c"):
+        embedding.get_query_embedding(query)
+    assert embedding.stats()["memory_entries"] == 2
+    assert embedding.lookup("b") is None
+    assert embedding.lookup("a") is not None and embedding.lookup("c") is not None
+    assert [query for _, query in inner.calls] == ["a", "b", "c"]
+
+
+def test_persistent_store_round_trip(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite")
+    store = PersistentEmbeddingStore(path)
+    assert store.get("missing") is None
+    store.put("key", [0.5, -2.0])
+    assert PersistentEmbeddingStore(path).get("key") == [0.5, -2.0]
+
+
+def test_persisted_embeddings_survive_a_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    first, _ = cached(persist_path=path)
+    first.get_query_embedding("saponin")
+    second, inner = cached(persist_path=path)
+    assert second.get_query_embedding("saponin") == [7.0, 1.0]
+    assert asyncio.run(second.aget_query_embedding("saponin")) == [7.0, 1.0]
+    assert inner.calls == []
+
+
+def test_concurrent_identical_queries_share_one_call():
+    embedding, inner = cached()
+
+    async def run():
+        return await asyncio.gather(*(embedding.aget_query_embedding("saponin") for _ in range(5)))
+
+    assert asyncio.run(run()) == [[7.0, 1.0]] * 5
+    assert inner.calls == [("query", "saponin")]
+
+
+def test_waiters_embed_themselves_when_the_leader_is_cancelled():
+    embedding, inner = cached()
+
+    async def run():
+        leader = asyncio.ensure_future(embedding.aget_query_embedding("saponin"))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(embedding.aget_query_embedding("saponin"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(follower, 1)
+
+    assert asyncio.run(run()) == [7.0, 1.0]
+    assert inner.calls == [("query", "saponin")] * 2
+
+
+def test_batched_queries_keep_order_and_embed_only_new_ones_once():
+    embedding, inner = cached()
+    embedding.get_query_embedding("bb")
+    inner.calls.clear()
+
+    result = asyncio.run(embedding.aembed_queries(["ccc", "bb", "a", "ccc"]))
+    assert result == [[3.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert inner.calls == [("batch", ("ccc", "a"))]
+    # The batch was stored, so each question's own lookup is a hit
+    assert embedding.get_query_embedding("a") == [1.0, 1.0]
+    assert len(inner.calls) == 1
+
+
+def test_document_embeddings_are_not_cached():
+    embedding, inner = cached()
+    embedding.get_text_embedding("abstract")
+    embedding.get_text_embedding("abstract")
+    assert inner.calls == [("text", "abstract")] * 2
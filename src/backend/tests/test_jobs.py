@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import jobs as jobs_route
+from services.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(workers=1)
+    yield manager
+    manager._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def wait_for(manager):
+    """Queue a no-op behind the single worker's jobs, so every job before it has finished"""
+    manager._executor.submit(lambda: None).result(timeout=5)
+
+
+def test_a_job_runs_to_success_with_its_progress(manager):
+    def work(job):
+        job.advance("fetched", 3)
+        job.advance("fetched")
+        return {"stored": 4}
+
+    job = manager.submit("test", work, {"query": "saponin"}, progress={"fetched": 0})
+    wait_for(manager)
+    state = job.to_dict()
+    assert state["status"] == SUCCEEDED
+    assert state["progress"] == {"fetched": 4}
+    assert state["result"] == {"stored": 4}
+    assert state["params"] == {"query": "saponin"}
+    assert state["started_at"] and state["finished_at"] >= state["started_at"]
+
+
+def test_a_failing_job_reports_its_error(manager):
+    def work(job):
+        raise RuntimeError("efetch failed")
+
+    job = manager.submit("test", work, {})
+    wait_for(manager)
+    assert job.status == FAILED
+    assert job.error == "efetch failed"
+
+
+def test_a_queued_job_cancelled_before_it_starts_never_runs(manager):
+    release = threading.Event()
+    ran = []
+    blocker = manager.submit("test", lambda job: release.wait(5), {})
+    queued = manager.submit("test", lambda job: ran.append(job.id), {})
+    assert queued.status == QUEUED
+    manager.cancel(queued.id)
+    release.set()
+    wait_for(manager)
+    assert blocker.status == SUCCEEDED
+    assert queued.status == CANCELLED
+    assert queued.started_at is None
+    assert ran == []
+
+
+def test_a_running_job_stops_at_its_next_step(manager):
+    started = threading.Event()
+    steps = []
+
+    def work(job):
+        started.set()
+        while True:
+            job.wait(0.01)
+            steps.append(1)
+
+    job = manager.submit("test", work, {})
+    assert started.wait(5)
+    assert job.status == RUNNING
+    manager.cancel(job.id)
+    wait_for(manager)
+    assert job.status == CANCELLED
+    assert job.to_dict()["cancel_requested"]
+
+
+def test_cancelling_a_finished_job_changes_nothing(manager):
+    job = manager.submit("test", lambda job: {"ok": True}, {})
+    wait_for(manager)
+    manager.cancel(job.id)
+    assert job.status == SUCCEEDED
+    assert not job.cancel_requested
+
+
+def test_the_oldest_finished_jobs_are_forgotten():
+    manager = JobManager(workers=1, max_finished=2)
+    try:
+        jobs = [manager.submit("test", lambda job: None, {}) for _ in range(3)]
+        wait_for(manager)
+        assert manager.get(jobs[0].id) is None
+        assert [job["id"] for job in manager.list()] == [jobs[2].id, jobs[1].id]
+    finally:
+        manager._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def client(manager, monkeypatch):
+    monkeypatch.setattr(jobs_route, "job_manager", manager)
+    app = FastAPI()
+    app.include_router(jobs_route.router)
+    return TestClient(app)
+
+
+def test_routes_report_jobs(client, manager):
+    job = manager.submit("test", lambda job: {"ok": True}, {})
+    wait_for(manager)
+    assert client.get(f"/jobs/{job.id}").json()["status"] == SUCCEEDED
+    listed = client.get("/jobs").json()
+    assert [item["id"] for item in listed["jobs"]] == [job.id]
+
+
+def test_routes_return_404_for_unknown_jobs(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.post("/jobs/missing/cancel").status_code == 404
@@ -0,0 +1,53 @@
+from helpers.llm_output import RelationshipStreamParser, strip_think_blocks
+
+DOCUMENT = (
+    '{"relationships": ['
+    '{"source": "saponin", "target": "starfish", "relationship": "kills"}, '
+    '{"source": "holothurin", "target": "fish", "relationship": "is toxic to {x}"}'
+    '], "summary": "done"}'
+)
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+def test_strip_think_blocks_removes_closed_and_open_blocks():
+    assert strip_think_blocks("<think>reasoning</think>\n{}") == "{}"
+    assert strip_think_blocks("<think>a</think>x<think>b</think>y") == "xy"
+    assert strip_think_blocks('{"a": 1}<think>still going') == '{"a": 1}'
+
+
+def test_objects_are_returned_once_complete():
+    parser = RelationshipStreamParser()
+    assert parser.feed(DOCUMENT[:60]) == []
+    first = parser.feed(DOCUMENT[60:DOCUMENT.index("}") + 1])
+    assert first == [{"source": "saponin", "target": "starfish", "relationship": "kills"}]
+    rest = parser.feed(DOCUMENT[DOCUMENT.index("}") + 1:])
+    assert [item["source"] for item in rest] == ["holothurin"]
+
+
+def test_chunk_boundaries_do_not_matter():
+    for size in (1, 3, 7, len(DOCUMENT)):
+        parser = RelationshipStreamParser()
+        completed = feed_in_chunks(parser, DOCUMENT, size)
+        assert [item["source"] for item in completed] == ["saponin", "holothurin"]
+        assert completed[1]["relationship"] == "is toxic to {x}"
+        assert parser.text == DOCUMENT
+
+
+def test_json_quoted_inside_a_think_block_is_ignored():
+    reasoning = '<think>maybe {"relationships": [{"source": "wrong"}]}</think>'
+    parser = RelationshipStreamParser()
+    assert parser.feed(reasoning[:30]) == []
+    completed = feed_in_chunks(parser, reasoning[30:] + DOCUMENT, 5)
+    assert [item["source"] for item in completed] == ["saponin", "holothurin"]
+
+
+def test_nothing_after_the_array_is_parsed():
+    parser = RelationshipStreamParser()
+    parser.feed(DOCUMENT)
+    assert parser.feed(', "extra": [{"source": "late"}]}') == []
@@ -0,0 +1,86 @@
+import pytest
+from llama_index.core.vector_stores.types import FilterCondition
+
+from services.metadata_columns import MAX_FILTERS, filters_sql, normalise_filters, to_metadata_filters
+
+
+class Filter:
+    """Like the request model, which is dumped rather than read as a dict"""
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def model_dump(self):
+        return dict(self.fields)
+
+
+def test_no_filters_normalise_to_none():
+    assert normalise_filters(None) is None
+    assert normalise_filters([]) is None
+
+
+def test_filters_are_hashable_and_order_independent():
+    first = normalise_filters([
+        {"key": "journal", "value": "Toxicon"},
+        {"key": "authors", "operator": "any", "value": ["Smith", "Jones"]},
+    ])
+    second = normalise_filters([
+        Filter(key="authors", operator="any", value=["Smith", "Jones"]),
+        Filter(key="journal", operator="==", value="Toxicon"),
+    ])
+    assert first == second
+    assert hash(first) == hash(second)
+    assert ("journal", "==", "Toxicon") in first
+    assert ("authors", "any", ("Smith", "Jones")) in first
+
+
+def test_values_are_normalised():
+    assert normalise_filters([{"key": "pmid", "value": 123}]) == (("pmid", "==", "123"),)
+    assert normalise_filters([{"key": "pmid", "operator": "in", "value": "1"}]) == (("pmid", "in", ("1",)),)
+    assert normalise_filters([{"key": "doi", "value": "x"}] * 2) == (("doi", "==", "x"),)
+
+
+@pytest.mark.parametrize("item", [
+    {"key": "abstract", "value": "x"},
+    {"key": "authors", "operator": "==", "value": "Smith"},
+    {"key": "journal", "operator": "contains", "value": "Tox"},
+    {"key": "pmid", "operator": "in", "value": []},
+    {"key": "title", "operator": "==", "value": ["a", "b"]},
+])
+def test_invalid_filters_are_rejected(item):
+    with pytest.raises(ValueError):
+        normalise_filters([item])
+
+
+def test_the_number_of_filters_is_capped():
+    items = [{"key": "pmid", "operator": "!=", "value": str(number)} for number in range(MAX_FILTERS + 1)]
+    with pytest.raises(ValueError):
+        normalise_filters(items)
+
+
+def test_filters_sql_binds_every_value():
+    filters = normalise_filters([
+        {"key": "journal", "value": "Toxicon'; DROP TABLE x; --"},
+        {"key": "authors", "operator": "all", "value": ["Smith", "Jones"]},
+    ])
+    sql, params = filters_sql(filters)
+    assert "Toxicon" not in sql and "Smith" not in sql
+    assert sql.count(" AND ") == 1
+    assert sorted(params.values(), key=repr) == sorted([["Smith", "Jones"], "Toxicon'; DROP TABLE x; --"], key=repr)
+    for name in params:
+        assert f":{name}" in sql
+
+
+def test_filters_sql_without_filters_is_true():
+    assert filters_sql(None) == ("TRUE", {})
+
+
+def test_metadata_filters_are_and_ed():
+    metadata_filters = to_metadata_filters(normalise_filters([
+        {"key": "journal", "value": "Toxicon"},
+        {"key": "pmid", "operator": "nin", "value": ["1", "2"]},
+    ]))
+    assert metadata_filters.condition == FilterCondition.AND
+    values = {item.key: item.value for item in metadata_filters.filters}
+    assert values == {"journal": "Toxicon", "pmid": ["1", "2"]}
+    assert to_metadata_filters(None) is None
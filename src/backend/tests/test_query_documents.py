@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from services import query_documents
+from services.query_documents import aquery_documents
+
+
+class BarrierEngine:
+    """Answers only once every expected question is in flight at the same time"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.in_flight = 0
+        self.everyone_in = asyncio.Event()
+
+    async def _wait_for_everyone(self):
+        self.in_flight += 1
+        if self.in_flight == self.expected:
+            self.everyone_in.set()
+        await self.everyone_in.wait()
+
+    async def aquery(self, query):
+        await self._wait_for_everyone()
+        return query
+
+    async def aretrieve(self, query_bundle):
+        return []
+
+    async def asynthesize(self, query_bundle, nodes):
+        await self._wait_for_everyone()
+        return query_bundle.query_str
+
+
+class FakePool:
+    def __init__(self, engine):
+        self.engine = engine
+
+    @contextmanager
+    def borrow(self, index, config):
+        yield self.engine
+
+
+def test_questions_are_answered_concurrently_on_the_event_loop(monkeypatch):
+    async def run():
+        monkeypatch.setattr(query_documents, "query_engine_pool", FakePool(BarrierEngine(2)))
+        # A blocking engine call would never let the second question in
+        return await asyncio.wait_for(asyncio.gather(
+            aquery_documents("first", index=object()),
+            aquery_documents("second", index=object()),
+        ), 1)
+
+    assert asyncio.run(run()) == ["first", "second"]
+
+
+def test_resource_initialisation_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def get_index():
+        threads.append(threading.current_thread())
+        raise RuntimeError("no database")
+
+    monkeypatch.setattr(query_documents, "get_index", get_index)
+    with pytest.raises(RuntimeError):
+        asyncio.run(aquery_documents("question"))
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,111 @@
+import pytest
+
+from services.query_engine_pool import DEFAULT_QUERY_CONFIG, QueryEngineConfig, QueryEnginePool
+
+
+class Index:
+    pass
+
+
+def make_pool(**kwargs):
+    built = []
+
+    def factory(index, config):
+        engine = object()
+        built.append((index, config, engine))
+        return engine
+
+    return QueryEnginePool(factory, **kwargs), built
+
+
+def test_returned_engines_are_reused():
+    pool, built = make_pool()
+    index = Index()
+    with pool.borrow(index) as first:
+        pass
+    with pool.borrow(index) as second:
+        pass
+    assert first is second
+    assert len(built) == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_concurrent_borrows_get_separate_engines():
+    pool, built = make_pool()
+    index = Index()
+    with pool.borrow(index) as first, pool.borrow(index) as second:
+        assert first is not second
+    assert pool.stats()["idle"] == 2
+
+
+def test_engines_are_keyed_by_index_and_configuration():
+    pool, built = make_pool()
+    index, other = Index(), Index()
+    filtered = QueryEngineConfig(filters=(("journal", "==", "Toxicon"),))
+    with pool.borrow(index):
+        pass
+    with pool.borrow(index, filtered):
+        pass
+    with pool.borrow(other):
+        pass
+    assert [(config, built_for is index) for built_for, config, _ in built] == [
+        (DEFAULT_QUERY_CONFIG, True), (filtered, True), (DEFAULT_QUERY_CONFIG, False),
+    ]
+
+
+def test_idle_engines_per_key_are_capped():
+    pool, _ = make_pool(max_idle=2)
+    index = Index()
+    engines = [pool.acquire(index) for _ in range(3)]
+    for engine in engines:
+        pool.release(engine, index)
+    assert pool.stats()["idle"] == 2
+
+
+def test_least_recently_used_configuration_is_evicted():
+    pool, built = make_pool(max_configurations=2)
+    index = Index()
+    configs = [QueryEngineConfig(top_k=top_k) for top_k in (1, 2, 3)]
+    for config in configs[:2]:
+        with pool.borrow(index, config):
+            pass
+    # Touch the first so the second is the least recently used
+    with pool.borrow(index, configs[0]):
+        pass
+    with pool.borrow(index, configs[2]):
+        pass
+    assert pool.stats()["configurations"] == 2
+    assert pool.stats()["evicted"] == 1
+    with pool.borrow(index, configs[0]):
+        pass
+    with pool.borrow(index, configs[1]):
+        pass
+    assert [config.top_k for _, config, _ in built] == [1, 2, 3, 2]
+
+
+def test_borrowed_engines_leave_no_empty_keys():
+    pool, _ = make_pool()
+    index = Index()
+    pool.release(pool.acquire(index), index)
+    pool.acquire(index)
+    assert pool.stats()["configurations"] == 0
+
+
+def test_an_engine_is_returned_when_the_block_raises():
+    pool, _ = make_pool()
+    index = Index()
+    with pytest.raises(RuntimeError):
+        with pool.borrow(index):
+            raise RuntimeError("query failed")
+    assert pool.stats()["idle"] == 1
+
+
+def test_clear_drops_idle_engines():
+    pool, built = make_pool()
+    index = Index()
+    with pool.borrow(index):
+        pass
+    pool.clear()
+    with pool.borrow(index):
+        pass
+    assert len(built) == 2
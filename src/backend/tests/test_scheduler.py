@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.scheduler import BATCH, INTERACTIVE, ModelScheduler, SchedulerBusy, scheduler_lane
+
+
+async def queue_in(scheduler, lane, order):
+    with scheduler_lane(lane):
+        async with scheduler.aslot():
+            order.append(lane)
+
+
+def test_freed_slot_goes_to_interactive_before_batch():
+    scheduler = ModelScheduler("model", concurrency=1)
+    order = []
+
+    async def run():
+        await scheduler.aacquire()
+        batch = asyncio.ensure_future(queue_in(scheduler, BATCH, order))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(queue_in(scheduler, INTERACTIVE, order))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == {INTERACTIVE: 1, BATCH: 1}
+        scheduler.release()
+        await asyncio.gather(batch, interactive)
+
+    asyncio.run(run())
+    assert order == [INTERACTIVE, BATCH]
+    assert scheduler.stats()["active"] == 0
+
+
+def test_waiters_in_a_lane_are_served_in_order():
+    scheduler = ModelScheduler("model", concurrency=1)
+    order = []
+
+    async def wait(name):
+        async with scheduler.aslot():
+            order.append(name)
+
+    async def run():
+        await scheduler.aacquire()
+        waiters = []
+        for name in ("first", "second", "third"):
+            waiters.append(asyncio.ensure_future(wait(name)))
+            await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+    assert order == ["first", "second", "third"]
+
+
+def test_full_queue_rejects_new_requests():
+    scheduler = ModelScheduler("model", concurrency=1, max_queue=1)
+
+    async def run():
+        await scheduler.aacquire()
+        waiter = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy):
+            await scheduler.aacquire()
+        scheduler.release()
+        await waiter
+        scheduler.release()
+
+    asyncio.run(run())
+    assert scheduler.stats()["rejected"] == 1
+    assert scheduler.stats()["active"] == 0
+
+
+def test_a_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    scheduler = ModelScheduler("model", concurrency=1)
+    order = []
+
+    async def run():
+        await scheduler.aacquire()
+        cancelled = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(queue_in(scheduler, INTERACTIVE, order))
+        await asyncio.sleep(0)
+        # Hand the slot over and cancel before the waiter wakes up
+        scheduler.release()
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.wait_for(second, 1)
+
+    asyncio.run(run())
+    assert order == [INTERACTIVE]
+    assert scheduler.stats()["active"] == 0
+
+
+def test_threads_and_coroutines_share_slots():
+    scheduler = ModelScheduler("model", concurrency=1)
+    started = threading.Event()
+    finished = threading.Event()
+
+    def thread_work():
+        with scheduler.slot():
+            started.set()
+            finished.wait(1)
+
+    async def run():
+        thread = threading.Thread(target=thread_work)
+        thread.start()
+        await asyncio.to_thread(started.wait, 1)
+        waiter = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        finished.set()
+        await asyncio.wait_for(waiter, 1)
+        scheduler.release()
+        thread.join()
+
+    asyncio.run(run())
+    assert scheduler.stats()["admitted"] == 2
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        with scheduler_lane("urgent"):
+            pass
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert [leader for _, leader in results].count(True) == 1
+    assert flight.stats() == {"in_flight": 0}
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0.01, result="a")),
+            flight.do("b", lambda: asyncio.sleep(0.01, result="b")),
+        )
+
+    assert asyncio.run(run()) == [("a", True), ("b", True)]
+
+
+def test_exceptions_reach_every_caller_and_are_not_kept():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        retried = await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retried
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == ("ok", True)
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", lambda: asyncio.sleep(0.05, result="done")))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("key", lambda: asyncio.sleep(0, result="other")))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("done", False)
+
+
+def test_hand_led_results_reach_waiters():
+    flight = SingleFlight("test")
+
+    async def run():
+        future = flight.start("key")
+        assert flight.get("key") is future
+        waiter = asyncio.ensure_future(flight.do("key", lambda: asyncio.sleep(0, result="own")))
+        await asyncio.sleep(0)
+        future.set_result("led")
+        result = await waiter
+        return result, flight.get("key")
+
+    assert asyncio.run(run()) == (("led", False), None)
+
+
+def test_waiters_compute_themselves_when_the_hand_led_run_is_abandoned():
+    flight = SingleFlight("test")
+
+    async def run():
+        future = flight.start("key")
+        waiter = asyncio.ensure_future(flight.do("key", lambda: asyncio.sleep(0, result="own")))
+        await asyncio.sleep(0)
+        future.cancel()
+        return await waiter
+
+    assert asyncio.run(run()) == ("own", True)
@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.text_search import EXPLAIN_QUERY, build_sparse_query, ensure_text_search, explain_sparse, match_any, _scans
+
+
+def test_plain_questions_match_any_term():
+    assert match_any("does saponin or holothurin kill starfish")
+    assert match_any("is well-known toxin x harmful")
+
+
+def test_websearch_syntax_is_taken_as_written():
+    assert not match_any('"saponin toxicity" in starfish')
+    assert not match_any("saponin toxicity -fish")
+
+
+@pytest.fixture(scope="module")
+def vector_store():
+    from services.initalise_vector_store import init_vector_store
+
+    vector_store = init_vector_store()
+    if vector_store is None:
+        pytest.skip("Vector store could not be created")
+    try:
+        vector_store._initialize()
+    except Exception as e:
+        pytest.skip(f"No database reachable: {e}")
+    return vector_store
+
+
+def test_any_terms_query_is_built_from_lexemes():
+    from services.initalise_vector_store import init_vector_store
+
+    vector_store = init_vector_store()
+    vector_store._connect()
+    sql = str(build_sparse_query(vector_store, "saponin or toxin", 5).compile(dialect=postgresql.dialect()))
+    assert "tsvector_to_array(to_tsvector(" in sql
+    assert "replace(" not in sql
+
+
+def test_sparse_queries_use_gin_bitmap_index_scan(vector_store):
+    status = ensure_text_search(vector_store, fix=False)
+    assert status["index"] == "ok", f"run python -m services.schema first: {status['problems']}"
+
+    for result in explain_sparse(vector_store, EXPLAIN_QUERY):
+        scans = [
+            node for node in _scans(result["plan"][0]["Plan"])
+            if node["Node Type"] == "Bitmap Index Scan" and node.get("Index Name") == status["index_name"]
+        ]
+        assert scans, f"{result['query']} does not scan {status['index_name']}"
+        assert result["ok"], f"{result['query']}: {result['problems']}"
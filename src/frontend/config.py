@@ -1,9 +1,16 @@
 # Configuration for the Bio-Relationship Extraction application
+import os
 
 # Neo4j settings (match the backend settings)
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "Neo4jTestPassword"
 
+# Neo4j connection pool, shared by every Streamlit session in the process
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "10"))
+NEO4J_ACQUISITION_TIMEOUT_SECONDS = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SECONDS", "30"))
+NEO4J_MAX_CONNECTION_LIFETIME_SECONDS = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME_SECONDS", "3600"))
+NEO4J_LIVENESS_CHECK_SECONDS = float(os.getenv("NEO4J_LIVENESS_CHECK_SECONDS", "60"))
+
 # API settings
 API_BASE_URL = "http://localhost:8000"
@@ -1,6 +1,6 @@
 import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 
 # Base URL for the API
 BASE_URL = "http://localhost:8000"
@@ -158,4 +158,26 @@ def post_data_to_api(endpoint: str, data: Dict[str, Any]) -> Optional[Dict[str,
         return response.json()  # Return the JSON response
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to API: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def stream_events_from_api(endpoint: str, data: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Make a POST request to a server-sent events endpoint and yield its events.
+    
+    Args:
+        endpoint: The API endpoint to call (without the base URL)
+        data: The data to send in the request body
+        
+    Yields:
+        (event, data) tuples with the event payload decoded from JSON
+    """
+    url = f"{BASE_URL}/{endpoint}"
+    with requests.post(url, json=data, stream=True) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
@@ -1,59 +1,108 @@
+import threading
 from neo4j import GraphDatabase
 
 class Neo4jConnector:
     """
     Class to handle connections to Neo4j database
+
+    One connector is meant to live for the whole process: the driver keeps a
+    pool of Bolt connections, and each query runs in a short session that
+    borrows one and returns it when the query is done.
     """
-    
-    def __init__(self, uri, user, password):
+
+    def __init__(self, uri, user, password, max_connection_pool_size=10,
+                 connection_acquisition_timeout=30.0, max_connection_lifetime=3600.0,
+                 liveness_check_timeout=60.0):
         """
         Initialize the connector
-        
+
         Args:
             uri (str): Neo4j URI
             user (str): Neo4j username
             password (str): Neo4j password
+            max_connection_pool_size (int): Connections the driver keeps at most
+            connection_acquisition_timeout (float): Seconds to wait for a free connection
+            max_connection_lifetime (float): Seconds before a connection is replaced
+            liveness_check_timeout (float): Idle seconds after which a connection is pinged before use
         """
         self.uri = uri
         self.user = user
         self.password = password
+        self.pool_config = {
+            "max_connection_pool_size": max_connection_pool_size,
+            "connection_acquisition_timeout": connection_acquisition_timeout,
+            "max_connection_lifetime": max_connection_lifetime,
+            "liveness_check_timeout": liveness_check_timeout,
+        }
         self.driver = None
         self.connected = False
-    
+        self.queries = 0
+        self._lock = threading.Lock()
+
     def connect(self):
         """
-        Establish connection to Neo4j
+        Establish connection to Neo4j, reusing the driver if it is already open
         """
-        try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
-            # Test the connection
-            with self.driver.session() as session:
-                result = session.run("RETURN 1 as test")
-                if result.single()["test"] == 1:
-                    print("Connected to Neo4j successfully.")
-                    self.connected = True
-                    return True
-            return False
-        except Exception as e:
-            print(f"Error connecting to Neo4j: {e}")
-            return False
-    
+        with self._lock:
+            if self.connected:
+                return True
+            try:
+                if self.driver is None:
+                    self.driver = GraphDatabase.driver(
+                        self.uri, auth=(self.user, self.password), **self.pool_config
+                    )
+                # Test the connection
+                self.driver.verify_connectivity()
+                print("Connected to Neo4j successfully.")
+                self.connected = True
+                return True
+            except Exception as e:
+                print(f"Error connecting to Neo4j: {e}")
+                return False
+
     def close(self):
         """
         Close the Neo4j connection
         """
         if self.driver:
             self.driver.close()
+            self.driver = None
         self.connected = False
-    
+
+    def _run(self, query, params=None):
+        """
+        Run a query in its own session, which is closed again even if the query fails
+        """
+        self.queries += 1
+        with self.driver.session() as session:
+            result = session.run(query, params)
+            return [record.data() for record in result]
+
+    def pool_stats(self):
+        """
+        Connection pool usage, read from the driver's internal pool
+
+        Returns:
+            dict: Pool size limit, connections in use and idle, queries run
+        """
+        stats = {"max_size": self.pool_config["max_connection_pool_size"], "in_use": 0, "idle": 0,
+                 "queries": self.queries}
+        pool = getattr(self.driver, "_pool", None)
+        if pool is None:
+            return stats
+        for connections in list(pool.connections.values()):
+            for connection in list(connections):
+                stats["in_use" if connection.in_use else "idle"] += 1
+        return stats
+
     def fetch_data(self, query, params=None):
         """
         Execute a Cypher query and return results
-        
+
         Args:
             query (str): Cypher query
             params (dict, optional): Query parameters
-            
+
         Returns:
             list: Query results
         """
@@ -62,23 +111,21 @@ class Neo4jConnector:
             self.connect()
             if not self.connected:
                 return []
-        
+
         try:
-            with self.driver.session() as session:
-                result = session.run(query, params)
-                return [record.data() for record in result]
+            return self._run(query, params)
         except Exception as e:
             print(f"Error executing query: {e}")
             return []
-    
+
     def execute_query(self, query, params=None):
         """
         Execute a Cypher query with parameters and return the result.
-        
+
         Args:
             query (str): Cypher query
             params (dict, optional): Query parameters
-            
+
         Returns:
             list: Query results or None if error
         """
@@ -87,11 +134,9 @@ class Neo4jConnector:
             self.connect()
             if not self.connected:
                 return None
-        
+
         try:
-            with self.driver.session() as session:
-                result = session.run(query, params)
-                return [record.data() for record in result]
+            return self._run(query, params)
         except Exception as e:
             print(f"Error executing Neo4j query: {str(e)}")
-            return None
\ No newline at end of file
+            return None
@@ -7,11 +7,28 @@ import matplotlib.pyplot as plt
 # Import local modules
 from helper.api import get_data_from_api
 from helper.neo4j_connector import Neo4jConnector
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from config import (
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_MAX_POOL_SIZE, NEO4J_ACQUISITION_TIMEOUT_SECONDS,
+    NEO4J_MAX_CONNECTION_LIFETIME_SECONDS, NEO4J_LIVENESS_CHECK_SECONDS,
+)
 from paper_search import search_papers_page
 from confirm_relationships import validate_relationships_page
 from knowledger_graph import view_graph_page
 
+@st.cache_resource
+def get_neo4j_connector():
+    """
+    One Neo4j connector for the whole process, kept across reruns and sessions
+    so a button click does not open a new driver and Bolt connection
+    """
+    return Neo4jConnector(
+        NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+        max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT_SECONDS,
+        max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME_SECONDS,
+        liveness_check_timeout=NEO4J_LIVENESS_CHECK_SECONDS,
+    )
+
 def main():
     st.set_page_config(page_title="Biomedical Knowledge Graph Builder", layout="wide")
     st.title("Biomedical Knowledge Graph Builder")
@@ -30,8 +47,8 @@ def main():
     if "return_to_main" not in st.session_state:
         st.session_state.return_to_main = False
 
-    # Connect to the Neo4j database
-    neo4j_connector = Neo4jConnector(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    # Connect to the Neo4j database, only the first run pays for the handshake
+    neo4j_connector = get_neo4j_connector()
     connected = neo4j_connector.connect()
     if not connected:
         st.sidebar.error("⚠️ Cannot connect to Neo4j database. Please check your connection settings.")
@@ -72,12 +89,11 @@ def main():
     st.sidebar.write(f"Current page: {page}")
     st.sidebar.write(f"Relationships to validate: {len(st.session_state.get('relationships', []))}")
     st.sidebar.write(f"Current index: {st.session_state.get('current_rel_index', 0)}")
-
-    # Close the Neo4j connection
-    try:
-        neo4j_connector.close()
-    except:
-        pass
+    pool = neo4j_connector.pool_stats()
+    st.sidebar.write(
+        f"Neo4j pool: {pool['in_use']} in use, {pool['idle']} idle of {pool['max_size']}, "
+        f"{pool['queries']} queries"
+    )
 
 # Run the app
 from streamlit.web import cli as stcli
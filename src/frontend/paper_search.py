@@ -1,6 +1,38 @@
+import time
 import streamlit as st
 import pandas as pd
-from helper.api import get_data_from_api, post_data_to_api
+from helper.api import get_data_from_api, post_data_to_api, stream_events_from_api
+
+def show_pubmed_job(job_id, max_papers):
+    """Show a PubMed job's progress, polling the backend until it finishes"""
+    job = get_data_from_api(f"jobs/{job_id}")
+    if not job:
+        st.error("Lost track of the PubMed job.")
+        st.session_state.pubmed_job_id = None
+        return
+
+    progress = job["progress"]
+    stored = progress["embedded"] + progress["unchanged"]
+    st.progress(
+        min(1.0, stored / max(progress["parsed"], max_papers, 1)),
+        text=(f"{job['status'].capitalize()}: fetched {progress['fetched']}, parsed {progress['parsed']}, "
+              f"embedded {progress['embedded']} ({progress['unchanged']} already known), failed {progress['failed']}"),
+    )
+
+    if job["status"] == "succeeded":
+        st.success(f"Downloaded and indexed {job['result']['document_count']} papers.")
+        st.session_state.pubmed_job_id = None
+    elif job["status"] == "failed":
+        st.error(f"PubMed search failed: {job['error']}")
+        st.session_state.pubmed_job_id = None
+    elif job["status"] == "cancelled":
+        st.warning(f"PubMed search cancelled, {stored} papers were kept.")
+        st.session_state.pubmed_job_id = None
+    else:
+        if st.button("Cancel search", disabled=job["cancel_requested"]):
+            post_data_to_api(f"jobs/{job_id}/cancel", {})
+        time.sleep(1)
+        st.rerun()
 
 def search_papers_page():
     st.header("Scientific Paper Knowledge Base")
@@ -12,6 +44,8 @@ def search_papers_page():
         st.session_state.search_results = []
     if "mode" not in st.session_state:
         st.session_state.mode = None
+    if "pubmed_job_id" not in st.session_state:
+        st.session_state.pubmed_job_id = None
     
     # Display the main mode selection if no mode is currently selected
     if st.session_state.mode is None:
@@ -106,10 +140,25 @@ def search_papers_page():
             if search_query:
                 with st.spinner("Processing your question..."):
                     try:
-                        # Send the question to the API endpoint
-                        response = post_data_to_api("questions/", {
+                        # Stream the answer so progress shows while the LLM is generating
+                        response = None
+                        progress = st.empty()
+                        streamed_relationships = []
+                        for event, data in stream_events_from_api("questions/stream", {
                             "text": search_query
-                        })
+                        }):
+                            if event == "sources":
+                                progress.info(f"Found {len(data)} source documents, generating answer...")
+                            elif event == "token":
+                                progress.info(f"Generating answer... {data['tokens']} tokens, "
+                                              f"{len(streamed_relationships)} relationships so far")
+                            elif event == "relationship":
+                                streamed_relationships.append(data)
+                            elif event == "done":
+                                response = [data]
+                            elif event == "error":
+                                raise Exception(data.get("detail", "Unknown error"))
+                        progress.empty()
                         
                         # Check if we got a valid response
                         if response and isinstance(response, list) and len(response) > 0:
@@ -218,24 +267,26 @@ def search_papers_page():
         max_papers = st.slider("Maximum number of papers to download", min_value=1, max_value=10, value=5)
         
         # Search button
-        if st.button("Search PubMed"):
+        if st.button("Search PubMed", disabled=st.session_state.pubmed_job_id is not None):
             if search_query:
-                # Call API to search for papers
-                with st.spinner("Searching PubMed and downloading papers..."):
-                    try:
-                        # Use the PubMed search API endpoint
-                        response = post_data_to_api("pubmed/search/", {
-                            "query": search_query,
-                            "max_documents": max_papers
-                        })
-                        
-                        if response and response.get("status") == "success":
-                            st.success(f"Downloaded and indexed {response.get('document_count')} papers.")
-                    except Exception as e:
-                        st.error(f"Error connecting to API: {str(e)}")
-                        st.info("Please ensure the backend API is running.")
+                try:
+                    # The backend queues the download and embedding as a job
+                    response = post_data_to_api("pubmed/search/", {
+                        "query": search_query,
+                        "max_documents": max_papers
+                    })
+                    if response and response.get("job_id"):
+                        st.session_state.pubmed_job_id = response["job_id"]
+                    else:
+                        st.error("The PubMed search could not be started.")
+                except Exception as e:
+                    st.error(f"Error connecting to API: {str(e)}")
+                    st.info("Please ensure the backend API is running.")
             else:
                 st.warning("Please enter search keywords.")
+
+        if st.session_state.pubmed_job_id:
+            show_pubmed_job(st.session_state.pubmed_job_id, max_papers)
     
     # Display search results and paper selection options (common to both modes)
     if st.session_state.search_results: